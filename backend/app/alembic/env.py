@@ -18,7 +18,7 @@ fileConfig(config.config_file_name)
 # target_metadata = mymodel.Base.metadata
 # target_metadata = None
 
-from app.models import SQLModel  # noqa
+from app.models import SQLModel, has_pg_trgm  # noqa
 from app.core.config import settings # noqa
 
 target_metadata = SQLModel.metadata
@@ -54,6 +54,20 @@ def run_migrations_offline():
         context.run_migrations()
 
 
+# Reflection leaves out the collation of index columns, these would always
+# look changed
+UNCOMPARED_INDEXES = {"ix_item_title_id", "ix_item_owner_id_title_id"}
+
+
+def include_object(_object, name, type_, reflected, _compare_to):
+    if type_ == "index" and name in UNCOMPARED_INDEXES:
+        return False
+    # The trigram index only exists where pg_trgm is available
+    if type_ == "index" and name == "ix_item_title_trgm" and not reflected:
+        return has_pg_trgm(context.get_bind())
+    return True
+
+
 def run_migrations_online():
     """Run migrations in 'online' mode.
 
@@ -71,7 +85,10 @@ def run_migrations_online():
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata, compare_type=True
+            connection=connection,
+            target_metadata=target_metadata,
+            compare_type=True,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
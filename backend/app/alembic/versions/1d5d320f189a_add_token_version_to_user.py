@@ -0,0 +1,25 @@
+"""Add token_version to user
+
+Revision ID: 1d5d320f189a
+Revises: 1a31ce608336
+Create Date: 2026-10-17 21:38:34.193354
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '1d5d320f189a'
+down_revision = '1a31ce608336'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'token_version')
@@ -0,0 +1,30 @@
+"""Add owner_id, id index to item
+
+Revision ID: 4cb01acb93e4
+Revises: 1d5d320f189a
+Create Date: 2026-10-17 21:50:15.629734
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = '4cb01acb93e4'
+down_revision = '1d5d320f189a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built without locking out writes to the table. CREATE INDEX CONCURRENTLY
+    # can't run in a transaction, so this runs outside the migration's. The
+    # later migrations adding indexes to item do the same.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_owner_id_id', 'item', ['owner_id', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_item_owner_id_id', table_name='item', postgresql_concurrently=True)
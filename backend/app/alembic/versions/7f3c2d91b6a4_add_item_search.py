@@ -0,0 +1,46 @@
+"""Add item search
+
+Revision ID: 7f3c2d91b6a4
+Revises: a2ba76de7500
+Create Date: 2026-10-18 14:03:27.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '7f3c2d91b6a4'
+down_revision = 'a2ba76de7500'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A stored generated column rewrites the table, locking it for the
+    # duration, schedule it for a quiet time on large tables
+    op.add_column('item', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('english', title), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        persisted=True,
+    ), nullable=True))
+    connection = op.get_bind()
+    has_pg_trgm = connection.execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first() is not None
+    if has_pg_trgm:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # Built concurrently, the trigram index only with pg_trgm
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_search_vector', 'item', ['search_vector'], unique=False, postgresql_using='gin', postgresql_concurrently=True)
+        if has_pg_trgm:
+            op.create_index('ix_item_title_trgm', 'item', ['title'], unique=False, postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_item_title_trgm', table_name='item', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_item_search_vector', table_name='item', postgresql_concurrently=True)
+    op.drop_column('item', 'search_vector')
@@ -0,0 +1,34 @@
+"""Add user purges
+
+Revision ID: a2ba76de7500
+Revises: b40039dd408c
+Create Date: 2026-10-18 09:12:41.382915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2ba76de7500'
+down_revision = 'b40039dd408c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('userpurge',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('total_items', sa.Integer(), nullable=False),
+    sa.Column('deleted_items', sa.Integer(), nullable=False),
+    sa.Column('finished', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_userpurge_user_id'), 'userpurge', ['user_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_userpurge_user_id'), table_name='userpurge')
+    op.drop_table('userpurge')
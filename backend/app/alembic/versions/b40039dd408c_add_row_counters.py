@@ -0,0 +1,129 @@
+"""Add row counters
+
+Revision ID: b40039dd408c
+Revises: 4cb01acb93e4
+Create Date: 2026-10-17 22:13:37.671659
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b40039dd408c'
+down_revision = '4cb01acb93e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('item_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('counter',
+    sa.Column('name', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name', 'shard')
+    )
+    op.execute("""
+    CREATE FUNCTION counter_add(counter_name text, delta bigint)
+    RETURNS void LANGUAGE sql AS $$
+        INSERT INTO counter (name, shard, value)
+        SELECT counter_name, floor(random() * 16), delta
+        WHERE delta <> 0
+        ON CONFLICT (name, shard) DO UPDATE SET value = counter.value + excluded.value
+    $$
+    """)
+    op.execute("""
+    CREATE FUNCTION item_counts_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE "user" SET item_count = "user".item_count + inserted.count
+        FROM (
+            SELECT owner_id, count(*) AS count FROM inserted_item GROUP BY owner_id
+        ) AS inserted
+        WHERE "user".id = inserted.owner_id;
+        PERFORM counter_add('item', (SELECT count(*) FROM inserted_item));
+        RETURN NULL;
+    END
+    $$
+    """)
+    op.execute("""
+    CREATE FUNCTION item_counts_delete() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE "user" SET item_count = "user".item_count - deleted.count
+        FROM (
+            SELECT owner_id, count(*) AS count FROM deleted_item GROUP BY owner_id
+        ) AS deleted
+        WHERE "user".id = deleted.owner_id;
+        PERFORM counter_add('item', -(SELECT count(*) FROM deleted_item));
+        RETURN NULL;
+    END
+    $$
+    """)
+    op.execute("""
+    CREATE FUNCTION user_counts_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM counter_add('user', (SELECT count(*) FROM inserted_user));
+        RETURN NULL;
+    END
+    $$
+    """)
+    op.execute("""
+    CREATE FUNCTION user_counts_delete() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM counter_add('user', -(SELECT count(*) FROM deleted_user));
+        RETURN NULL;
+    END
+    $$
+    """)
+    # Lock out writes while backfilling, so that no row is counted twice or
+    # missed by the triggers created in the same transaction
+    op.execute('LOCK TABLE "user", item IN SHARE ROW EXCLUSIVE MODE')
+    op.execute("""
+    CREATE TRIGGER item_counts_insert AFTER INSERT ON item
+    REFERENCING NEW TABLE AS inserted_item
+    FOR EACH STATEMENT EXECUTE FUNCTION item_counts_insert()
+    """)
+    op.execute("""
+    CREATE TRIGGER item_counts_delete AFTER DELETE ON item
+    REFERENCING OLD TABLE AS deleted_item
+    FOR EACH STATEMENT EXECUTE FUNCTION item_counts_delete()
+    """)
+    op.execute("""
+    CREATE TRIGGER user_counts_insert AFTER INSERT ON "user"
+    REFERENCING NEW TABLE AS inserted_user
+    FOR EACH STATEMENT EXECUTE FUNCTION user_counts_insert()
+    """)
+    op.execute("""
+    CREATE TRIGGER user_counts_delete AFTER DELETE ON "user"
+    REFERENCING OLD TABLE AS deleted_user
+    FOR EACH STATEMENT EXECUTE FUNCTION user_counts_delete()
+    """)
+    op.execute("""
+    UPDATE "user" SET item_count = counted.count
+    FROM (SELECT owner_id, count(*) AS count FROM item GROUP BY owner_id) AS counted
+    WHERE "user".id = counted.owner_id
+    """)
+    op.execute("""
+    INSERT INTO counter (name, shard, value)
+    SELECT 'item', 0, count(*) FROM item
+    UNION ALL SELECT 'user', 0, count(*) FROM "user"
+    """)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER user_counts_delete ON "user"')
+    op.execute('DROP TRIGGER user_counts_insert ON "user"')
+    op.execute('DROP TRIGGER item_counts_delete ON item')
+    op.execute('DROP TRIGGER item_counts_insert ON item')
+    op.execute('DROP FUNCTION user_counts_delete()')
+    op.execute('DROP FUNCTION user_counts_insert()')
+    op.execute('DROP FUNCTION item_counts_delete()')
+    op.execute('DROP FUNCTION item_counts_insert()')
+    op.execute('DROP FUNCTION counter_add(text, bigint)')
+    op.drop_table('counter')
+    op.drop_column('user', 'item_count')
@@ -0,0 +1,32 @@
+"""Add item tombstone prunes
+
+Revision ID: b8e2f4a61c3d
+Revises: f1d8c3a5e6b7
+Create Date: 2026-10-20 09:41:18.264301
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e2f4a61c3d'
+down_revision = 'f1d8c3a5e6b7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('itemtombstoneprune',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('pruned_xid', sa.BigInteger(), nullable=False),
+    sa.Column('pruned_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_itemtombstoneprune_pruned_xid'), 'itemtombstoneprune', ['pruned_xid'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_itemtombstoneprune_pruned_xid'), table_name='itemtombstoneprune')
+    op.drop_table('itemtombstoneprune')
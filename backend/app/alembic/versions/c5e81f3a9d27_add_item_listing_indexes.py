@@ -0,0 +1,34 @@
+"""Add item listing indexes
+
+Revision ID: c5e81f3a9d27
+Revises: 7f3c2d91b6a4
+Create Date: 2026-10-18 16:41:09.207318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e81f3a9d27'
+down_revision = '7f3c2d91b6a4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built concurrently
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_title_id', 'item', [sa.text('(title COLLATE "C")'), 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_item_owner_id_title_id', 'item', ['owner_id', sa.text('(title COLLATE "C")'), 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_item_has_description_id', 'item', [sa.text('(description IS NOT NULL)'), 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_item_owner_id_has_description_id', 'item', ['owner_id', sa.text('(description IS NOT NULL)'), 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_item_owner_id_has_description_id', table_name='item', postgresql_concurrently=True)
+        op.drop_index('ix_item_has_description_id', table_name='item', postgresql_concurrently=True)
+        op.drop_index('ix_item_owner_id_title_id', table_name='item', postgresql_concurrently=True)
+        op.drop_index('ix_item_title_id', table_name='item', postgresql_concurrently=True)
@@ -0,0 +1,88 @@
+"""Add item change feed
+
+Revision ID: e7a4b9c2d815
+Revises: c5e81f3a9d27
+Create Date: 2026-10-18 19:27:52.840163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a4b9c2d815'
+down_revision = 'c5e81f3a9d27'
+branch_labels = None
+depends_on = None
+
+CURRENT_XID = "pg_current_xact_id()::text::bigint"
+
+
+def upgrade():
+    # Constant defaults for the existing rows, which are added without
+    # rewriting the table: they're all created and updated as of the
+    # migration, by no transaction in particular
+    op.add_column('item', sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.add_column('item', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.add_column('item', sa.Column('updated_xid', sa.BigInteger(), server_default='0', nullable=False))
+    op.alter_column('item', 'updated_xid', server_default=sa.text(CURRENT_XID))
+    op.create_table('itemtombstone',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('owner_id', sa.Uuid(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('deleted_xid', sa.BigInteger(), server_default=sa.text(CURRENT_XID), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_itemtombstone_deleted_xid_id', 'itemtombstone', ['deleted_xid', 'id'], unique=False)
+    op.create_index('ix_itemtombstone_owner_id_deleted_xid_id', 'itemtombstone', ['owner_id', 'deleted_xid', 'id'], unique=False)
+    op.execute(f"""
+    CREATE FUNCTION item_touch() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.created_at := OLD.created_at;
+        NEW.updated_at := now();
+        NEW.updated_xid := {CURRENT_XID};
+        RETURN NEW;
+    END
+    $$
+    """)
+    op.execute("""
+    CREATE FUNCTION item_tombstones() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO itemtombstone (id, owner_id)
+        SELECT id, owner_id FROM deleted_item;
+        RETURN NULL;
+    END
+    $$
+    """)
+    op.execute("""
+    CREATE TRIGGER item_touch BEFORE UPDATE ON item
+    FOR EACH ROW EXECUTE FUNCTION item_touch()
+    """)
+    op.execute("""
+    CREATE TRIGGER item_tombstones AFTER DELETE ON item
+    REFERENCING OLD TABLE AS deleted_item
+    FOR EACH STATEMENT EXECUTE FUNCTION item_tombstones()
+    """)
+    # The change feed's indexes, built concurrently
+    with op.get_context().autocommit_block():
+        op.create_index('ix_item_updated_xid_id', 'item', ['updated_xid', 'id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_item_owner_id_updated_xid_id', 'item', ['owner_id', 'updated_xid', 'id'], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_item_owner_id_updated_xid_id', table_name='item', postgresql_concurrently=True)
+        op.drop_index('ix_item_updated_xid_id', table_name='item', postgresql_concurrently=True)
+    op.execute("DROP TRIGGER item_tombstones ON item")
+    op.execute("DROP TRIGGER item_touch ON item")
+    op.execute("DROP FUNCTION item_tombstones()")
+    op.execute("DROP FUNCTION item_touch()")
+    op.drop_index('ix_itemtombstone_owner_id_deleted_xid_id', table_name='itemtombstone')
+    op.drop_index('ix_itemtombstone_deleted_xid_id', table_name='itemtombstone')
+    op.drop_table('itemtombstone')
+    op.drop_column('item', 'updated_xid')
+    op.drop_column('item', 'updated_at')
+    op.drop_column('item', 'created_at')
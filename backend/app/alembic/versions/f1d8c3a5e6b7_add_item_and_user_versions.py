@@ -0,0 +1,65 @@
+"""Add item and user versions
+
+Revision ID: f1d8c3a5e6b7
+Revises: e7a4b9c2d815
+Create Date: 2026-10-19 10:12:37.519046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel.sql.sqltypes
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1d8c3a5e6b7'
+down_revision = 'e7a4b9c2d815'
+branch_labels = None
+depends_on = None
+
+CURRENT_XID = "pg_current_xact_id()::text::bigint"
+
+
+def item_touch(body):
+    return f"""
+    CREATE OR REPLACE FUNCTION item_touch() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.created_at := OLD.created_at;
+        NEW.updated_at := now();
+        NEW.updated_xid := {CURRENT_XID};{body}
+        RETURN NEW;
+    END
+    $$
+    """
+
+
+def upgrade():
+    # Constant defaults, the columns are added without rewriting the tables
+    op.add_column('item', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('user', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('user', sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False))
+    op.execute(item_touch("\n        NEW.version := OLD.version + 1;"))
+    op.execute("""
+    CREATE FUNCTION user_touch() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.updated_at := now();
+        NEW.version := OLD.version + 1;
+        RETURN NEW;
+    END
+    $$
+    """)
+    op.execute("""
+    CREATE TRIGGER user_touch
+    BEFORE UPDATE OF email, full_name, hashed_password, is_active, is_superuser
+    ON "user" FOR EACH ROW EXECUTE FUNCTION user_touch()
+    """)
+
+
+def downgrade():
+    op.execute('DROP TRIGGER user_touch ON "user"')
+    op.execute("DROP FUNCTION user_touch()")
+    op.execute(item_touch(""))
+    op.drop_column('user', 'updated_at')
+    op.drop_column('user', 'version')
+    op.drop_column('item', 'version')
@@ -0,0 +1,128 @@
+import uuid
+from typing import Any
+
+from fastapi import HTTPException
+from sqlalchemy import BigInteger, ColumnElement, func, literal_column, tuple_
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.pagination import decode_payload, encode_payload
+from app.core.config import settings
+from app.models import (
+    UPDATED_XID,
+    Item,
+    ItemChangesPublic,
+    ItemPublic,
+    ItemTombstone,
+    ItemTombstonePrune,
+)
+
+# The oldest transaction a snapshot doesn't see, all writes not yet visible
+# are from it or a later one
+SNAPSHOT_XMIN: ColumnElement[int] = literal_column(
+    "pg_snapshot_xmin(pg_current_snapshot())::text::bigint", BigInteger
+)
+
+
+def _decode_changes_cursor(
+    cursor: str,
+) -> tuple[int, uuid.UUID | None, int | None, bool]:
+    payload = decode_payload(cursor)
+    try:
+        since = int(payload["since"])
+        after = uuid.UUID(payload["id"]) if "id" in payload else None
+        horizon = int(payload["horizon"]) if "horizon" in payload else None
+        initial = bool(payload.get("initial", False))
+    except (TypeError, KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return since, after, horizon, initial
+
+
+def _after(
+    xid: Any, id: Any, since: int, after: uuid.UUID | None
+) -> ColumnElement[bool]:
+    if after is None:
+        return xid >= since  # type: ignore[no-any-return]
+    return tuple_(xid, id) > tuple_(since, after)
+
+
+async def read_changes(
+    session: AsyncSession,
+    *,
+    owner_id: uuid.UUID | None,
+    since: str | None,
+    limit: int = 100,
+) -> ItemChangesPublic:
+    """
+    The items written, and the ids of those deleted, since the cursor, only
+    those of owner_id if given. Without a cursor every item is returned, and
+    no deletion.
+
+    Changes are ordered by the transaction that made them, rather than by
+    time: the cursor ending a pass holds the oldest transaction that was
+    still running when it started, so that writes committed out of order
+    aren't skipped. A change may be returned twice, never missed. The limit
+    is capped at MAX_PAGE_SIZE.
+
+    A cursor from before the tombstones were last pruned is answered 410, as
+    the deletions since it may be gone.
+    """
+    limit = max(1, min(limit, settings.MAX_PAGE_SIZE))
+    position: int = 0
+    after = None
+    horizon = None
+    initial = since is None
+    if since is not None:
+        position, after, horizon, initial = _decode_changes_cursor(since)
+    if horizon is None:
+        horizon = (await session.exec(select(SNAPSHOT_XMIN))).one()
+
+    statement = select(Item, UPDATED_XID).where(
+        _after(UPDATED_XID, col(Item.id), position, after)
+    )
+    if owner_id is not None:
+        statement = statement.where(Item.owner_id == owner_id)
+    # One more row tells whether there is a next page
+    statement = statement.order_by(UPDATED_XID, col(Item.id)).limit(limit + 1)
+    changes: list[tuple[Any, uuid.UUID, Item | None]] = [
+        (xid, item.id, item) for item, xid in (await session.exec(statement)).all()
+    ]
+    if not initial:
+        deleted_xid = col(ItemTombstone.deleted_xid)
+        tombstones = select(ItemTombstone.id, deleted_xid).where(
+            _after(deleted_xid, col(ItemTombstone.id), position, after)
+        )
+        if owner_id is not None:
+            tombstones = tombstones.where(ItemTombstone.owner_id == owner_id)
+        tombstones = tombstones.order_by(deleted_xid, col(ItemTombstone.id)).limit(
+            limit + 1
+        )
+        changes += [
+            (xid, id, None) for id, xid in (await session.exec(tombstones)).all()
+        ]
+        changes.sort(key=lambda change: change[:2])
+        # Checked after reading the tombstones: a pruning that deleted some of
+        # those the cursor needs was recorded before, so it's seen here
+        pruned_xid = select(func.max(ItemTombstonePrune.pruned_xid))
+        pruned = (await session.exec(pruned_xid)).one()
+        if pruned is not None and position <= pruned:
+            raise HTTPException(
+                status_code=410,
+                detail="The cursor is too old, start again without since",
+            )
+
+    more = len(changes) > limit
+    changes = changes[:limit]
+    if more:
+        xid, id, _ = changes[-1]
+        payload: dict[str, Any] = {"since": xid, "id": str(id), "horizon": horizon}
+        if initial:
+            payload["initial"] = True
+    else:
+        payload = {"since": horizon}
+    return ItemChangesPublic(
+        data=[ItemPublic.model_validate(item) for _, _, item in changes if item],
+        deleted=[id for _, id, item in changes if item is None],
+        next_cursor=encode_payload(payload),
+        more=more,
+    )
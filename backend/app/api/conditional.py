@@ -0,0 +1,128 @@
+import hashlib
+import re
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any
+
+from fastapi import HTTPException, Request, Response
+
+from app.api.pagination import Page
+
+# The entity tags of an If-Match or If-None-Match header, weak or not
+ENTITY_TAG = re.compile(r'(W/)?("[^"]*")')
+# A tag of version_tag, of a version an integer column can hold
+VERSION_TAG = re.compile(r'"([0-9]{1,9})"')
+
+
+def version_tag(version: int) -> str:
+    """
+    Strong entity tag of a resource at the version the database keeps for it.
+    """
+    return f'"{version}"'
+
+
+def page_tag(page: Page[Any]) -> str:
+    """
+    Strong entity tag of a listing's page, from the ids and versions of its
+    rows, its count and cursors, so that it changes with any of them without
+    serializing the page.
+    """
+    versions = [(row.id, row.version) for row in page.rows]
+    digest = hashlib.sha256(
+        repr((versions, page.count, page.next_cursor, page.prev_cursor)).encode()
+    )
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def validator_headers(
+    etag: str, last_modified: datetime | None = None
+) -> dict[str, str]:
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def is_conditional(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def _tags(header: str) -> list[str] | None:
+    # None for "*", which any current representation matches
+    if header.strip() == "*":
+        return None
+    return [("W/" if weak else "") + tag for weak, tag in ENTITY_TAG.findall(header)]
+
+
+def not_modified(
+    request: Request, etag: str, last_modified: datetime | None = None
+) -> bool:
+    """
+    Whether the client's copy is current, so that a GET is answered 304: its
+    If-None-Match has the resource's tag, compared weakly, or without one its
+    If-Modified-Since isn't before the last change, to the second HTTP dates
+    have.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = _tags(if_none_match)
+        return tags is None or etag in (tag.removeprefix("W/") for tag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        # Invalid dates are ignored
+        return False
+    if since.tzinfo is None:
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+def not_modified_response(etag: str, last_modified: datetime | None = None) -> Response:
+    return Response(status_code=304, headers=validator_headers(etag, last_modified))
+
+
+def with_validators(
+    content: Any,
+    response: Response,
+    etag: str,
+    last_modified: datetime | None = None,
+) -> Any:
+    """
+    Return an endpoint's content with the resource's ETag and Last-Modified,
+    set on the response it returns if it's one, else on the response FastAPI
+    builds.
+    """
+    headers = validator_headers(etag, last_modified)
+    if isinstance(content, Response):
+        content.headers.update(headers)
+    else:
+        response.headers.update(headers)
+    return content
+
+
+def if_match_versions(if_match: str | None) -> list[int] | None:
+    """
+    The versions an If-Match header allows a write to apply to, None without
+    the header or with "*". Weak tags never match. A 412 error when none of
+    the tags can be current, the write's condition leaves out the others.
+    """
+    if if_match is None:
+        return None
+    tags = _tags(if_match)
+    if tags is None:
+        return None
+    versions = [int(match[1]) for tag in tags if (match := VERSION_TAG.fullmatch(tag))]
+    if not versions:
+        raise precondition_failed()
+    return versions
+
+
+def precondition_failed() -> HTTPException:
+    return HTTPException(
+        status_code=412, detail="The resource was changed since it was read"
+    )
@@ -1,44 +1,118 @@
-from collections.abc import Generator
-from typing import Annotated
+import hashlib
+import math
+import time
+import uuid
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Annotated, cast
 
 import jwt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jwt.exceptions import InvalidTokenError
 from pydantic import ValidationError
+from sqlalchemy import Engine, event, orm
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app import crud
 from app.core import security
+from app.core.cache import TTLCache
 from app.core.config import settings
-from app.core.db import engine
-from app.models import TokenPayload, User
+from app.core.db import ThreadpoolSession, async_engine, engine, replicas
+from app.models import TokenPayload, User, UserClaims
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/login/access-token"
 )
 
 
-def get_db() -> Generator[Session, None, None]:
-    with Session(engine) as session:
+def _end_transaction(session: orm.Session) -> None:
+    """
+    End the transaction a request left open with COMMIT rather than with the
+    ROLLBACK of closing the session, psycopg drops all the prepared statements
+    of the connection on ROLLBACK. Only when nothing is pending, and on the
+    connection, so that it isn't taken as a write by after_commit listeners.
+
+    This relies on psycopg clearing its statement cache on ROLLBACK, as the
+    objects the statements use may have changed, and keeping it on COMMIT.
+    Were that to change, requests would only prepare their statements again.
+    """
+    if session.in_transaction() and not (
+        session.new or session.dirty or session.deleted
+    ):
+        session.connection().commit()
+
+
+@asynccontextmanager
+async def _session(
+    async_bind: AsyncEngine, bind: Engine
+) -> AsyncIterator[AsyncSession]:
+    # Objects stay loaded after commit, reloading them lazily isn't possible
+    # in async code
+    if settings.DATABASE_ASYNC:
+        async with AsyncSession(async_bind, expire_on_commit=False) as session:
+            yield session
+            await session.run_sync(_end_transaction)
+    else:
+        with Session(bind, expire_on_commit=False) as sync_session:
+            yield cast(AsyncSession, ThreadpoolSession(sync_session))
+            await run_in_threadpool(_end_transaction, sync_session)
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+    async with _session(async_engine, engine) as session:
         yield session
 
 
-SessionDep = Annotated[Session, Depends(get_db)]
+SessionDep = Annotated[AsyncSession, Depends(get_db)]
 TokenDep = Annotated[str, Depends(reusable_oauth2)]
 
+# Decoded tokens keyed by the SHA-256 digest of the token, each entry expires
+# together with its token
+token_cache: TTLCache[bytes, tuple[uuid.UUID, TokenPayload]] = TTLCache(
+    maxsize=settings.TOKEN_CACHE_MAX_SIZE, ttl=math.inf
+)
+
 
-def get_current_user(session: SessionDep, token: TokenDep) -> User:
-    try:
+def _decode_token_cached(token: str) -> tuple[uuid.UUID, TokenPayload]:
+    digest = hashlib.sha256(token.encode()).digest()
+    decoded = token_cache.get(digest)
+    if decoded is None:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=[security.ALGORITHM]
         )
         token_data = TokenPayload(**payload)
-    except (InvalidTokenError, ValidationError):
+        decoded = uuid.UUID(token_data.sub), token_data
+        expires_in = payload["exp"] - time.time() if "exp" in payload else None
+        token_cache.set(digest, decoded, ttl=expires_in)
+    return decoded
+
+
+def decode_token(
+    token: str, *, token_type: str | None = None
+) -> tuple[uuid.UUID, TokenPayload]:
+    """
+    Validate a token and return its user id and payload. Access tokens have no
+    type; refresh tokens have the "refresh" type.
+    """
+    try:
+        user_id, token_data = _decode_token_cached(token)
+        if token_data.type != token_type:
+            raise ValueError(f"Not a {token_type or 'access'} token")
+    except (InvalidTokenError, ValidationError, TypeError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    user = session.get(User, token_data.sub)
+    return user_id, token_data
+
+
+async def get_active_user(session: AsyncSession, user_id: uuid.UUID) -> User:
+    user = await crud.get_user_async(session=session, user_id=user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
@@ -46,7 +120,94 @@ def get_current_user(session: SessionDep, token: TokenDep) -> User:
     return user
 
 
+async def get_current_user(session: SessionDep, token: TokenDep) -> User:
+    user_id, _ = decode_token(token)
+    session.info["user_id"] = user_id
+    return await get_active_user(session, user_id)
+
+
+async def get_current_user_claims(session: SessionDep, token: TokenDep) -> UserClaims:
+    """
+    Authorize from the claims signed into the token in stateless auth mode,
+    without touching the database. Otherwise, or for tokens without claims,
+    the user is loaded as in get_current_user.
+    """
+    user_id, token_data = decode_token(token)
+    session.info["user_id"] = user_id
+    if (
+        settings.AUTH_STATELESS
+        and token_data.is_active is not None
+        and token_data.is_superuser is not None
+    ):
+        if not token_data.is_active:
+            raise HTTPException(status_code=400, detail="Inactive user")
+        return UserClaims(
+            id=user_id,
+            is_active=token_data.is_active,
+            is_superuser=token_data.is_superuser,
+        )
+    user = await get_active_user(session, user_id)
+    return UserClaims(
+        id=user.id, is_active=user.is_active, is_superuser=user.is_superuser
+    )
+
+
+# Users whose reads get_read_db sends to the primary, for a while after their
+# own writes. The size only needs to cover the writers of the sticky period.
+recent_writers: TTLCache[uuid.UUID, bool] = TTLCache(
+    maxsize=100_000, ttl=settings.DATABASE_REPLICA_STICKY_SECONDS
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _record_writer(session: Session) -> None:
+    # The user is set by the authentication dependencies, on the session of
+    # the request
+    user_id = session.info.get("user_id")
+    if user_id is not None:
+        recent_writers.set(user_id, True)
+
+
+@asynccontextmanager
+async def read_session(user_id: uuid.UUID) -> AsyncIterator[AsyncSession]:
+    """
+    Session for reading on behalf of a user, on one of the read replicas when
+    any are configured. Users who wrote within DATABASE_REPLICA_STICKY_SECONDS,
+    or all of them when no replica can be reached, are served from the primary.
+    """
+    indexes = [] if recent_writers.get(user_id) else replicas.available()
+    for index in indexes:
+        replica = _session(replicas.async_engines[index], replicas.engines[index])
+        async with replica as session:
+            try:
+                # Checks out and pings a connection
+                await session.connection()
+            except DBAPIError:
+                replicas.mark_down(index)
+                # Leaves no transaction to end on exit
+                await session.close()
+                continue
+            replicas.record_read(index)
+            yield session
+            return
+    replicas.record_read(None)
+    async with _session(async_engine, engine) as session:
+        yield session
+
+
+async def get_read_db(token: TokenDep) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only handlers, see read_session.
+    """
+    user_id, _ = decode_token(token)
+    async with read_session(user_id) as session:
+        yield session
+
+
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_db)]
+
 CurrentUser = Annotated[User, Depends(get_current_user)]
+CurrentUserClaims = Annotated[UserClaims, Depends(get_current_user_claims)]
 
 
 def get_current_active_superuser(current_user: CurrentUser) -> User:
@@ -0,0 +1,77 @@
+import csv
+import io
+import uuid
+from collections.abc import AsyncIterator
+from typing import Any, Literal
+
+from fastapi.responses import StreamingResponse
+from sqlmodel import SQLModel
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.api.deps import read_session
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES: dict[ExportFormat, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+# Rows fetched from the server-side cursor, and written out, at a time
+YIELD_PER = 1000
+
+
+def export_response(
+    statement: SelectOfScalar[Any],
+    model: type[SQLModel],
+    format: ExportFormat,
+    *,
+    user_id: uuid.UUID,
+    filename: str,
+) -> StreamingResponse:
+    """
+    Stream all the statement's rows as the given public model, one JSON object
+    per line or one CSV record per row after a header.
+
+    Rows are read through a server-side cursor YIELD_PER at a time and each
+    batch is sent before the next is fetched, so memory use doesn't grow with
+    the number of rows. The session is opened by the response body itself, as
+    it outlives the request handler, with read_session on behalf of user_id.
+    """
+    return StreamingResponse(
+        _export_lines(statement, model, format, user_id),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{format}"'},
+    )
+
+
+async def _export_lines(
+    statement: SelectOfScalar[Any],
+    model: type[SQLModel],
+    format: ExportFormat,
+    user_id: uuid.UUID,
+) -> AsyncIterator[str]:
+    fields = list(model.model_fields)
+    async with read_session(user_id) as session:
+        result = await session.stream_scalars(
+            statement.execution_options(yield_per=YIELD_PER)
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if format == "csv":
+            writer.writerow(fields)
+        async for rows in result.partitions():
+            for row in rows:
+                public = model.model_validate(row)
+                if format == "ndjson":
+                    buffer.write(public.model_dump_json())
+                    buffer.write("\n")
+                else:
+                    values = public.model_dump(mode="json")
+                    writer.writerow(values[field] for field in fields)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        # The CSV header of an empty export
+        if buffer.tell():
+            yield buffer.getvalue()
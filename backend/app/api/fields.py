@@ -0,0 +1,89 @@
+from functools import cache
+from typing import Annotated, Any
+
+from fastapi import HTTPException, Query
+from fastapi.responses import Response
+from pydantic import create_model
+from sqlmodel import SQLModel
+
+from app.api.pagination import Page
+
+Fields = Annotated[
+    str | None,
+    Query(description="Comma separated fields to return, all of them by default"),
+]
+
+
+def parse_fields(fields: str | None, model: type[SQLModel]) -> tuple[str, ...] | None:
+    """
+    The fields of the public model requested by a fields parameter, in the
+    model's order, or None to return them all.
+    """
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",")} - {""}
+    unknown = sorted(requested - model.model_fields.keys())
+    if unknown or not requested:
+        msg = f"Unknown fields: {', '.join(unknown)}" if unknown else "No fields"
+        raise HTTPException(
+            status_code=400, detail=[{"loc": ["query", "fields"], "msg": msg}]
+        )
+    return tuple(name for name in model.model_fields if name in requested)
+
+
+@cache
+def partial_model(model: type[SQLModel], fields: tuple[str, ...]) -> type[SQLModel]:
+    """
+    The public model with only the given fields, one class per combination.
+    """
+    return create_model(  # type: ignore[no-any-return, call-overload]
+        f"{model.__name__}Fields",
+        __base__=SQLModel,
+        **{name: (model.model_fields[name].annotation, ...) for name in fields},
+    )
+
+
+@cache
+def partial_page_model(
+    page_model: type[SQLModel], model: type[SQLModel], fields: tuple[str, ...]
+) -> type[SQLModel]:
+    """
+    A listing's model with rows of the partial model for the fields.
+    """
+    row_model = partial_model(model, fields)
+    rows: Any = list[row_model]  # type: ignore[valid-type]
+    return create_model(
+        f"{page_model.__name__}Fields", __base__=page_model, data=(rows, ...)
+    )
+
+
+def fields_response(model: type[SQLModel], content: Any) -> Response:
+    """
+    Serialize content as a partial model, in place of the endpoint's response
+    model which has all the fields.
+    """
+    return Response(
+        model.model_validate(content).model_dump_json(),
+        media_type="application/json",
+    )
+
+
+def page_response(
+    page: Page[Any],
+    page_model: type[SQLModel],
+    model: type[SQLModel],
+    fields: tuple[str, ...] | None,
+) -> Any:
+    """
+    A listing's page as its model, with rows of the public model, or with only
+    the given fields of it.
+    """
+    content = {
+        "data": page.rows,
+        "count": page.count,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    }
+    if fields is None:
+        return page_model.model_validate(content)
+    return fields_response(partial_page_model(page_model, model, fields), content)
@@ -0,0 +1,94 @@
+import uuid
+from dataclasses import dataclass
+from typing import Any, Literal
+
+from fastapi import HTTPException
+from sqlalchemy import ColumnElement
+from sqlmodel import select
+from sqlmodel.sql.expression import SelectOfScalar
+
+from app.models import HAS_DESCRIPTION, TITLE_SORT, Item
+
+ItemSort = Literal["id", "-id", "title", "-title"]
+
+# The index serving each listing allowed, by whether it's of one owner's items,
+# the sort, in either direction, and the filters. Other combinations are
+# rejected rather than scanning the table.
+LISTING_INDEXES: dict[tuple[bool, str, frozenset[str]], str] = {
+    (False, "id", frozenset()): "item_pkey",
+    (True, "id", frozenset()): "ix_item_owner_id_id",
+    (False, "id", frozenset({"has_description"})): "ix_item_has_description_id",
+    (True, "id", frozenset({"has_description"})): "ix_item_owner_id_has_description_id",
+    (False, "title", frozenset()): "ix_item_title_id",
+    (False, "title", frozenset({"title_prefix"})): "ix_item_title_id",
+    (True, "title", frozenset()): "ix_item_owner_id_title_id",
+    (True, "title", frozenset({"title_prefix"})): "ix_item_owner_id_title_id",
+}
+
+
+@dataclass
+class ItemListing:
+    statement: SelectOfScalar[Item]
+    # None to sort by id alone
+    sort: ColumnElement[Any] | None
+    descending: bool
+    # Whether rows are left out beyond the owner's, so that the owner's
+    # item count isn't the listing's
+    filtered: bool
+
+
+def prefix_upper_bound(prefix: str) -> str | None:
+    """
+    The first string after all those starting with prefix in code point order,
+    None if there's none.
+    """
+    while prefix:
+        code_point = ord(prefix[-1]) + 1
+        if code_point == 0xD800:
+            # Surrogates can't be stored
+            code_point = 0xE000
+        if code_point <= 0x10FFFF:
+            return prefix[:-1] + chr(code_point)
+        prefix = prefix[:-1]
+    return None
+
+
+def item_listing(
+    *,
+    owner_id: uuid.UUID | None,
+    sort: ItemSort = "id",
+    title_prefix: str | None = None,
+    has_description: bool | None = None,
+) -> ItemListing:
+    """
+    The statement listing the items of owner_id, or all items, filtered, and
+    how to sort it, raising a 400 error when no index serves the combination.
+
+    Title prefixes are matched case sensitively, as a range of the titles in
+    code point order, which is also the order of the title sort.
+    """
+    sort_name = sort.removeprefix("-")
+    filters = set()
+    statement = select(Item)
+    if owner_id is not None:
+        statement = statement.where(Item.owner_id == owner_id)
+    if title_prefix is not None:
+        filters.add("title_prefix")
+        statement = statement.where(TITLE_SORT >= title_prefix)
+        upper_bound = prefix_upper_bound(title_prefix)
+        if upper_bound is not None:
+            statement = statement.where(TITLE_SORT < upper_bound)
+    if has_description is not None:
+        filters.add("has_description")
+        statement = statement.where(HAS_DESCRIPTION == has_description)
+    if (owner_id is not None, sort_name, frozenset(filters)) not in LISTING_INDEXES:
+        msg = f"sort={sort} can't be combined with {' and '.join(sorted(filters))}"
+        raise HTTPException(
+            status_code=400, detail=[{"loc": ["query", "sort"], "msg": msg}]
+        )
+    return ItemListing(
+        statement=statement,
+        sort=TITLE_SORT if sort_name == "title" else None,
+        descending=sort.startswith("-"),
+        filtered=bool(filters),
+    )
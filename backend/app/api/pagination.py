@@ -0,0 +1,307 @@
+import base64
+import binascii
+import json
+import uuid
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, Generic, Literal, TypeVar, cast
+
+from fastapi import HTTPException
+from sqlalchemy import (
+    BigInteger,
+    ColumnElement,
+    Float,
+    case,
+    column,
+    func,
+    table,
+    tuple_,
+)
+from sqlalchemy import Select as SelectBase
+from sqlalchemy import cast as sql_cast
+from sqlalchemy.orm import InstrumentedAttribute, Mapped, aliased, load_only
+from sqlalchemy.orm.interfaces import ORMOption
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import Select, SelectOfScalar
+
+from app.core.config import settings
+from app.models import Counter
+
+T = TypeVar("T")
+S = TypeVar("S", bound=SelectBase[Any])
+
+Direction = Literal["next", "prev"]
+
+CountMode = Literal["exact", "estimated", "none"]
+
+pg_class = table("pg_class", column("oid"), column("reltuples", Float))
+
+
+def encode_payload(payload: dict[str, Any]) -> str:
+    """
+    Opaque cursor carrying the payload, as URL safe base64 of its JSON.
+    """
+    data = json.dumps(payload, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_payload(cursor: str) -> dict[str, Any]:
+    """
+    The payload of a cursor from encode_payload, raising a 400 error for
+    anything else.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return payload
+
+
+def encode_cursor(direction: Direction, key: uuid.UUID, sort: Any = None) -> str:
+    payload = {"dir": direction, "id": str(key)}
+    if sort is not None:
+        payload["sort"] = sort
+    return encode_payload(payload)
+
+
+def decode_cursor(
+    cursor: str, *, sorted: bool = False
+) -> tuple[Direction, tuple[Any, ...]]:
+    """
+    The direction of a cursor and the values of its row, its sort value then
+    its key when sorted, else its key.
+    """
+    payload = decode_payload(cursor)
+    try:
+        direction = payload["dir"]
+        if direction not in ("next", "prev"):
+            raise ValueError(f"Unknown direction {direction}")
+        key = uuid.UUID(payload["id"])
+        if not sorted:
+            return direction, (key,)
+        sort = payload["sort"]
+        if not isinstance(sort, str | int | float):
+            raise TypeError(f"Unexpected sort value {sort}")
+        return direction, (sort, key)
+    except (TypeError, KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@dataclass
+class Page(Generic[T]):
+    rows: Sequence[T]
+    # None when not requested
+    count: int | None
+    next_cursor: str | None
+    prev_cursor: str | None
+
+
+async def paginate(
+    session: AsyncSession,
+    statement: SelectOfScalar[T],
+    key: Mapped[uuid.UUID],
+    *,
+    cursor: str | None,
+    skip: int,
+    limit: int,
+    count: CountMode = "none",
+    total: SelectOfScalar[int] | None = None,
+    table_name: str | None = None,
+    fields: tuple[str, ...] | None = None,
+    sort: ColumnElement[Any] | None = None,
+    descending: bool = False,
+) -> Page[T]:
+    """
+    Fetch a page of the statement's rows ordered by key, a unique column,
+    together with the listing's total in the same statement.
+
+    With a cursor from a previous response the page starts right after, or
+    ends right before, the cursor's row, which an index on the key finds
+    directly however deep the page is. Without one, skip rows are skipped as
+    with OFFSET. The limit is capped at MAX_PAGE_SIZE.
+
+    With sort, an expression of the entity's columns that is never null, rows
+    are ordered by it then by key, which needs an index on both. The order is
+    reversed with descending, read backwards from the same index.
+
+    The count is as for count_rows, total being the statement giving the
+    exact count, typically from a maintained counter. Without one the
+    statement's rows are counted. Either way the count is a scalar subquery
+    of the page's statement, so both come from the same snapshot in a single
+    round trip. Only an empty page needs a second statement for its count,
+    having no row to carry it.
+
+    With fields, only those attributes of the entity are loaded, and its key.
+    """
+    limit = max(0, min(limit, settings.MAX_PAGE_SIZE))
+    key_name = cast(InstrumentedAttribute[uuid.UUID], key).key
+    direction: Direction = "next"
+    cursor_values = None
+    if cursor is not None:
+        direction, cursor_values = decode_cursor(cursor, sorted=sort is not None)
+
+    model = statement.column_descriptions[0]["entity"]
+    sort_values: list[Any] = []
+    row_count = None
+
+    if count == "none" and sort is None:
+        statement = _page_statement(
+            statement,
+            [key],
+            direction,
+            cursor_values,
+            descending=descending,
+            skip=skip,
+            limit=limit,
+        )
+        if fields is not None:
+            statement = statement.options(load_fields(model, fields))
+        rows = list((await session.exec(statement)).all())
+    else:
+        # The statement is wrapped to select the sort value and the count
+        # along with the entity, PostgreSQL merges the subquery back so the
+        # indexes of the key and the sort are still used
+        columns: list[ColumnElement[Any]] = []
+        if sort is not None:
+            columns.append(sort.label("sort"))
+        if count != "none":
+            if total is None:
+                total = select(func.count()).select_from(statement.subquery())
+            count_column: ColumnElement[Any] = total.scalar_subquery()
+            if count == "estimated" and table_name is not None:
+                estimate = (
+                    select(pg_class.c.reltuples)
+                    .where(pg_class.c.oid == func.to_regclass(table_name))
+                    .scalar_subquery()
+                )
+                count_column = case(
+                    (estimate >= 0, sql_cast(estimate, BigInteger)),
+                    else_=count_column,
+                )
+            columns.append(count_column.label("count"))
+        inner: SelectBase[Any] = statement
+        if fields is not None:
+            # Loader options don't apply to subqueries, only the fields'
+            # columns are selected instead
+            names = dict.fromkeys((*fields, key_name))
+            inner = statement.with_only_columns(
+                *(getattr(model, name) for name in names),
+                maintain_column_froms=True,
+            )
+        wrapped = inner.add_columns(*columns).subquery()
+        entity = aliased(model, wrapped)
+        keys = [getattr(entity, key_name)]
+        if sort is not None:
+            keys.insert(0, wrapped.c.sort)
+        page_statement: Select[Any, Any] = _page_statement(
+            select(entity, *(wrapped.c[column.name] for column in columns)),
+            keys,
+            direction,
+            cursor_values,
+            descending=descending,
+            skip=skip,
+            limit=limit,
+        )
+        if fields is not None:
+            page_statement = page_statement.options(load_fields(entity, fields))
+        results = (await session.exec(page_statement)).all()
+        rows = [row[0] for row in results]
+        if sort is not None:
+            sort_values = [row[1] for row in results]
+        if count != "none" and results:
+            row_count = int(results[0][-1])
+        elif count != "none" and total is not None:
+            # No row to carry the count
+            row_count = await count_rows(session, count, total, table_name=table_name)
+
+    more = len(rows) > limit
+    # The cursor's row itself is on the side the client came from
+    before = cursor is not None or skip > 0
+    rows = rows[:limit]
+    sort_values = sort_values[:limit]
+    if direction == "prev":
+        rows.reverse()
+        sort_values.reverse()
+        more, before = before, more
+    if not rows:
+        return Page(rows=rows, count=row_count, next_cursor=None, prev_cursor=None)
+
+    def cursor_at(direction: Direction, index: int) -> str:
+        sort_value = sort_values[index] if sort_values else None
+        return encode_cursor(direction, getattr(rows[index], key_name), sort_value)
+
+    next_cursor = cursor_at("next", -1) if more else None
+    prev_cursor = cursor_at("prev", 0) if before else None
+    return Page(
+        rows=rows, count=row_count, next_cursor=next_cursor, prev_cursor=prev_cursor
+    )
+
+
+def load_fields(entity: Any, fields: tuple[str, ...]) -> ORMOption:
+    """
+    Loader option selecting only the entity's columns for the fields, and its
+    primary key, which the ORM always loads.
+    """
+    return load_only(*(getattr(entity, name) for name in fields))
+
+
+def _page_statement(
+    statement: S,
+    keys: Sequence[ColumnElement[Any] | Mapped[Any]],
+    direction: Direction,
+    cursor_values: tuple[Any, ...] | None,
+    *,
+    descending: bool,
+    skip: int,
+    limit: int,
+) -> S:
+    # Pages before the cursor are read backwards, then reversed
+    ascending = (direction == "next") != descending
+    if cursor_values is None:
+        statement = statement.offset(skip)
+    else:
+        row = keys[0] if len(keys) == 1 else tuple_(*keys)
+        value = cursor_values[0] if len(keys) == 1 else tuple_(*cursor_values)
+        statement = statement.where(row > value if ascending else row < value)
+    statement = statement.order_by(*(k if ascending else k.desc() for k in keys))
+    # One more row tells whether there is a next page
+    return statement.limit(limit + 1)
+
+
+def table_count(table_name: str) -> SelectOfScalar[int]:
+    """
+    Exact row count of a whole table, from its counter shards.
+    """
+    return select(func.coalesce(func.sum(Counter.value), 0)).where(
+        Counter.name == table_name
+    )
+
+
+async def count_rows(
+    session: AsyncSession,
+    mode: CountMode,
+    exact: SelectOfScalar[int],
+    *,
+    table_name: str | None = None,
+) -> int | None:
+    """
+    Total for a listing as requested by the client: the exact statement's
+    result, the planner's estimate of the table's rows, or no count at all.
+
+    The estimate is only available for whole-table listings, others fall back
+    to the exact count, as does a table that has never been analyzed.
+    """
+    if mode == "none":
+        return None
+    if mode == "estimated" and table_name is not None:
+        statement = select(pg_class.c.reltuples).where(
+            pg_class.c.oid == func.to_regclass(table_name)
+        )
+        estimate = (await session.exec(statement)).first()
+        if estimate is not None and estimate >= 0:
+            return int(estimate)
+    return (await session.exec(exact)).one()
@@ -1,109 +1,465 @@
+import codecs
 import uuid
-from typing import Any
+from collections.abc import Sequence
+from typing import Annotated, Any
 
-from fastapi import APIRouter, HTTPException
-from sqlmodel import func, select
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import SelectOfScalar
 
-from app.api.deps import CurrentUser, SessionDep
-from app.models import Item, ItemCreate, ItemPublic, ItemsPublic, ItemUpdate, Message
+from app import crud
+from app.api.changes import read_changes
+from app.api.conditional import (
+    if_match_versions,
+    is_conditional,
+    not_modified,
+    not_modified_response,
+    page_tag,
+    precondition_failed,
+    version_tag,
+    with_validators,
+)
+from app.api.deps import (
+    CurrentUser,
+    CurrentUserClaims,
+    ReadSessionDep,
+    SessionDep,
+    get_current_active_superuser,
+)
+from app.api.export import ExportFormat, export_response
+from app.api.fields import (
+    Fields,
+    fields_response,
+    page_response,
+    parse_fields,
+    partial_model,
+)
+from app.api.item_filters import ItemSort, item_listing
+from app.api.pagination import CountMode, load_fields, paginate, table_count
+from app.api.search import SearchMode, search_items
+from app.core.config import settings
+from app.core.db import engine
+from app.import_items import ImportFormat, ItemImporter
+from app.models import (
+    Item,
+    ItemBulkUpdate,
+    ItemChangesPublic,
+    ItemCreate,
+    ItemImportReport,
+    ItemPublic,
+    ItemsPublic,
+    ItemUpdate,
+    Message,
+    User,
+)
 
 router = APIRouter(prefix="/items", tags=["items"])
 
+# Bodies of the bulk endpoints, arrays of at most MAX_BATCH_SIZE elements
+ItemsCreate = Annotated[
+    list[ItemCreate], Body(min_length=1, max_length=settings.MAX_BATCH_SIZE)
+]
+ItemsUpdate = Annotated[
+    list[ItemBulkUpdate], Body(min_length=1, max_length=settings.MAX_BATCH_SIZE)
+]
+ItemIds = Annotated[
+    list[uuid.UUID], Body(min_length=1, max_length=settings.MAX_BATCH_SIZE)
+]
+
 
 @router.get("/", response_model=ItemsPublic)
-def read_items(
-    session: SessionDep, current_user: CurrentUser, skip: int = 0, limit: int = 100
+async def read_items(
+    request: Request,
+    response: Response,
+    session: ReadSessionDep,
+    current_user: CurrentUserClaims,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode | None = None,
+    fields: Fields = None,
+    sort: ItemSort = "id",
+    title_prefix: Annotated[str | None, Query(min_length=1, max_length=255)] = None,
+    has_description: bool | None = None,
+    owner_id: uuid.UUID | None = None,
 ) -> Any:
     """
     Retrieve items.
+
+    Pass the next_cursor or prev_cursor of a response as cursor to get the
+    adjacent page, skip is ignored then. The count is exact, an estimate, or
+    left out with count=none, the default for filtered listings, which are
+    counted from every matching row. With fields, items only have those
+    fields.
+
+    Items are sorted by id or title, descending with a leading -, and can be
+    filtered by the start of their title, case sensitive, by whether they have
+    a description, and for superusers by owner. Combinations that no index
+    serves are rejected: title_prefix needs sort=title, has_description
+    sort=id, and they can't be combined.
+
+    The page's ETag changes with any of its items, answered 304 when it's the
+    If-None-Match without serializing the page.
     """
+    selected = parse_fields(fields, ItemPublic)
+    if not current_user.is_superuser:
+        if owner_id not in (None, current_user.id):
+            raise HTTPException(
+                status_code=403, detail="The user doesn't have enough privileges"
+            )
+        owner_id = current_user.id
+    listing = item_listing(
+        owner_id=owner_id,
+        sort=sort,
+        title_prefix=title_prefix,
+        has_description=has_description,
+    )
 
-    if current_user.is_superuser:
-        count_statement = select(func.count()).select_from(Item)
-        count = session.exec(count_statement).one()
-        statement = select(Item).offset(skip).limit(limit)
-        items = session.exec(statement).all()
+    if count is None:
+        count = "none" if listing.filtered else "exact"
+    total: SelectOfScalar[int] | None
+    if listing.filtered:
+        # Counted from the rows
+        total = None
+    elif owner_id is None:
+        total = table_count("item")
     else:
-        count_statement = (
-            select(func.count())
-            .select_from(Item)
-            .where(Item.owner_id == current_user.id)
-        )
-        count = session.exec(count_statement).one()
-        statement = (
-            select(Item)
-            .where(Item.owner_id == current_user.id)
-            .offset(skip)
-            .limit(limit)
-        )
-        items = session.exec(statement).all()
+        total = select(User.item_count).where(User.id == owner_id)
+    page = await paginate(
+        session,
+        listing.statement,
+        col(Item.id),
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        count=count,
+        total=total,
+        table_name="item" if owner_id is None and not listing.filtered else None,
+        # The versions are needed for the ETag
+        fields=None if selected is None else (*selected, "version"),
+        sort=listing.sort,
+        descending=listing.descending,
+    )
+    etag = page_tag(page)
+    if not_modified(request, etag):
+        return not_modified_response(etag)
+    content = page_response(page, ItemsPublic, ItemPublic, selected)
+    return with_validators(content, response, etag)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_items(
+    current_user: CurrentUserClaims, format: ExportFormat = "ndjson"
+) -> StreamingResponse:
+    """
+    Export all items as NDJSON or CSV, streamed however many there are.
+    """
+    statement = select(Item).order_by(col(Item.id))
+    if not current_user.is_superuser:
+        statement = statement.where(Item.owner_id == current_user.id)
+    return export_response(
+        statement, ItemPublic, format, user_id=current_user.id, filename="items"
+    )
+
+
+@router.get("/changes")
+async def read_item_changes(
+    session: ReadSessionDep,
+    current_user: CurrentUserClaims,
+    since: str | None = None,
+    limit: int = 100,
+) -> ItemChangesPublic:
+    """
+    Items created or updated, and ids of items deleted, since the cursor.
+
+    Start without since to get every item, then pass the next_cursor of each
+    response as since: while more is true to get the next page, later to get
+    the changes made meanwhile. A change may be sent again, never left out.
+    A cursor older than ITEM_TOMBSTONE_RETENTION_DAYS may be answered 410,
+    start again without since then.
+    """
+    return await read_changes(
+        session,
+        owner_id=None if current_user.is_superuser else current_user.id,
+        since=since,
+        limit=limit,
+    )
+
+
+@router.get("/search", response_model=ItemsPublic)
+async def search(
+    session: ReadSessionDep,
+    current_user: CurrentUserClaims,
+    q: Annotated[str, Query(min_length=1, max_length=255)],
+    mode: SearchMode = "text",
+    limit: int = 100,
+    cursor: str | None = None,
+) -> Any:
+    """
+    Search items by the words of their title and description, best matches
+    first, or with mode=autocomplete by the start of their title, tolerating
+    typos.
 
-    return ItemsPublic(data=items, count=count)
+    Pass the next_cursor of a response as cursor to get the next page. There's
+    no count.
+    """
+    page = await search_items(
+        session,
+        q,
+        mode=mode,
+        owner_id=None if current_user.is_superuser else current_user.id,
+        cursor=cursor,
+        limit=limit,
+    )
+    return page_response(page, ItemsPublic, ItemPublic, None)
 
 
 @router.get("/{id}", response_model=ItemPublic)
-def read_item(session: SessionDep, current_user: CurrentUser, id: uuid.UUID) -> Any:
+async def read_item(
+    request: Request,
+    response: Response,
+    session: ReadSessionDep,
+    current_user: CurrentUserClaims,
+    id: uuid.UUID,
+    fields: Fields = None,
+) -> Any:
     """
-    Get item by ID.
+    Get item by ID, with only the given fields if any.
+
+    Answered 304 when the item's ETag is the If-None-Match, or without one
+    when it wasn't changed since the If-Modified-Since.
     """
-    item = session.get(Item, id)
+    selected = parse_fields(fields, ItemPublic)
+    if is_conditional(request):
+        # Only what's needed to authorize and compare, not the whole row
+        statement = select(Item.owner_id, Item.version, Item.updated_at).where(
+            Item.id == id
+        )
+        row = (await session.exec(statement)).first()
+        if row is not None:
+            owner_id, version, updated_at = row
+            if current_user.is_superuser or owner_id == current_user.id:
+                etag = version_tag(version)
+                if not_modified(request, etag, updated_at):
+                    return not_modified_response(etag, updated_at)
+    options = []
+    if selected is not None:
+        # The owner is needed to authorize, the version and update time for
+        # the validators
+        names = (*selected, "owner_id", "version", "updated_at")
+        options.append(load_fields(Item, names))
+    item = await session.get(Item, id, options=options)
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     if not current_user.is_superuser and (item.owner_id != current_user.id):
         raise HTTPException(status_code=400, detail="Not enough permissions")
-    return item
+    etag, updated_at = version_tag(item.version), item.updated_at
+    content: Any = item
+    if selected is not None:
+        content = fields_response(partial_model(ItemPublic, selected), item)
+    return with_validators(content, response, etag, updated_at)
 
 
 @router.post("/", response_model=ItemPublic)
-def create_item(
-    *, session: SessionDep, current_user: CurrentUser, item_in: ItemCreate
+async def create_item(
+    *, session: SessionDep, current_user: CurrentUserClaims, item_in: ItemCreate
 ) -> Any:
     """
     Create new item.
     """
-    item = Item.model_validate(item_in, update={"owner_id": current_user.id})
-    session.add(item)
-    session.commit()
-    session.refresh(item)
+    try:
+        item = await crud.create_item_async(
+            session=session, item_in=item_in, owner_id=current_user.id
+        )
+    except IntegrityError:
+        # The owner's foreign key: in stateless auth mode, the token of a user
+        # deleted since it was issued still passes
+        await session.rollback()
+        raise HTTPException(status_code=404, detail="User not found")
     return item
 
 
+async def item_not_found(
+    session: AsyncSession, id: uuid.UUID, owner_id: uuid.UUID | None
+) -> HTTPException:
+    """
+    The error for a write that matched no item, whether there's none, it
+    belongs to another user than owner_id, or it isn't at the version the
+    write was conditional on, looked up only once the write failed.
+    """
+    item = await session.get(Item, id)
+    if item is None:
+        return HTTPException(status_code=404, detail="Item not found")
+    if owner_id is not None and item.owner_id != owner_id:
+        return HTTPException(status_code=400, detail="Not enough permissions")
+    return precondition_failed()
+
+
 @router.put("/{id}", response_model=ItemPublic)
-def update_item(
+async def update_item(
     *,
+    response: Response,
     session: SessionDep,
-    current_user: CurrentUser,
+    current_user: CurrentUserClaims,
     id: uuid.UUID,
     item_in: ItemUpdate,
+    if_match: Annotated[str | None, Header()] = None,
 ) -> Any:
     """
     Update an item.
+
+    With If-Match, only if the item's ETag is one of its tags, else the error
+    is 412: the item was changed since the client read it.
     """
-    item = session.get(Item, id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
-    update_dict = item_in.model_dump(exclude_unset=True)
-    item.sqlmodel_update(update_dict)
-    session.add(item)
-    session.commit()
-    session.refresh(item)
-    return item
+    owner_id = None if current_user.is_superuser else current_user.id
+    item = await crud.update_item_async(
+        session=session,
+        item_id=id,
+        item_in=item_in,
+        owner_id=owner_id,
+        versions=if_match_versions(if_match),
+    )
+    if item is None:
+        raise await item_not_found(session, id, owner_id)
+    return with_validators(item, response, version_tag(item.version), item.updated_at)
 
 
 @router.delete("/{id}")
-def delete_item(
-    session: SessionDep, current_user: CurrentUser, id: uuid.UUID
+async def delete_item(
+    session: SessionDep, current_user: CurrentUserClaims, id: uuid.UUID
 ) -> Message:
     """
     Delete an item.
     """
-    item = session.get(Item, id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Item not found")
-    if not current_user.is_superuser and (item.owner_id != current_user.id):
-        raise HTTPException(status_code=400, detail="Not enough permissions")
-    session.delete(item)
-    session.commit()
+    owner_id = None if current_user.is_superuser else current_user.id
+    if not await crud.delete_item_async(session=session, item_id=id, owner_id=owner_id):
+        raise await item_not_found(session, id, owner_id)
     return Message(message="Item deleted successfully")
+
+
+async def check_bulk_access(
+    session: AsyncSession,
+    current_user: User,
+    item_ids: Sequence[uuid.UUID],
+    loc: Sequence[str] = (),
+) -> None:
+    """
+    Lock the items for the rest of the transaction, raising a 400 error listing
+    each element that refers to an unknown item, to an item of another user,
+    or to an item already in the batch. Errors are reported in the format of
+    validation errors, at loc within each element.
+    """
+    statement = (
+        select(Item.id, Item.owner_id)
+        .where(col(Item.id).in_(item_ids))
+        .with_for_update()
+    )
+    owners = dict((await session.exec(statement)).all())
+    errors = []
+    seen = set()
+    for index, item_id in enumerate(item_ids):
+        if item_id in seen:
+            msg = "Duplicate item"
+        elif item_id not in owners:
+            msg = "Item not found"
+        elif not current_user.is_superuser and owners[item_id] != current_user.id:
+            msg = "Not enough permissions"
+        else:
+            msg = None
+        if msg:
+            errors.append({"loc": ["body", index, *loc], "msg": msg})
+        seen.add(item_id)
+    if errors:
+        raise HTTPException(status_code=400, detail=errors)
+
+
+@router.post("/bulk", response_model=list[ItemPublic])
+async def create_items(
+    *, session: SessionDep, current_user: CurrentUser, items_in: ItemsCreate
+) -> Any:
+    """
+    Create items, in one transaction.
+    """
+    return await crud.create_items_async(
+        session=session, items_in=items_in, owner_id=current_user.id
+    )
+
+
+@router.patch("/bulk", response_model=list[ItemPublic])
+async def update_items(
+    *, session: SessionDep, current_user: CurrentUser, items_in: ItemsUpdate
+) -> Any:
+    """
+    Update items, in one transaction. Only the fields given are changed.
+
+    Nothing is changed when any of the elements can't be applied, the error
+    lists each of those.
+    """
+    item_ids = [item_in.id for item_in in items_in]
+    await check_bulk_access(session, current_user, item_ids, loc=["id"])
+    return await crud.update_items_async(session=session, items_in=items_in)
+
+
+@router.post("/bulk-delete")
+async def delete_items(
+    *, session: SessionDep, current_user: CurrentUser, item_ids: ItemIds
+) -> Message:
+    """
+    Delete items, in one transaction.
+
+    Nothing is deleted when any of the ids can't be, the error lists each of
+    those.
+    """
+    await check_bulk_access(session, current_user, item_ids)
+    deleted = await crud.delete_items_async(session=session, item_ids=item_ids)
+    return Message(message=f"{deleted} items deleted successfully")
+
+
+@router.post("/import")
+async def import_items(
+    request: Request,
+    current_user: Annotated[User, Depends(get_current_active_superuser)],
+    format: ImportFormat = "csv",
+    owner_id: uuid.UUID | None = None,
+) -> ItemImportReport:
+    """
+    Load items from a CSV file with a header, or an NDJSON file, sent as the
+    request body. Rows are owned by the user of their owner_id field, else by
+    owner_id, else by the current user.
+
+    The body is streamed into COPY statements in one transaction. Rows that
+    aren't valid items are left out and listed in the report.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    # COPY goes through psycopg's sync connection, its calls are run in the
+    # threadpool
+    connection = await run_in_threadpool(engine.connect)
+    try:
+        await run_in_threadpool(connection.begin)
+        importer = ItemImporter(
+            connection, format, owner_id=owner_id or current_user.id
+        )
+        try:
+            async for chunk in request.stream():
+                await run_in_threadpool(importer.feed, decoder.decode(chunk))
+            await run_in_threadpool(importer.feed, decoder.decode(b"", final=True))
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="The file isn't UTF-8 text")
+        report = await run_in_threadpool(importer.finish)
+        await run_in_threadpool(connection.commit)
+    finally:
+        await run_in_threadpool(connection.close)
+    return report
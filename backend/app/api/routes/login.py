@@ -1,16 +1,25 @@
+import math
 from datetime import timedelta
 from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app import crud
-from app.api.deps import CurrentUser, SessionDep, get_current_active_superuser
+from app.api.deps import (
+    CurrentUser,
+    SessionDep,
+    decode_token,
+    get_current_active_superuser,
+)
 from app.core import security
+from app.core.cache import user_cache
 from app.core.config import settings
-from app.core.security import get_password_hash
-from app.models import Message, NewPassword, Token, UserPublic
+from app.core.ratelimit import login_throttle
+from app.core.security import get_password_hash_async
+from app.models import Message, NewPassword, Token, TokenRefresh, User, UserPublic
 from app.utils import (
     generate_password_reset_token,
     generate_reset_password_email,
@@ -21,30 +30,96 @@ from app.utils import (
 router = APIRouter(tags=["login"])
 
 
+def client_ip(request: Request) -> str:
+    # Behind a proxy, the client's only when the server resolves the proxy
+    # headers, see FORWARDED_ALLOW_IPS in deployment.md
+    return request.client.host if request.client else "unknown"
+
+
+async def throttle_attempt(*, request: Request, scope: str, account: str) -> None:
+    """
+    Reject the attempt with a 429 when the account or client IP is throttled.
+    """
+    retry_after = await login_throttle.acquire(
+        scope=scope, account=account, client_ip=client_ip(request)
+    )
+    if retry_after:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+
+def create_tokens(user: User) -> Token:
+    if not settings.AUTH_STATELESS:
+        access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        return Token(
+            access_token=security.create_access_token(
+                user.id, expires_delta=access_token_expires
+            )
+        )
+    access_token_expires = timedelta(
+        minutes=settings.STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES
+    )
+    refresh_token_expires = timedelta(minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES)
+    return Token(
+        access_token=security.create_access_token(
+            user.id,
+            expires_delta=access_token_expires,
+            claims={
+                "is_active": user.is_active,
+                "is_superuser": user.is_superuser,
+                "ver": user.token_version,
+            },
+        ),
+        refresh_token=security.create_refresh_token(
+            user.id,
+            token_version=user.token_version,
+            expires_delta=refresh_token_expires,
+        ),
+    )
+
+
 @router.post("/login/access-token")
-def login_access_token(
-    session: SessionDep, form_data: Annotated[OAuth2PasswordRequestForm, Depends()]
+async def login_access_token(
+    request: Request,
+    session: SessionDep,
+    form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
 ) -> Token:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    user = crud.authenticate(
+    await throttle_attempt(request=request, scope="login", account=form_data.username)
+    user = await crud.authenticate_async(
         session=session, email=form_data.username, password=form_data.password
     )
     if not user:
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    elif not user.is_active:
-        raise HTTPException(status_code=400, detail="Inactive user")
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    return Token(
-        access_token=security.create_access_token(
-            user.id, expires_delta=access_token_expires
-        )
+    await login_throttle.release(
+        scope="login", account=form_data.username, client_ip=client_ip(request)
     )
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return create_tokens(user)
+
+
+@router.post("/login/refresh-token")
+async def refresh_access_token(session: SessionDep, body: TokenRefresh) -> Token:
+    """
+    Exchange a refresh token for new access and refresh tokens
+    """
+    user_id, token_data = decode_token(body.refresh_token, token_type="refresh")
+    user = await session.get(User, user_id)
+    if not user or token_data.ver != user.token_version:
+        raise HTTPException(status_code=403, detail="Could not validate credentials")
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return create_tokens(user)
 
 
 @router.post("/login/test-token", response_model=UserPublic)
-def test_token(current_user: CurrentUser) -> Any:
+async def test_token(current_user: CurrentUser) -> Any:
     """
     Test access token
     """
@@ -52,11 +127,14 @@ def test_token(current_user: CurrentUser) -> Any:
 
 
 @router.post("/password-recovery/{email}")
-def recover_password(email: str, session: SessionDep) -> Message:
+async def recover_password(
+    email: str, request: Request, session: SessionDep
+) -> Message:
     """
     Password Recovery
     """
-    user = crud.get_user_by_email(session=session, email=email)
+    await throttle_attempt(request=request, scope="password-recovery", account=email)
+    user = await crud.get_user_by_email_async(session=session, email=email)
 
     if not user:
         raise HTTPException(
@@ -67,7 +145,8 @@ def recover_password(email: str, session: SessionDep) -> Message:
     email_data = generate_reset_password_email(
         email_to=user.email, email=email, token=password_reset_token
     )
-    send_email(
+    await run_in_threadpool(
+        send_email,
         email_to=user.email,
         subject=email_data.subject,
         html_content=email_data.html_content,
@@ -76,14 +155,14 @@ def recover_password(email: str, session: SessionDep) -> Message:
 
 
 @router.post("/reset-password/")
-def reset_password(session: SessionDep, body: NewPassword) -> Message:
+async def reset_password(session: SessionDep, body: NewPassword) -> Message:
     """
     Reset password
     """
     email = verify_password_reset_token(token=body.token)
     if not email:
         raise HTTPException(status_code=400, detail="Invalid token")
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await crud.get_user_by_email_async(session=session, email=email)
     if not user:
         raise HTTPException(
             status_code=404,
@@ -91,10 +170,13 @@ def reset_password(session: SessionDep, body: NewPassword) -> Message:
         )
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
-    hashed_password = get_password_hash(password=body.new_password)
+    user_id = user.id
+    hashed_password = await get_password_hash_async(body.new_password)
     user.hashed_password = hashed_password
+    user.token_version += 1
     session.add(user)
-    session.commit()
+    await session.commit()
+    user_cache.invalidate(user_id)
     return Message(message="Password updated successfully")
 
 
@@ -103,11 +185,11 @@ def reset_password(session: SessionDep, body: NewPassword) -> Message:
     dependencies=[Depends(get_current_active_superuser)],
     response_class=HTMLResponse,
 )
-def recover_password_html_content(email: str, session: SessionDep) -> Any:
+async def recover_password_html_content(email: str, session: SessionDep) -> Any:
     """
     HTML Content for Password Recovery
     """
-    user = crud.get_user_by_email(session=session, email=email)
+    user = await crud.get_user_by_email_async(session=session, email=email)
 
     if not user:
         raise HTTPException(
@@ -1,29 +1,63 @@
 import uuid
-from typing import Any
+from datetime import datetime
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import col, delete, func, select
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Request,
+    Response,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app import crud
+from app.api.conditional import (
+    if_match_versions,
+    is_conditional,
+    not_modified,
+    not_modified_response,
+    page_tag,
+    precondition_failed,
+    version_tag,
+    with_validators,
+)
 from app.api.deps import (
     CurrentUser,
+    ReadSessionDep,
     SessionDep,
     get_current_active_superuser,
 )
+from app.api.export import ExportFormat, export_response
+from app.api.fields import (
+    Fields,
+    fields_response,
+    page_response,
+    parse_fields,
+    partial_model,
+)
+from app.api.pagination import CountMode, load_fields, paginate, table_count
 from app.core.config import settings
-from app.core.security import get_password_hash, verify_password
+from app.core.security import verify_password_async
 from app.models import (
-    Item,
     Message,
     UpdatePassword,
     User,
     UserCreate,
     UserPublic,
+    UserPurge,
+    UserPurgePublic,
     UserRegister,
     UsersPublic,
     UserUpdate,
     UserUpdateMe,
 )
+from app.purge_users import purge_user
 from app.utils import generate_new_account_email, send_email
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -34,40 +68,82 @@ router = APIRouter(prefix="/users", tags=["users"])
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UsersPublic,
 )
-def read_users(session: SessionDep, skip: int = 0, limit: int = 100) -> Any:
+async def read_users(
+    request: Request,
+    response: Response,
+    session: ReadSessionDep,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: str | None = None,
+    count: CountMode = "exact",
+    fields: Fields = None,
+) -> Any:
     """
     Retrieve users.
-    """
 
-    count_statement = select(func.count()).select_from(User)
-    count = session.exec(count_statement).one()
+    Pass the next_cursor or prev_cursor of a response as cursor to get the
+    adjacent page, skip is ignored then. The count is exact, an estimate, or
+    left out with count=none. With fields, users only have those fields.
 
-    statement = select(User).offset(skip).limit(limit)
-    users = session.exec(statement).all()
+    The page's ETag changes with any of its users, answered 304 when it's the
+    If-None-Match without serializing the page.
+    """
+    selected = parse_fields(fields, UserPublic)
+    page = await paginate(
+        session,
+        select(User),
+        col(User.id),
+        cursor=cursor,
+        skip=skip,
+        limit=limit,
+        count=count,
+        total=table_count("user"),
+        table_name="user",
+        # The versions are needed for the ETag
+        fields=None if selected is None else (*selected, "version"),
+    )
+    etag = page_tag(page)
+    if not_modified(request, etag):
+        return not_modified_response(etag)
+    content = page_response(page, UsersPublic, UserPublic, selected)
+    return with_validators(content, response, etag)
 
-    return UsersPublic(data=users, count=count)
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_users(
+    current_user: Annotated[User, Depends(get_current_active_superuser)],
+    format: ExportFormat = "ndjson",
+) -> StreamingResponse:
+    """
+    Export all users as NDJSON or CSV, streamed however many there are.
+    """
+    statement = select(User).order_by(col(User.id))
+    return export_response(
+        statement, UserPublic, format, user_id=current_user.id, filename="users"
+    )
 
 
 @router.post(
     "/", dependencies=[Depends(get_current_active_superuser)], response_model=UserPublic
 )
-def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
+async def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
     """
     Create new user.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system.",
         )
 
-    user = crud.create_user(session=session, user_create=user_in)
+    user = await crud.create_user_async(session=session, user_create=user_in)
     if settings.emails_enabled and user_in.email:
         email_data = generate_new_account_email(
             email_to=user_in.email, username=user_in.email, password=user_in.password
         )
-        send_email(
+        await run_in_threadpool(
+            send_email,
             email_to=user_in.email,
             subject=email_data.subject,
             html_content=email_data.html_content,
@@ -76,7 +152,7 @@ def create_user(*, session: SessionDep, user_in: UserCreate) -> Any:
 
 
 @router.patch("/me", response_model=UserPublic)
-def update_user_me(
+async def update_user_me(
     *, session: SessionDep, user_in: UserUpdateMe, current_user: CurrentUser
 ) -> Any:
     """
@@ -84,49 +160,79 @@ def update_user_me(
     """
 
     if user_in.email:
-        existing_user = crud.get_user_by_email(session=session, email=user_in.email)
+        existing_user = await crud.get_user_by_email_async(
+            session=session, email=user_in.email
+        )
         if existing_user and existing_user.id != current_user.id:
             raise HTTPException(
                 status_code=409, detail="User with this email already exists"
             )
-    user_data = user_in.model_dump(exclude_unset=True)
-    current_user.sqlmodel_update(user_data)
-    session.add(current_user)
-    session.commit()
-    session.refresh(current_user)
-    return current_user
+    user_update = UserUpdate.model_validate(user_in.model_dump(exclude_unset=True))
+    return await crud.update_user_async(
+        session=session, db_user=current_user, user_in=user_update
+    )
 
 
 @router.patch("/me/password", response_model=Message)
-def update_password_me(
+async def update_password_me(
     *, session: SessionDep, body: UpdatePassword, current_user: CurrentUser
 ) -> Any:
     """
     Update own password.
     """
-    if not verify_password(body.current_password, current_user.hashed_password):
+    if not await verify_password_async(
+        body.current_password, current_user.hashed_password
+    ):
         raise HTTPException(status_code=400, detail="Incorrect password")
     if body.current_password == body.new_password:
         raise HTTPException(
             status_code=400, detail="New password cannot be the same as the current one"
         )
-    hashed_password = get_password_hash(body.new_password)
-    current_user.hashed_password = hashed_password
-    session.add(current_user)
-    session.commit()
+    # The token version is incremented by the UPDATE, the user may come from
+    # the user cache with an outdated one
+    await crud.update_user_async(
+        session=session,
+        db_user=current_user,
+        user_in=UserUpdate(password=body.new_password),
+    )
     return Message(message="Password updated successfully")
 
 
 @router.get("/me", response_model=UserPublic)
-def read_user_me(current_user: CurrentUser) -> Any:
+async def read_user_me(
+    request: Request, response: Response, session: SessionDep, current_user: CurrentUser
+) -> Any:
     """
     Get current user.
+
+    Answered 304 when the user's ETag is the If-None-Match, or without one
+    when it wasn't changed since the If-Modified-Since.
     """
-    return current_user
+    if is_conditional(request):
+        # The user usually comes from the user cache, which writes on other
+        # workers don't invalidate
+        validators = await user_validators(session, current_user.id)
+        if validators is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        if not_modified(request, *validators):
+            return not_modified_response(*validators)
+        if validators[0] != version_tag(current_user.version):
+            await session.refresh(current_user)
+    return with_validators(
+        current_user,
+        response,
+        version_tag(current_user.version),
+        current_user.updated_at,
+    )
 
 
 @router.delete("/me", response_model=Message)
-def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
+async def delete_user_me(
+    session: SessionDep,
+    current_user: CurrentUser,
+    background_tasks: BackgroundTasks,
+    response: Response,
+) -> Any:
     """
     Delete own user.
     """
@@ -134,43 +240,117 @@ def delete_user_me(session: SessionDep, current_user: CurrentUser) -> Any:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    session.delete(current_user)
-    session.commit()
-    return Message(message="User deleted successfully")
+    return await delete_user_or_purge(
+        session, current_user.id, background_tasks, response
+    )
 
 
 @router.post("/signup", response_model=UserPublic)
-def register_user(session: SessionDep, user_in: UserRegister) -> Any:
+async def register_user(session: SessionDep, user_in: UserRegister) -> Any:
     """
     Create new user without the need to be logged in.
     """
-    user = crud.get_user_by_email(session=session, email=user_in.email)
+    user = await crud.get_user_by_email_async(session=session, email=user_in.email)
     if user:
         raise HTTPException(
             status_code=400,
             detail="The user with this email already exists in the system",
         )
     user_create = UserCreate.model_validate(user_in)
-    user = crud.create_user(session=session, user_create=user_create)
+    user = await crud.create_user_async(session=session, user_create=user_create)
     return user
 
 
+async def delete_user_or_purge(
+    session: AsyncSession,
+    user_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+    response: Response,
+) -> Message:
+    """
+    Delete a user, or start purging one with many items in the background and
+    answer 202 with the location of the purge's status.
+    """
+    purge = await crud.delete_user_async(session=session, user_id=user_id)
+    if purge is None:
+        return Message(message="User deleted successfully")
+    background_tasks.add_task(purge_user, purge.id)
+    response.status_code = 202
+    response.headers["Location"] = f"{settings.API_V1_STR}/users/purges/{purge.id}"
+    return Message(message="User deletion in progress")
+
+
+@router.get(
+    "/purges/{purge_id}",
+    dependencies=[Depends(get_current_active_superuser)],
+    response_model=UserPurgePublic,
+)
+async def read_user_purge(session: SessionDep, purge_id: uuid.UUID) -> Any:
+    """
+    Get the progress of a user deletion.
+    """
+    purge = await session.get(UserPurge, purge_id)
+    if not purge:
+        raise HTTPException(status_code=404, detail="Purge not found")
+    return purge
+
+
+async def user_validators(
+    session: AsyncSession, user_id: uuid.UUID
+) -> tuple[str, datetime] | None:
+    """
+    The ETag and update time of a user, loading only those columns. None if
+    there's no such user.
+    """
+    statement = select(User.version, User.updated_at).where(User.id == user_id)
+    row = (await session.exec(statement)).first()
+    if row is None:
+        return None
+    version, updated_at = row
+    return version_tag(version), updated_at
+
+
 @router.get("/{user_id}", response_model=UserPublic)
-def read_user_by_id(
-    user_id: uuid.UUID, session: SessionDep, current_user: CurrentUser
+async def read_user_by_id(
+    request: Request,
+    response: Response,
+    user_id: uuid.UUID,
+    session: SessionDep,
+    current_user: CurrentUser,
+    fields: Fields = None,
 ) -> Any:
     """
-    Get a specific user by id.
+    Get a specific user by id, with only the given fields if any.
+
+    Answered 304 when the user's ETag is the If-None-Match, or without one
+    when it wasn't changed since the If-Modified-Since.
     """
-    user = session.get(User, user_id)
-    if user == current_user:
-        return user
-    if not current_user.is_superuser:
+    selected = parse_fields(fields, UserPublic)
+    if is_conditional(request) and (
+        user_id == current_user.id or current_user.is_superuser
+    ):
+        validators = await user_validators(session, user_id)
+        if validators and not_modified(request, *validators):
+            return not_modified_response(*validators)
+    options = []
+    if selected is not None:
+        # The version and update time are needed for the validators
+        names = (*selected, "version", "updated_at")
+        options.append(load_fields(User, names))
+    user = await session.get(User, user_id, options=options)
+    if user != current_user and not current_user.is_superuser:
         raise HTTPException(
             status_code=403,
             detail="The user doesn't have enough privileges",
         )
-    return user
+    if user is None:
+        return user
+    content: Any = user
+    if selected is not None:
+        content = fields_response(partial_model(UserPublic, selected), user)
+    return with_validators(
+        content, response, version_tag(user.version), user.updated_at
+    )
 
 
 @router.patch(
@@ -178,49 +358,63 @@ def read_user_by_id(
     dependencies=[Depends(get_current_active_superuser)],
     response_model=UserPublic,
 )
-def update_user(
+async def update_user(
     *,
+    response: Response,
     session: SessionDep,
     user_id: uuid.UUID,
     user_in: UserUpdate,
+    if_match: Annotated[str | None, Header()] = None,
 ) -> Any:
     """
     Update a user.
+
+    With If-Match, only if the user's ETag is one of its tags, else the error
+    is 412: the user was changed since the client read it.
     """
+    versions = if_match_versions(if_match)
 
-    db_user = session.get(User, user_id)
+    db_user = await session.get(User, user_id)
     if not db_user:
         raise HTTPException(
             status_code=404,
             detail="The user with this id does not exist in the system",
         )
     if user_in.email:
-        existing_user = crud.get_user_by_email(session=session, email=user_in.email)
+        existing_user = await crud.get_user_by_email_async(
+            session=session, email=user_in.email
+        )
         if existing_user and existing_user.id != user_id:
             raise HTTPException(
                 status_code=409, detail="User with this email already exists"
             )
 
-    db_user = crud.update_user(session=session, db_user=db_user, user_in=user_in)
-    return db_user
+    db_user = await crud.update_user_async(
+        session=session, db_user=db_user, user_in=user_in, versions=versions
+    )
+    if db_user is None:
+        raise precondition_failed()
+    return with_validators(
+        db_user, response, version_tag(db_user.version), db_user.updated_at
+    )
 
 
 @router.delete("/{user_id}", dependencies=[Depends(get_current_active_superuser)])
-def delete_user(
-    session: SessionDep, current_user: CurrentUser, user_id: uuid.UUID
+async def delete_user(
+    session: SessionDep,
+    current_user: CurrentUser,
+    user_id: uuid.UUID,
+    background_tasks: BackgroundTasks,
+    response: Response,
 ) -> Message:
     """
     Delete a user.
     """
-    user = session.get(User, user_id)
+    user = await session.get(User, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if user == current_user:
         raise HTTPException(
             status_code=403, detail="Super users are not allowed to delete themselves"
         )
-    statement = delete(Item).where(col(Item.owner_id) == user_id)
-    session.exec(statement)  # type: ignore
-    session.delete(user)
-    session.commit()
-    return Message(message="User deleted successfully")
+    return await delete_user_or_purge(session, user_id, background_tasks, response)
@@ -2,7 +2,19 @@ from fastapi import APIRouter, Depends
 from pydantic.networks import EmailStr
 
 from app.api.deps import get_current_active_superuser
-from app.models import Message
+from app.core.config import settings
+from app.core.db import async_engine, engine, replicas, statement_cache
+from app.core.pool import pool_stats
+from app.core.ratelimit import login_throttle
+from app.core.security import password_hash_pool
+from app.models import (
+    DatabasePoolStats,
+    DatabaseReadStats,
+    DatabaseStatementCacheStats,
+    LoginThrottleStats,
+    Message,
+    PasswordHashStats,
+)
 from app.utils import generate_test_email, send_email
 
 router = APIRouter(prefix="/utils", tags=["utils"])
@@ -26,6 +38,63 @@ def test_email(email_to: EmailStr) -> Message:
     return Message(message="Test email sent")
 
 
+@router.get(
+    "/password-hash-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def password_hash_stats() -> PasswordHashStats:
+    """
+    Queue depth and wait times of this worker's password hashing pool.
+    """
+    return PasswordHashStats.model_validate(password_hash_pool.stats())
+
+
+@router.get(
+    "/login-throttle-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def login_throttle_stats() -> LoginThrottleStats:
+    """
+    Admitted and rejected login attempts in this worker.
+    """
+    return LoginThrottleStats.model_validate(login_throttle.stats())
+
+
+@router.get(
+    "/db-pool-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def db_pool_stats() -> DatabasePoolStats:
+    """
+    Connection counts and checkout wait times of this worker's database pool.
+    """
+    api_engine = async_engine.sync_engine if settings.DATABASE_ASYNC else engine
+    return DatabasePoolStats.model_validate(pool_stats(api_engine))
+
+
+@router.get(
+    "/db-read-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def db_read_stats() -> DatabaseReadStats:
+    """
+    Reads served by each read replica and by the primary in this worker.
+    """
+    return DatabaseReadStats.model_validate(replicas.stats())
+
+
+@router.get(
+    "/db-statement-cache-stats/",
+    dependencies=[Depends(get_current_active_superuser)],
+)
+def db_statement_cache_stats() -> DatabaseStatementCacheStats:
+    """
+    Prepared statement hits and misses of this worker's database connections,
+    and the statements they have prepared.
+    """
+    return DatabaseStatementCacheStats.model_validate(statement_cache.stats())
+
+
 @router.get("/health-check/")
 async def health_check() -> bool:
     return True
@@ -0,0 +1,95 @@
+import uuid
+from typing import Any, Literal
+
+from fastapi import HTTPException
+from psycopg.errors import UndefinedFunction
+from sqlalchemy import REAL, ColumnElement, and_, cast, func, literal, or_
+from sqlalchemy.exc import ProgrammingError
+from sqlmodel import col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.pagination import Page, decode_payload, encode_payload
+from app.core.config import settings
+from app.models import SEARCH_CONFIG, SEARCH_VECTOR, Item
+
+SearchMode = Literal["text", "autocomplete"]
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _match(q: str, mode: SearchMode) -> tuple[ColumnElement[bool], ColumnElement[Any]]:
+    """
+    The condition for items matching the query, and their rank, higher first.
+    """
+    if mode == "text":
+        query = func.websearch_to_tsquery(SEARCH_CONFIG, q)
+        return SEARCH_VECTOR.bool_op("@@")(query), func.ts_rank_cd(SEARCH_VECTOR, query)
+    title = col(Item.title)
+    prefix = title.ilike(escape_like(q) + "%", escape="\\")
+    similar = literal(q).bool_op("<%")(title)
+    return or_(prefix, similar), func.word_similarity(q, title)
+
+
+def _decode_search_cursor(cursor: str) -> tuple[float, uuid.UUID]:
+    payload = decode_payload(cursor)
+    try:
+        return float(payload["rank"]), uuid.UUID(payload["id"])
+    except (TypeError, KeyError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def search_items(
+    session: AsyncSession,
+    q: str,
+    *,
+    mode: SearchMode = "text",
+    owner_id: uuid.UUID | None = None,
+    cursor: str | None = None,
+    limit: int = 100,
+) -> Page[Item]:
+    """
+    Items matching q, best first, only those of owner_id if given.
+
+    In text mode q is a web search query, as for websearch_to_tsquery, over the
+    words of the title and description with the title's ranked higher, served
+    by the GIN index on the search vector. In autocomplete mode titles match
+    when they start with q or have a word similar to it, tolerating typos,
+    which needs pg_trgm and is served by the title's trigram index.
+
+    Pages are keyset paginated on the rank and the id: the next_cursor carries
+    both for the page's last item. There's no count nor previous page. The
+    limit is capped at MAX_PAGE_SIZE.
+    """
+    limit = max(0, min(limit, settings.MAX_PAGE_SIZE))
+    condition, rank_expression = _match(q, mode)
+    rank = rank_expression.label("rank")
+    statement = select(Item, rank).where(condition)
+    if owner_id is not None:
+        statement = statement.where(Item.owner_id == owner_id)
+    if cursor is not None:
+        cursor_rank, cursor_id = _decode_search_cursor(cursor)
+        # Ranks are REAL, returned as their shortest decimal, which is only
+        # equal to the rank again once cast back
+        rank_value = cast(literal(cursor_rank), REAL)
+        statement = statement.where(
+            or_(
+                rank_expression < rank_value,
+                and_(rank_expression == rank_value, col(Item.id) > cursor_id),
+            )
+        )
+    # One more row tells whether there is a next page
+    statement = statement.order_by(rank.desc(), col(Item.id)).limit(limit + 1)
+    try:
+        results = (await session.exec(statement)).all()
+    except ProgrammingError as e:
+        if mode == "autocomplete" and isinstance(e.orig, UndefinedFunction):
+            raise HTTPException(status_code=501, detail="Autocomplete isn't available")
+        raise
+    rows = [item for item, _ in results[:limit]]
+    next_cursor = None
+    if len(results) > limit and rows:
+        last, last_rank = results[limit - 1]
+        next_cursor = encode_payload({"rank": last_rank, "id": str(last.id)})
+    return Page(rows=rows, count=None, next_cursor=next_cursor, prev_cursor=None)
@@ -0,0 +1,82 @@
+import argparse
+import logging
+import statistics
+import time
+from typing import Literal
+
+from app.core.config import Settings, settings
+from app.core.security import build_pwd_context
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+COST_SETTINGS = {
+    "bcrypt": ("PASSWORD_BCRYPT_ROUNDS", range(4, 32)),
+    "argon2": ("PASSWORD_ARGON2_TIME_COST", range(1, 65)),
+}
+
+
+def measure_hash_ms(config: Settings, samples: int) -> float:
+    pwd_context = build_pwd_context(config)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        pwd_context.hash("calibration-password")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(
+    *, scheme: Literal["bcrypt", "argon2"], target_ms: float, samples: int
+) -> tuple[int, float]:
+    """
+    Find the highest cost whose median hash time on this host fits the target.
+
+    Returns the cost and its measured time. If even the lowest cost is over
+    budget, the lowest cost is returned.
+    """
+    setting_name, costs = COST_SETTINGS[scheme]
+    best: tuple[int, float] | None = None
+    for cost in costs:
+        config = settings.model_copy(
+            update={"PASSWORD_HASH_SCHEME": scheme, setting_name: cost}
+        )
+        elapsed_ms = measure_hash_ms(config, samples)
+        logger.info(f"{scheme} {setting_name}={cost}: {elapsed_ms:.1f} ms")
+        if elapsed_ms > target_ms:
+            return best or (cost, elapsed_ms)
+        best = (cost, elapsed_ms)
+    assert best
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Pick the password hash cost that fits a latency budget"
+    )
+    parser.add_argument(
+        "--scheme", choices=sorted(COST_SETTINGS), default=settings.PASSWORD_HASH_SCHEME
+    )
+    parser.add_argument(
+        "--target-ms", type=float, default=settings.PASSWORD_HASH_TARGET_MS
+    )
+    parser.add_argument("--samples", type=int, default=5)
+    args = parser.parse_args()
+
+    logger.info(f"Calibrating {args.scheme} for {args.target_ms:.0f} ms per hash")
+    cost, elapsed_ms = calibrate(
+        scheme=args.scheme, target_ms=args.target_ms, samples=args.samples
+    )
+    setting_name, _ = COST_SETTINGS[args.scheme]
+    if elapsed_ms > args.target_ms:
+        logger.warning(
+            f"The lowest cost takes {elapsed_ms:.1f} ms, over the target budget"
+        )
+    logger.info(
+        f"Set PASSWORD_HASH_SCHEME={args.scheme} and {setting_name}={cost} "
+        f"({elapsed_ms:.1f} ms per hash)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,7 @@ from pydantic import (
     AnyUrl,
     BeforeValidator,
     EmailStr,
+    Field,
     HttpUrl,
     PostgresDsn,
     computed_field,
@@ -34,8 +35,47 @@ class Settings(BaseSettings):
     SECRET_KEY: str = secrets.token_urlsafe(32)
     # 60 minutes * 24 hours * 8 days = 8 days
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
+    # Stateless auth: short-lived access tokens carry the user's claims so
+    # read-only routes skip the user lookup, and refresh tokens renew them
+    AUTH_STATELESS: bool = False
+    STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
+    REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8
     FRONTEND_HOST: str = "http://localhost:5173"
     ENVIRONMENT: Literal["local", "staging", "production"] = "local"
+    # Largest page listing endpoints return, whatever limit is requested
+    MAX_PAGE_SIZE: int = 1000
+    # Most elements accepted by the bulk endpoints in one request
+    MAX_BATCH_SIZE: int = 1000
+    # Items deleted per transaction when deleting a user. Users with more are
+    # deactivated and purged in the background, see app.purge_users.
+    USER_PURGE_BATCH_SIZE: int = Field(default=10_000, ge=1)
+    # Tombstones of deleted items are pruned after this many days, see
+    # app.prune_tombstones; the change feed answers 410 to older cursors.
+    ITEM_TOMBSTONE_RETENTION_DAYS: int = Field(default=30, ge=1)
+    ITEM_TOMBSTONE_PRUNE_BATCH_SIZE: int = Field(default=10_000, ge=1)
+    # Per-process cache of authenticated users; set the size to 0 to disable
+    USER_CACHE_TTL_SECONDS: int = 30
+    USER_CACHE_MAX_SIZE: int = 1024
+    # Per-process cache of decoded bearer tokens; set to 0 to disable
+    TOKEN_CACHE_MAX_SIZE: int = 10000
+    # Threads per worker process reserved for password hashing
+    PASSWORD_HASH_WORKERS: int = 2
+    # Password hashing policy, tune it with app/calibrate_password_hash.py.
+    # argon2 needs the optional argon2-cffi package.
+    PASSWORD_HASH_SCHEME: Literal["bcrypt", "argon2"] = "bcrypt"
+    PASSWORD_HASH_TARGET_MS: int = 250
+    PASSWORD_BCRYPT_ROUNDS: int = 12
+    PASSWORD_ARGON2_TIME_COST: int = 3
+    PASSWORD_ARGON2_MEMORY_COST: int = 65536  # KiB
+    PASSWORD_ARGON2_PARALLELISM: int = 4
+    # Token buckets for failed logins and password recovery requests. The
+    # sqlite backend shares buckets between the worker processes of a host.
+    LOGIN_THROTTLE_BACKEND: Literal["memory", "sqlite"] = "memory"
+    LOGIN_THROTTLE_SQLITE_PATH: str = "/tmp/login-throttle.sqlite3"
+    LOGIN_THROTTLE_ACCOUNT_CAPACITY: int = Field(default=5, gt=0)
+    LOGIN_THROTTLE_ACCOUNT_REFILL_PER_MINUTE: float = Field(default=1, gt=0)
+    LOGIN_THROTTLE_IP_CAPACITY: int = Field(default=30, gt=0)
+    LOGIN_THROTTLE_IP_REFILL_PER_MINUTE: float = Field(default=10, gt=0)
 
     BACKEND_CORS_ORIGINS: Annotated[
         list[AnyUrl] | str, BeforeValidator(parse_cors)
@@ -55,6 +95,34 @@ class Settings(BaseSettings):
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str = ""
     POSTGRES_DB: str = ""
+    # Serve the API on psycopg's async driver, or on the sync one with database
+    # calls run in the threadpool
+    DATABASE_ASYNC: bool = True
+    # Connection pool of each worker process. A recycle of -1 keeps connections
+    # open indefinitely; pre-ping tests connections before handing them out.
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_TIMEOUT: float = 30
+    DATABASE_POOL_RECYCLE: int = -1
+    DATABASE_POOL_PRE_PING: bool = False
+    DATABASE_POOL_RESET_ON_RETURN: Literal["rollback", "commit", "none"] = "rollback"
+    # psycopg prepares a statement on the server once it ran this many times on
+    # a connection, None never does, and keeps the last ones used prepared.
+    # Turn on the PgBouncer mode behind a PgBouncer in transaction pooling mode,
+    # where the next transaction may run on another server connection; it
+    # disables prepared statements.
+    DATABASE_PREPARE_THRESHOLD: int | None = Field(default=5, ge=0)
+    DATABASE_PREPARED_MAX: int = Field(default=100, ge=1)
+    DATABASE_PGBOUNCER: bool = False
+    # Read replicas for the read-only endpoints, as a comma separated list of
+    # postgresql:// URLs. One that can't be reached is skipped for the retry
+    # period. Users are served from the primary for the sticky period after
+    # their own writes, so that they don't read data older than those.
+    DATABASE_REPLICA_URLS: Annotated[
+        list[PostgresDsn] | str, BeforeValidator(parse_cors)
+    ] = []
+    DATABASE_REPLICA_RETRY_SECONDS: float = 10
+    DATABASE_REPLICA_STICKY_SECONDS: float = Field(default=5, ge=0)
 
     @computed_field  # type: ignore[prop-decorator]
     @property
@@ -68,6 +136,16 @@ class Settings(BaseSettings):
             path=self.POSTGRES_DB,
         )
 
+    @computed_field  # type: ignore[prop-decorator]
+    @property
+    def SQLALCHEMY_REPLICA_URIS(self) -> list[str]:
+        # With the driver of SQLALCHEMY_DATABASE_URI
+        return [
+            "postgresql+psycopg" + str(url).removeprefix(url.scheme)
+            for url in self.DATABASE_REPLICA_URLS
+            if isinstance(url, PostgresDsn)
+        ]
+
     SMTP_TLS: bool = True
     SMTP_SSL: bool = False
     SMTP_PORT: int = 587
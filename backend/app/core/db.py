@@ -1,10 +1,127 @@
+from collections.abc import AsyncIterator, Sequence
+from functools import partial
+from typing import Any
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import ScalarResult
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, create_engine, select
 
 from app import crud
 from app.core.config import settings
+from app.core.pool import (
+    ReplicaSet,
+    StatementCache,
+    TimedAsyncAdaptedQueuePool,
+    TimedQueuePool,
+    pool_options,
+)
 from app.models import User, UserCreate
 
-engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+# The API runs on the async engine unless DATABASE_ASYNC is off, scripts like
+# initial_data.py and the tests use the sync one. Both use psycopg, which picks
+# its asyncio driver for the async engine.
+engine = create_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=TimedQueuePool,
+    **pool_options(settings),
+)
+async_engine = create_async_engine(
+    str(settings.SQLALCHEMY_DATABASE_URI),
+    poolclass=TimedAsyncAdaptedQueuePool,
+    **pool_options(settings),
+)
+# Serve the read-only endpoints through app.api.deps.ReadSessionDep
+replicas = ReplicaSet(settings.SQLALCHEMY_REPLICA_URIS, settings)
+
+statement_cache = StatementCache(settings)
+for _engine in [
+    engine,
+    async_engine.sync_engine,
+    *replicas.engines,
+    *(replica.sync_engine for replica in replicas.async_engines),
+]:
+    statement_cache.install(_engine)
+
+
+class ThreadpoolSession:
+    """
+    The AsyncSession methods used by the API over a sync Session, each call
+    running in the threadpool. Serves requests on the sync engine when
+    DATABASE_ASYNC is off.
+
+    Results are fetched in full by psycopg's client-side cursors, so reading
+    them afterwards doesn't block.
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.sync_session = session
+
+    @property
+    def info(self) -> dict[Any, Any]:
+        return self.sync_session.info
+
+    def add(self, instance: Any) -> None:
+        self.sync_session.add(instance)
+
+    async def connection(self) -> Any:
+        return await run_in_threadpool(self.sync_session.connection)
+
+    async def exec(self, statement: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(
+            partial(self.sync_session.exec, statement, **kwargs)
+        )
+
+    async def stream_scalars(
+        self, statement: Any, **kwargs: Any
+    ) -> "ThreadpoolScalarResult":
+        result = await run_in_threadpool(
+            partial(self.sync_session.scalars, statement, **kwargs)
+        )
+        return ThreadpoolScalarResult(result)
+
+    async def get(self, entity: Any, ident: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(
+            partial(self.sync_session.get, entity, ident, **kwargs)
+        )
+
+    async def merge(self, instance: Any, **kwargs: Any) -> Any:
+        return await run_in_threadpool(
+            partial(self.sync_session.merge, instance, **kwargs)
+        )
+
+    async def refresh(self, instance: Any, **kwargs: Any) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, **kwargs)
+
+    async def delete(self, instance: Any) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+
+class ThreadpoolScalarResult:
+    """
+    The AsyncScalarResult methods used by the API over a ScalarResult, each
+    fetch running in the threadpool.
+    """
+
+    def __init__(self, result: ScalarResult[Any]) -> None:
+        self.result = result
+
+    async def partitions(self, size: int | None = None) -> AsyncIterator[Sequence[Any]]:
+        partitions = self.result.partitions(size)
+        while partition := await run_in_threadpool(next, partitions, None):
+            yield partition
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -0,0 +1,290 @@
+import logging
+import os
+import threading
+import time
+import weakref
+from collections import Counter, OrderedDict
+from typing import Any
+
+import psycopg
+from psycopg._preparing import Prepare, PrepareManager
+from psycopg._queries import PostgresQuery
+from sqlalchemy import Engine, create_engine, event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
+
+from app.core.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class CheckoutTimer:
+    """
+    Count of connection checkouts and the time spent waiting for them, which
+    includes opening a new connection when the pool has none idle.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def record(self, wait: float) -> None:
+        with self._lock:
+            self._checkouts += 1
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "checkouts": self._checkouts,
+                "wait_seconds_avg": (
+                    self._wait_total / self._checkouts if self._checkouts else 0.0
+                ),
+                "wait_seconds_max": self._wait_max,
+            }
+
+
+class _TimedPoolMixin:
+    # A class attribute, so that it survives the pool being recreated when its
+    # engine is disposed
+    checkout_timer: CheckoutTimer
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.perf_counter()
+        entry: ConnectionPoolEntry = super()._do_get()  # type: ignore[misc]
+        self.checkout_timer.record(time.perf_counter() - started)
+        return entry
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    checkout_timer = CheckoutTimer()
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    checkout_timer = CheckoutTimer()
+
+
+def pool_options(config: Settings) -> dict[str, Any]:
+    """
+    Keyword arguments for create_engine and create_async_engine.
+    """
+    reset_on_return = config.DATABASE_POOL_RESET_ON_RETURN
+    return {
+        "pool_size": config.DATABASE_POOL_SIZE,
+        "max_overflow": config.DATABASE_MAX_OVERFLOW,
+        "pool_timeout": config.DATABASE_POOL_TIMEOUT,
+        "pool_recycle": config.DATABASE_POOL_RECYCLE,
+        "pool_pre_ping": config.DATABASE_POOL_PRE_PING,
+        "pool_reset_on_return": None if reset_on_return == "none" else reset_on_return,
+    }
+
+
+def pool_stats(engine: Engine) -> dict[str, Any]:
+    """
+    Connection counts and checkout wait times of an engine's pool in this
+    worker process.
+    """
+    pool = engine.pool
+    assert isinstance(pool, _TimedPoolMixin) and isinstance(pool, QueuePool)
+    return {
+        "pid": os.getpid(),
+        "pool_size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        **pool.checkout_timer.stats(),
+    }
+
+
+class _CountingPrepareManager(PrepareManager):
+    # psycopg's statement cache of a connection, which tells on each execution
+    # whether the statement is prepared already or should be now
+    statement_cache: "StatementCache"
+
+    def get(
+        self, query: PostgresQuery, prepare: bool | None = None
+    ) -> tuple[Prepare, bytes]:
+        prep, name = super().get(query, prepare)
+        self.statement_cache.record(prep)
+        return prep, name
+
+
+def _can_count(connection: Any) -> bool:
+    # The counting swaps psycopg's private statement cache of a connection for
+    # a subclass, as psycopg has no public hook for it; only done when the
+    # cache is the one of the versions pyproject.toml allows
+    manager = getattr(connection, "_prepared", None)
+    return type(manager) is PrepareManager and isinstance(
+        getattr(manager, "_names", None), OrderedDict
+    )
+
+
+class StatementCache:
+    """
+    Server-side prepared statements of the connections of the engines it's
+    installed on. psycopg prepares a statement on a connection once it ran
+    DATABASE_PREPARE_THRESHOLD times there and keeps the DATABASE_PREPARED_MAX
+    last used ones, except in PgBouncer mode where nothing is prepared.
+
+    Counts the executions of a prepared statement, hits, and the others, which
+    are parsed and planned again, misses. Prepares are the misses that
+    prepared their statement. The counts are None when the psycopg installed
+    doesn't keep its statement cache the way the counting expects; the
+    statements are prepared all the same.
+    """
+
+    def __init__(self, config: Settings) -> None:
+        self.prepare_threshold = (
+            None if config.DATABASE_PGBOUNCER else config.DATABASE_PREPARE_THRESHOLD
+        )
+        self.prepared_max = config.DATABASE_PREPARED_MAX
+        self.counting = True
+        self._lock = threading.Lock()
+        self._counts = {Prepare.YES: 0, Prepare.NO: 0, Prepare.SHOULD: 0}
+        self._managers: weakref.WeakSet[PrepareManager] = weakref.WeakSet()
+
+    def install(self, engine: Engine) -> None:
+        event.listen(engine, "connect", self._on_connect)
+
+    def _on_connect(self, _dbapi_connection: Any, record: ConnectionPoolEntry) -> None:
+        connection = record.driver_connection
+        assert connection is not None
+        connection.prepare_threshold = self.prepare_threshold
+        connection.prepared_max = self.prepared_max
+        if not self.counting:
+            return
+        if not _can_count(connection):
+            logger.warning(
+                "Not counting prepared statements, unsupported psycopg %s",
+                psycopg.__version__,
+            )
+            self.counting = False
+            return
+        # Swap in a counting cache, with the state of the connection's own
+        manager = _CountingPrepareManager()
+        vars(manager).update(vars(connection._prepared))
+        manager.statement_cache = self
+        connection._prepared = manager
+        self._managers.add(manager)
+
+    def record(self, prep: Prepare) -> None:
+        with self._lock:
+            self._counts[prep] += 1
+
+    def stats(self) -> dict[str, Any]:
+        config = {
+            "prepare_threshold": self.prepare_threshold,
+            "prepared_max": self.prepared_max,
+        }
+        if not self.counting:
+            return {
+                **config,
+                "hits": None,
+                "misses": None,
+                "prepares": None,
+                "connections": None,
+                "prepared_statements": None,
+                "statements": [],
+            }
+        statements: Counter[str] = Counter()
+        managers = list(self._managers)
+        for manager in managers:
+            try:
+                keys = list(manager._names)
+            except RuntimeError:
+                # Changed meanwhile by a query in another thread, left out
+                continue
+            statements.update(query.decode() for query, _types in keys)
+        with self._lock:
+            hits = self._counts[Prepare.YES]
+            misses = self._counts[Prepare.NO] + self._counts[Prepare.SHOULD]
+            prepares = self._counts[Prepare.SHOULD]
+        return {
+            **config,
+            "hits": hits,
+            "misses": misses,
+            "prepares": prepares,
+            "connections": len(managers),
+            "prepared_statements": statements.total(),
+            "statements": [
+                {"statement": statement, "connections": connections}
+                for statement, connections in statements.most_common()
+            ],
+        }
+
+
+class ReplicaSet:
+    """
+    Engines of the read replicas, handed out in turn. Each is a sync engine
+    and an async one, as for the primary.
+
+    Connections are pinged when checked out. A replica that can't be reached
+    is marked down and left out for DATABASE_REPLICA_RETRY_SECONDS, then
+    tried again.
+    """
+
+    def __init__(self, urls: list[str], config: Settings) -> None:
+        options = {**pool_options(config), "pool_pre_ping": True}
+        self.urls = urls
+        self.engines = [create_engine(url, **options) for url in urls]
+        self.async_engines = [create_async_engine(url, **options) for url in urls]
+        self.retry_seconds = config.DATABASE_REPLICA_RETRY_SECONDS
+        self._lock = threading.Lock()
+        self._turn = 0
+        self._down_until = [0.0] * len(urls)
+        self._reads = [0] * len(urls)
+        self._primary_reads = 0
+
+    def available(self) -> list[int]:
+        """
+        Indexes of the replicas to try for a read, the next one in turn first,
+        leaving out those marked down.
+        """
+        if not self.urls:
+            return []
+        count = len(self.urls)
+        now = time.monotonic()
+        with self._lock:
+            start = self._turn
+            self._turn = (start + 1) % count
+            order = [(start + offset) % count for offset in range(count)]
+            return [index for index in order if self._down_until[index] <= now]
+
+    def mark_down(self, index: int) -> None:
+        with self._lock:
+            self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def record_read(self, index: int | None) -> None:
+        """
+        Count a read served by a replica, or by the primary when index is None.
+        """
+        with self._lock:
+            if index is None:
+                self._primary_reads += 1
+            else:
+                self._reads[index] += 1
+
+    def stats(self) -> dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "primary_reads": self._primary_reads,
+                "replicas": [
+                    {
+                        "url": make_url(url).render_as_string(hide_password=True),
+                        "available": self._down_until[index] <= now,
+                        "reads": self._reads[index],
+                    }
+                    for index, url in enumerate(self.urls)
+                ],
+            }
+
+    async def dispose(self) -> None:
+        for async_engine in self.async_engines:
+            await async_engine.dispose()
+        for engine in self.engines:
+            engine.dispose()
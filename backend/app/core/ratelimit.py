@@ -0,0 +1,228 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for token buckets.
+
+    ``take`` removes one token from the bucket under ``key`` and returns 0, or
+    returns the seconds until a token is available when the bucket is empty.
+    Buckets start full and refill continuously at ``refill_rate`` tokens per
+    second up to ``capacity``.
+
+    Backends that do I/O set ``blocking``, so that LoginThrottle calls them
+    from the threadpool rather than on the event loop.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def take(self, key: str, capacity: float, refill_rate: float) -> float: ...
+
+    @abstractmethod
+    def give_back(self, key: str, capacity: float, refill_rate: float) -> None: ...
+
+    @abstractmethod
+    def clear(self) -> None: ...
+
+
+def _refill(
+    tokens: float, updated_at: float, now: float, capacity: float, refill_rate: float
+) -> float:
+    return min(capacity, tokens + max(0.0, now - updated_at) * refill_rate)
+
+
+class MemoryRateLimitBackend(RateLimitBackend):
+    """
+    Buckets held in this process. Least recently used buckets are dropped past
+    ``max_keys``, which resets them to full.
+    """
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _update(
+        self, key: str, capacity: float, refill_rate: float, delta: float
+    ) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = _refill(tokens, updated_at, now, capacity, refill_rate)
+            if tokens + delta < 0:
+                return (-delta - tokens) / refill_rate
+            self._buckets[key] = (min(capacity, tokens + delta), now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0.0
+
+    def take(self, key: str, capacity: float, refill_rate: float) -> float:
+        return self._update(key, capacity, refill_rate, -1)
+
+    def give_back(self, key: str, capacity: float, refill_rate: float) -> None:
+        self._update(key, capacity, refill_rate, 1)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class SQLiteRateLimitBackend(RateLimitBackend):
+    """
+    Buckets stored in a local SQLite file, so that all worker processes on a
+    host share the same limits.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS bucket "
+                "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def _update(
+        self, key: str, capacity: float, refill_rate: float, delta: float
+    ) -> float:
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT tokens, updated_at FROM bucket WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated_at = row or (capacity, now)
+            tokens = _refill(tokens, updated_at, now, capacity, refill_rate)
+            if tokens + delta < 0:
+                connection.execute("ROLLBACK")
+                return (-delta - tokens) / refill_rate
+            connection.execute(
+                "INSERT OR REPLACE INTO bucket (key, tokens, updated_at) "
+                "VALUES (?, ?, ?)",
+                (key, min(capacity, tokens + delta), now),
+            )
+            connection.execute("COMMIT")
+            return 0.0
+        finally:
+            connection.close()
+
+    def take(self, key: str, capacity: float, refill_rate: float) -> float:
+        return self._update(key, capacity, refill_rate, -1)
+
+    def give_back(self, key: str, capacity: float, refill_rate: float) -> None:
+        self._update(key, capacity, refill_rate, 1)
+
+    def clear(self) -> None:
+        with self._connect() as connection:
+            connection.execute("DELETE FROM bucket")
+
+
+class LoginThrottle:
+    """
+    Token-bucket throttling of login attempts per account and per client IP.
+
+    Every attempt takes a token from both buckets before any password hashing
+    is done; callers give the tokens back when the attempt succeeds, so only
+    failed attempts drain the buckets.
+    """
+
+    def __init__(
+        self,
+        backend: RateLimitBackend,
+        *,
+        account_capacity: float,
+        account_refill_per_minute: float,
+        ip_capacity: float,
+        ip_refill_per_minute: float,
+    ) -> None:
+        self.backend = backend
+        self._account_limit = (account_capacity, account_refill_per_minute / 60)
+        self._ip_limit = (ip_capacity, ip_refill_per_minute / 60)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._rejected_account = 0
+        self._rejected_ip = 0
+
+    async def _run(self, func: Callable[..., T], *args: Any) -> T:
+        if self.backend.blocking:
+            return await run_in_threadpool(func, *args)
+        return func(*args)
+
+    async def acquire(self, *, scope: str, account: str, client_ip: str) -> float:
+        """
+        Take a token for an attempt. Returns 0 when the attempt is admitted,
+        otherwise the seconds to wait before retrying.
+        """
+        return await self._run(self._acquire, scope, account, client_ip)
+
+    def _acquire(self, scope: str, account: str, client_ip: str) -> float:
+        ip_key = f"{scope}:ip:{client_ip}"
+        account_key = f"{scope}:account:{account.lower()}"
+        retry_after = self.backend.take(ip_key, *self._ip_limit)
+        if retry_after:
+            with self._lock:
+                self._rejected_ip += 1
+            return retry_after
+        retry_after = self.backend.take(account_key, *self._account_limit)
+        if retry_after:
+            self.backend.give_back(ip_key, *self._ip_limit)
+            with self._lock:
+                self._rejected_account += 1
+            return retry_after
+        with self._lock:
+            self._admitted += 1
+        return 0.0
+
+    async def release(self, *, scope: str, account: str, client_ip: str) -> None:
+        """
+        Give back the tokens of a successful attempt.
+        """
+        await self._run(self._release, scope, account, client_ip)
+
+    def _release(self, scope: str, account: str, client_ip: str) -> None:
+        self.backend.give_back(f"{scope}:ip:{client_ip}", *self._ip_limit)
+        self.backend.give_back(
+            f"{scope}:account:{account.lower()}", *self._account_limit
+        )
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "admitted": self._admitted,
+                "rejected_account": self._rejected_account,
+                "rejected_ip": self._rejected_ip,
+            }
+
+
+def _get_backend() -> RateLimitBackend:
+    if settings.LOGIN_THROTTLE_BACKEND == "sqlite":
+        return SQLiteRateLimitBackend(settings.LOGIN_THROTTLE_SQLITE_PATH)
+    return MemoryRateLimitBackend()
+
+
+login_throttle = LoginThrottle(
+    _get_backend(),
+    account_capacity=settings.LOGIN_THROTTLE_ACCOUNT_CAPACITY,
+    account_refill_per_minute=settings.LOGIN_THROTTLE_ACCOUNT_REFILL_PER_MINUTE,
+    ip_capacity=settings.LOGIN_THROTTLE_IP_CAPACITY,
+    ip_refill_per_minute=settings.LOGIN_THROTTLE_IP_REFILL_PER_MINUTE,
+)
@@ -1,27 +1,165 @@
+import asyncio
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, TypeVar
 
 import jwt
 from passlib.context import CryptContext
+from passlib.hash import argon2
 
-from app.core.config import settings
+from app.core.config import Settings, settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def build_pwd_context(config: Settings) -> CryptContext:
+    """
+    Build the password context for the configured hashing policy.
+
+    Both schemes stay registered so existing hashes keep verifying after a
+    switch. Hashes using the other scheme, or a cost other than the
+    configured one, report ``needs_update`` and are rehashed on next login.
+    """
+    if config.PASSWORD_HASH_SCHEME == "argon2" and not argon2.has_backend():
+        raise RuntimeError(
+            'PASSWORD_HASH_SCHEME is "argon2" but argon2-cffi is not installed'
+        )
+    bcrypt_rounds = config.PASSWORD_BCRYPT_ROUNDS
+    argon2_rounds = config.PASSWORD_ARGON2_TIME_COST
+    return CryptContext(
+        schemes=["bcrypt", "argon2"],
+        default=config.PASSWORD_HASH_SCHEME,
+        deprecated="auto",
+        bcrypt__rounds=bcrypt_rounds,
+        bcrypt__min_rounds=bcrypt_rounds,
+        bcrypt__max_rounds=bcrypt_rounds,
+        argon2__type="ID",
+        argon2__rounds=argon2_rounds,
+        argon2__min_rounds=argon2_rounds,
+        argon2__max_rounds=argon2_rounds,
+        argon2__memory_cost=config.PASSWORD_ARGON2_MEMORY_COST,
+        argon2__parallelism=config.PASSWORD_ARGON2_PARALLELISM,
+    )
+
+
+pwd_context = build_pwd_context(settings)
 
 
 ALGORITHM = "HS256"
 
+T = TypeVar("T")
 
-def create_access_token(subject: str | Any, expires_delta: timedelta) -> str:
+
+def create_access_token(
+    subject: str | Any,
+    expires_delta: timedelta,
+    claims: dict[str, Any] | None = None,
+) -> str:
     expire = datetime.now(timezone.utc) + expires_delta
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def create_refresh_token(
+    subject: str | Any, token_version: int, expires_delta: timedelta
+) -> str:
+    return create_access_token(
+        subject, expires_delta, claims={"type": "refresh", "ver": token_version}
+    )
+
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    """
+    Verify a password and, if its hash is outdated, return a replacement.
+
+    The replacement uses the current hashing policy; it is None when the hash
+    is already up to date or the password does not match.
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+class PasswordHashPool:
+    """
+    Bounded thread pool for password hashing.
+
+    bcrypt releases the GIL while hashing, so a dedicated pool keeps a burst
+    of logins from occupying the threads that serve every other endpoint.
+    """
+
+    def __init__(self, max_workers: int) -> None:
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def run(self, func: Callable[..., T], *args: Any) -> T:
+        submitted_at = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def task() -> T:
+            wait = time.perf_counter() - submitted_at
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        return await asyncio.wrap_future(self._executor.submit(task))
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "workers": self.max_workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "wait_seconds_avg": self._wait_total / started if started else 0.0,
+                "wait_seconds_max": self._wait_max,
+            }
+
+
+password_hash_pool = PasswordHashPool(max_workers=settings.PASSWORD_HASH_WORKERS)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_pool.run(
+        verify_password, plain_password, hashed_password
+    )
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> tuple[bool, str | None]:
+    return await password_hash_pool.run(
+        verify_and_update_password, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hash_pool.run(get_password_hash, password)
@@ -1,54 +1,393 @@
 import uuid
-from typing import Any
+from collections.abc import Sequence
+from typing import Any, TypeVar
 
-from sqlmodel import Session, select
+from sqlalchemy import (
+    Boolean,
+    case,
+    column,
+    delete,
+    insert,
+    inspect,
+    update,
+    values,
+)
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.sql.dml import ReturningInsert, ReturningUpdate
+from sqlmodel import Session, SQLModel, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.core.security import get_password_hash, verify_password
-from app.models import Item, ItemCreate, User, UserCreate, UserUpdate
+from app.core.cache import user_cache
+from app.core.config import settings
+from app.core.security import (
+    get_password_hash,
+    get_password_hash_async,
+    verify_and_update_password,
+    verify_and_update_password_async,
+)
+from app.models import (
+    Item,
+    ItemBulkUpdate,
+    ItemCreate,
+    ItemUpdate,
+    User,
+    UserCreate,
+    UserPurge,
+    UserUpdate,
+)
+
+# The API uses the *_async functions with an AsyncSession, the synchronous ones
+# are kept for scripts such as initial_data.py and for the tests.
+
+
+T = TypeVar("T", bound=SQLModel)
+
+
+def _insert(db_obj: T) -> ReturningInsert[tuple[T]]:
+    # Loads the row back with its server defaults in the same round trip
+    model = type(db_obj)
+    return insert(model).values(db_obj.model_dump()).returning(model)
 
 
 def create_user(*, session: Session, user_create: UserCreate) -> User:
     db_obj = User.model_validate(
         user_create, update={"hashed_password": get_password_hash(user_create.password)}
     )
-    session.add(db_obj)
+    db_obj = session.exec(_insert(db_obj)).scalars().one()
     session.commit()
-    session.refresh(db_obj)
     return db_obj
 
 
+async def create_user_async(*, session: AsyncSession, user_create: UserCreate) -> User:
+    hashed_password = await get_password_hash_async(user_create.password)
+    db_obj = User.model_validate(
+        user_create, update={"hashed_password": hashed_password}
+    )
+    db_obj = (await session.exec(_insert(db_obj))).scalars().one()
+    await session.commit()
+    return db_obj
+
+
+def _update_user(
+    user_id: uuid.UUID,
+    values: dict[str, Any],
+    versions: Sequence[int] | None = None,
+) -> ReturningUpdate[Any]:
+    """
+    UPDATE ... RETURNING statement for a user, which also refreshes the user
+    loaded in the session. With versions, only if the user is at one of them.
+    """
+    if values.keys() & {"hashed_password", "is_active", "is_superuser"}:
+        # Credentials or privileges changed, revoke the refresh tokens
+        values = {**values, "token_version": User.token_version + 1}
+    condition = col(User.id) == user_id
+    if versions is not None:
+        condition &= col(User.version).in_(versions)
+    return (
+        update(User)
+        .where(condition)
+        .values(values)
+        .returning(User)
+        .execution_options(populate_existing=True)
+    )
+
+
 def update_user(*, session: Session, db_user: User, user_in: UserUpdate) -> Any:
     user_data = user_in.model_dump(exclude_unset=True)
-    extra_data = {}
     if "password" in user_data:
-        password = user_data["password"]
-        hashed_password = get_password_hash(password)
-        extra_data["hashed_password"] = hashed_password
-    db_user.sqlmodel_update(user_data, update=extra_data)
-    session.add(db_user)
-    session.commit()
-    session.refresh(db_user)
+        user_data["hashed_password"] = get_password_hash(user_data.pop("password"))
+    if user_data:
+        db_user = session.exec(_update_user(db_user.id, user_data)).scalars().one()
+        session.commit()
+        user_cache.invalidate(db_user.id)
     return db_user
 
 
+async def update_user_async(
+    *,
+    session: AsyncSession,
+    db_user: User,
+    user_in: UserUpdate,
+    versions: Sequence[int] | None = None,
+) -> Any:
+    """
+    Update a user, only if it's at one of versions when given, returning None
+    when it isn't.
+    """
+    user_data = user_in.model_dump(exclude_unset=True)
+    if "password" in user_data:
+        password = user_data.pop("password")
+        user_data["hashed_password"] = await get_password_hash_async(password)
+    if user_data:
+        statement = _update_user(db_user.id, user_data, versions)
+        updated_user = (await session.exec(statement)).scalars().one_or_none()
+        await session.commit()
+        user_cache.invalidate(db_user.id)
+        return updated_user
+    if versions is not None and db_user.version not in versions:
+        return None
+    return db_user
+
+
+async def delete_user_async(
+    *, session: AsyncSession, user_id: uuid.UUID
+) -> UserPurge | None:
+    """
+    Delete a user with their items, through the ON DELETE CASCADE of
+    item.owner_id, when they have at most USER_PURGE_BATCH_SIZE items.
+    Otherwise deactivate the user and return a purge, for
+    app.purge_users.purge_user to delete the items a batch at a time and then
+    the user. The running purge of a user is returned as is.
+    """
+    statement = select(UserPurge).where(
+        UserPurge.user_id == user_id, col(UserPurge.finished).is_(False)
+    )
+    purge = (await session.exec(statement)).first()
+    if purge is None:
+        # Locked, so that no item is added to the user meanwhile
+        count_statement = (
+            select(User.item_count).where(User.id == user_id).with_for_update()
+        )
+        item_count = (await session.exec(count_statement)).one()
+        if item_count <= settings.USER_PURGE_BATCH_SIZE:
+            await session.exec(delete(User).where(col(User.id) == user_id))
+        else:
+            await session.exec(_update_user(user_id, {"is_active": False}))
+            purge = UserPurge(user_id=user_id, total_items=item_count)
+            purge = (await session.exec(_insert(purge))).scalars().one()
+        await session.commit()
+    user_cache.invalidate(user_id)
+    return purge
+
+
+def _user_from_cache(cached: dict[str, Any]) -> User:
+    db_user = User(**cached)
+    make_transient_to_detached(db_user)
+    return db_user
+
+
+def get_user(*, session: Session, user_id: uuid.UUID) -> User | None:
+    """
+    Get a user by id, answering repeat lookups from the in-process user cache.
+
+    Cache hits are attached to the session as persistent objects without a
+    database round trip, so callers can update or delete them as usual.
+    """
+    cached = user_cache.get(user_id)
+    if cached is None:
+        db_user = session.get(User, user_id)
+        if db_user:
+            user_cache.set(user_id, db_user.model_dump())
+        return db_user
+    return session.merge(_user_from_cache(cached), load=False)
+
+
+async def get_user_async(*, session: AsyncSession, user_id: uuid.UUID) -> User | None:
+    cached = user_cache.get(user_id)
+    if cached is None:
+        db_user = await session.get(User, user_id)
+        if db_user:
+            user_cache.set(user_id, db_user.model_dump())
+        return db_user
+    return await session.merge(_user_from_cache(cached), load=False)
+
+
 def get_user_by_email(*, session: Session, email: str) -> User | None:
     statement = select(User).where(User.email == email)
     session_user = session.exec(statement).first()
     return session_user
 
 
+async def get_user_by_email_async(*, session: AsyncSession, email: str) -> User | None:
+    statement = select(User).where(User.email == email)
+    session_user = (await session.exec(statement)).first()
+    return session_user
+
+
 def authenticate(*, session: Session, email: str, password: str) -> User | None:
+    """
+    Check a user's credentials, upgrading the stored hash to the current
+    hashing policy when it was made with an outdated scheme or cost.
+    """
     db_user = get_user_by_email(session=session, email=email)
     if not db_user:
         return None
-    if not verify_password(password, db_user.hashed_password):
+    verified, new_hash = verify_and_update_password(password, db_user.hashed_password)
+    if not verified:
+        return None
+    if new_hash:
+        statement = _update_user(db_user.id, {"hashed_password": new_hash})
+        db_user = session.exec(statement).scalars().one()
+        session.commit()
+        user_cache.invalidate(db_user.id)
+    return db_user
+
+
+async def authenticate_async(
+    *, session: AsyncSession, email: str, password: str
+) -> User | None:
+    db_user = await get_user_by_email_async(session=session, email=email)
+    if not db_user:
+        return None
+    verified, new_hash = await verify_and_update_password_async(
+        password, db_user.hashed_password
+    )
+    if not verified:
         return None
+    if new_hash:
+        statement = _update_user(db_user.id, {"hashed_password": new_hash})
+        db_user = (await session.exec(statement)).scalars().one()
+        await session.commit()
+        user_cache.invalidate(db_user.id)
     return db_user
 
 
 def create_item(*, session: Session, item_in: ItemCreate, owner_id: uuid.UUID) -> Item:
     db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
-    session.add(db_item)
+    db_item = session.exec(_insert(db_item)).scalars().one()
     session.commit()
-    session.refresh(db_item)
     return db_item
+
+
+async def create_item_async(
+    *, session: AsyncSession, item_in: ItemCreate, owner_id: uuid.UUID
+) -> Item:
+    db_item = Item.model_validate(item_in, update={"owner_id": owner_id})
+    db_item = (await session.exec(_insert(db_item))).scalars().one()
+    await session.commit()
+    return db_item
+
+
+def _item_condition(
+    item_id: uuid.UUID,
+    owner_id: uuid.UUID | None,
+    versions: Sequence[int] | None = None,
+) -> Any:
+    condition = col(Item.id) == item_id
+    if owner_id is not None:
+        condition &= col(Item.owner_id) == owner_id
+    if versions is not None:
+        condition &= col(Item.version).in_(versions)
+    return condition
+
+
+async def update_item_async(
+    *,
+    session: AsyncSession,
+    item_id: uuid.UUID,
+    item_in: ItemUpdate,
+    owner_id: uuid.UUID | None = None,
+    versions: Sequence[int] | None = None,
+) -> Item | None:
+    """
+    Update an item with a single UPDATE ... RETURNING statement, only if it
+    belongs to owner_id and is at one of versions when given. Returns None if
+    there's no such item.
+    """
+    condition = _item_condition(item_id, owner_id, versions)
+    item_data = item_in.model_dump(exclude_unset=True)
+    if item_data:
+        statement = (
+            update(Item)
+            .where(condition)
+            .values(item_data)
+            .returning(Item)
+            .execution_options(populate_existing=True)
+        )
+        db_item = (await session.exec(statement)).scalars().one_or_none()
+        await session.commit()
+    else:
+        db_item = (await session.exec(select(Item).where(condition))).first()
+    return db_item
+
+
+async def delete_item_async(
+    *, session: AsyncSession, item_id: uuid.UUID, owner_id: uuid.UUID | None = None
+) -> bool:
+    """
+    Delete an item with a single statement, only if it belongs to owner_id
+    when given. Returns whether there was such an item.
+    """
+    statement = (
+        delete(Item)
+        .where(_item_condition(item_id, owner_id))
+        .returning(col(Item.id))
+        .execution_options(synchronize_session=False)
+    )
+    deleted = (await session.exec(statement)).first() is not None
+    await session.commit()
+    return deleted
+
+
+async def create_items_async(
+    *, session: AsyncSession, items_in: Sequence[ItemCreate], owner_id: uuid.UUID
+) -> list[Item]:
+    """
+    Create items with multi-row INSERT statements in one transaction, returned
+    in the order given.
+    """
+    rows = [
+        Item.model_validate(item_in, update={"owner_id": owner_id}).model_dump()
+        for item_in in items_in
+    ]
+    statement = insert(Item).returning(Item, sort_by_parameter_order=True)
+    items: list[Item] = list((await session.exec(statement, params=rows)).scalars())
+    await session.commit()
+    return items
+
+
+async def update_items_async(
+    *, session: AsyncSession, items_in: Sequence[ItemBulkUpdate]
+) -> list[Item]:
+    """
+    Update items with a single UPDATE ... FROM (VALUES ...) statement, returned
+    in the order given. Fields that aren't set in an update keep their value.
+    """
+    fields = list(ItemUpdate.model_fields)
+    item_columns = inspect(Item).columns
+    value_columns = [column("id", item_columns["id"].type)]
+    for field in fields:
+        value_columns.append(column(field, item_columns[field].type))
+        value_columns.append(column(f"set_{field}", Boolean))
+    rows = []
+    for item_in in items_in:
+        row: list[Any] = [item_in.id]
+        for field in fields:
+            row += [getattr(item_in, field), field in item_in.model_fields_set]
+        rows.append(tuple(row))
+    updates = values(*value_columns, name="updates").data(rows)
+    statement = (
+        update(Item)
+        .where(col(Item.id) == updates.c.id)
+        .values(
+            {
+                field: case(
+                    (updates.c[f"set_{field}"], updates.c[field]),
+                    else_=getattr(Item, field),
+                )
+                for field in fields
+            }
+        )
+        .returning(Item)
+        .execution_options(synchronize_session=False)
+    )
+    updated_items: list[Item] = list((await session.exec(statement)).scalars())
+    updated = {item.id: item for item in updated_items}
+    await session.commit()
+    return [updated[item_in.id] for item_in in items_in]
+
+
+async def delete_items_async(
+    *, session: AsyncSession, item_ids: Sequence[uuid.UUID]
+) -> int:
+    """
+    Delete items with a single statement, returning how many were deleted.
+    """
+    statement = (
+        delete(Item)
+        .where(col(Item.id).in_(item_ids))
+        .execution_options(synchronize_session=False)
+    )
+    result = await session.exec(statement)
+    await session.commit()
+    return result.rowcount
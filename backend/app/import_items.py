@@ -0,0 +1,253 @@
+import argparse
+import csv
+import json
+import logging
+import sys
+import uuid
+from collections.abc import Callable, Iterator
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Literal
+
+from pydantic import ValidationError
+from sqlalchemy import Connection
+from sqlmodel import col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import ItemCreate, ItemImportError, ItemImportReport, User, uuid7
+
+logger = logging.getLogger(__name__)
+
+ImportFormat = Literal["csv", "ndjson"]
+
+# Records validated, and copied, at a time
+CHUNK_SIZE = 5000
+# Rejected rows listed in a report, all of them are counted
+MAX_REPORTED_ERRORS = 1000
+
+COPY_ITEMS = "COPY item (id, title, description, owner_id) FROM STDIN"
+
+
+class RecordReader:
+    """
+    Splits text fed in arbitrary pieces into records: the rows of a CSV file
+    with a header, or the objects of an NDJSON file. Each record comes with the
+    number of the line it starts on, or with an error in place of the record.
+    """
+
+    def __init__(self, format: ImportFormat) -> None:
+        self.format = format
+        self._partial_line = ""
+        self._line = 0
+        self._header: list[str] | None = None
+        # Lines of a CSV record with a quoted field spanning several lines
+        self._record_lines: list[str] = []
+        self._record_start = 0
+
+    def feed(
+        self, text: str, *, final: bool = False
+    ) -> Iterator[tuple[int, dict[str, Any] | str]]:
+        *lines, self._partial_line = (self._partial_line + text).split("\n")
+        if final and self._partial_line:
+            lines.append(self._partial_line)
+            self._partial_line = ""
+        for line in lines:
+            self._line += 1
+            yield from self._read_line(line.removesuffix("\r"))
+        if final and self._record_lines:
+            yield self._record_start, "Unterminated quoted field"
+
+    def _read_line(self, line: str) -> Iterator[tuple[int, dict[str, Any] | str]]:
+        if self.format == "ndjson":
+            if not line.strip():
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield self._line, "Invalid JSON"
+                return
+            if isinstance(record, dict):
+                yield self._line, record
+            else:
+                yield self._line, "Expected a JSON object"
+            return
+
+        if not self._record_lines:
+            self._record_start = self._line
+        self._record_lines.append(line)
+        text = "\n".join(self._record_lines)
+        if text.count('"') % 2:
+            # A quoted field goes on over the next line
+            return
+        self._record_lines = []
+        if not text.strip():
+            return
+        [values] = csv.reader([text])
+        if self._header is None:
+            self._header = values
+        elif len(values) != len(self._header):
+            yield self._record_start, f"Expected {len(self._header)} fields"
+        else:
+            # Empty fields are left out, as missing values
+            record = {
+                field: value
+                for field, value in zip(self._header, values, strict=True)
+                if value
+            }
+            yield self._record_start, record
+
+
+class ItemImporter:
+    """
+    Loads items with COPY in the transaction of a connection, validating the
+    records fed to it a chunk of CHUNK_SIZE at a time, so that memory use
+    doesn't depend on the size of the file.
+
+    Records are validated as ItemCreate, with an optional owner_id field
+    defaulting to the importer's owner. Invalid records, and those of unknown
+    owners, are rejected: they are counted and the first MAX_REPORTED_ERRORS
+    are listed in the report, on_reject is called with every one of them.
+    """
+
+    def __init__(
+        self,
+        connection: Connection,
+        format: ImportFormat,
+        *,
+        owner_id: uuid.UUID,
+        on_reject: Callable[[ItemImportError], None] | None = None,
+    ) -> None:
+        self.connection = connection
+        self.owner_id = owner_id
+        self.on_reject = on_reject
+        self.reader = RecordReader(format)
+        self.imported = 0
+        self.rejected = 0
+        self.errors: list[ItemImportError] = []
+        self._pending: list[tuple[int, tuple[Any, ...]]] = []
+        self._known_owners: set[uuid.UUID] = set()
+
+    def feed(self, text: str, *, final: bool = False) -> None:
+        for line, record in self.reader.feed(text, final=final):
+            if isinstance(record, str):
+                self._reject(line, record)
+                continue
+            try:
+                row = self._row(record)
+            except ValidationError as e:
+                error = e.errors()[0]
+                field = ".".join(str(part) for part in error["loc"])
+                self._reject(line, f"{field}: {error['msg']}")
+            except ValueError:
+                self._reject(line, "owner_id: Invalid UUID")
+            else:
+                self._pending.append((line, row))
+                if len(self._pending) >= CHUNK_SIZE:
+                    self._copy_pending()
+
+    def finish(self) -> ItemImportReport:
+        """
+        Load the remaining records, the caller commits the transaction.
+        """
+        self.feed("", final=True)
+        if self._pending:
+            self._copy_pending()
+        return ItemImportReport(
+            imported=self.imported, rejected=self.rejected, errors=self.errors
+        )
+
+    def _row(self, record: dict[str, Any]) -> tuple[Any, ...]:
+        item_in = ItemCreate.model_validate(record)
+        owner_id = record.get("owner_id")
+        owner_id = uuid.UUID(str(owner_id)) if owner_id else self.owner_id
+        return uuid7(), item_in.title, item_in.description, owner_id
+
+    def _reject(self, line: int, message: str) -> None:
+        error = ItemImportError(line=line, error=message)
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+        if self.on_reject:
+            self.on_reject(error)
+
+    def _copy_pending(self) -> None:
+        pending, self._pending = self._pending, []
+        owner_ids = {row[3] for _, row in pending} - self._known_owners
+        if owner_ids:
+            statement = select(User.id).where(col(User.id).in_(owner_ids))
+            self._known_owners.update(self.connection.execute(statement).scalars())
+        rows = []
+        for line, row in pending:
+            if row[3] in self._known_owners:
+                rows.append(row)
+            else:
+                self._reject(line, "owner_id: User not found")
+        if not rows:
+            return
+        driver_connection = self.connection.connection.driver_connection
+        assert driver_connection is not None
+        with driver_connection.cursor() as cursor:
+            with cursor.copy(COPY_ITEMS) as copy:
+                for row in rows:
+                    copy.write_row(row)
+        self.imported += len(rows)
+
+
+def main() -> None:
+    # Configured here rather than on import, as the API imports the module
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(
+        description="Load items from a CSV or NDJSON file with COPY"
+    )
+    parser.add_argument("path", type=Path)
+    parser.add_argument(
+        "--format",
+        choices=["csv", "ndjson"],
+        help="Defaults to the extension of the file",
+    )
+    parser.add_argument(
+        "--owner",
+        default=settings.FIRST_SUPERUSER,
+        help="Email of the owner of the items without an owner_id",
+    )
+    parser.add_argument(
+        "--errors",
+        type=Path,
+        help="File to write every rejected row to, as NDJSON",
+    )
+    args = parser.parse_args()
+    format = args.format or args.path.suffix.lstrip(".")
+    if format not in ("csv", "ndjson"):
+        parser.error("Can't tell the format from the extension, pass --format")
+
+    with ExitStack() as stack:
+        errors_file = (
+            stack.enter_context(open(args.errors, "w")) if args.errors else None
+        )
+
+        def write_error(error: ItemImportError) -> None:
+            if errors_file:
+                errors_file.write(error.model_dump_json() + "\n")
+
+        connection = stack.enter_context(engine.begin())
+        owner_id = connection.execute(
+            select(User.id).where(User.email == args.owner)
+        ).scalar()
+        if owner_id is None:
+            sys.exit(f"No user with the email {args.owner}")
+        importer = ItemImporter(
+            connection, format, owner_id=owner_id, on_reject=write_error
+        )
+        with open(args.path, encoding="utf-8", newline="") as file:
+            while text := file.read(64 * 1024):
+                importer.feed(text)
+        report = importer.finish()
+
+    logger.info(f"Imported {report.imported} items, rejected {report.rejected}")
+    for error in report.errors[:10]:
+        logger.warning(f"Line {error.line}: {error.error}")
+
+
+if __name__ == "__main__":
+    main()
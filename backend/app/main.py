@@ -5,6 +5,7 @@ from starlette.middleware.cors import CORSMiddleware
 
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.db import async_engine, replicas
 from app.startup import startup
 
 
@@ -27,6 +28,14 @@ async def startup_event():
     """Run startup tasks on application startup"""
     startup()
 
+
+@app.on_event("shutdown")
+async def shutdown_event() -> None:
+    """Close the async engines' connections on application shutdown"""
+    await async_engine.dispose()
+    await replicas.dispose()
+
+
 # Set all CORS enabled origins
 if settings.all_cors_origins:
     app.add_middleware(
@@ -35,6 +44,8 @@ if settings.all_cors_origins:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # For clients to send back in If-None-Match and If-Match
+        expose_headers=["ETag"],
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
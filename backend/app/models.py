@@ -1,7 +1,57 @@
+import os
+import threading
+import time
 import uuid
+from datetime import datetime, timezone
+from typing import Any
 
 from pydantic import EmailStr
-from sqlmodel import Field, Relationship, SQLModel
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Computed,
+    Connection,
+    DateTime,
+    Index,
+    event,
+    func,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlmodel import Field, Relationship, SQLModel, col
+
+_uuid7_lock = threading.Lock()
+_uuid7_last = (0, 0)
+
+
+def uuid7() -> uuid.UUID:
+    """
+    A time ordered UUID, version 7 of RFC 9562: the Unix time in milliseconds
+    then random bits, of which the first 42 are a counter, so that ids made
+    in the same millisecond still increase. Primary keys made of these are
+    inserted at the end of their index instead of all over it.
+
+    Ids made by the process keep increasing if the clock goes back. Python
+    3.14's uuid.uuid7 follows the same layout.
+    """
+    global _uuid7_last
+    with _uuid7_lock:
+        timestamp = time.time_ns() // 1_000_000
+        last_timestamp, last_counter = _uuid7_last
+        rand = int.from_bytes(os.urandom(10), "big")
+        # A fresh counter leaves its top bit clear, room to increase
+        counter = (rand >> 32) & 0x1FF_FFFF_FFFF
+        if timestamp <= last_timestamp:
+            timestamp = last_timestamp
+            counter = last_counter + 1
+            if counter > 0x3FF_FFFF_FFFF:
+                timestamp += 1
+                counter = (rand >> 32) & 0x1FF_FFFF_FFFF
+        _uuid7_last = (timestamp, counter)
+    value = (timestamp & 0xFFFF_FFFF_FFFF) << 80
+    value |= 0x7 << 76 | (counter >> 30) << 64
+    value |= 0b10 << 62 | (counter & 0x3FFF_FFFF) << 32 | rand & 0xFFFF_FFFF
+    return uuid.UUID(int=value)
 
 
 # Shared properties
@@ -41,9 +91,23 @@ class UpdatePassword(SQLModel):
 
 # Database model, database table inferred from class name
 class User(UserBase, table=True):
-    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    id: uuid.UUID = Field(default_factory=uuid7, primary_key=True)
     hashed_password: str
-    items: list["Item"] = Relationship(back_populates="owner", cascade_delete=True)
+    # Bumped to revoke the user's refresh tokens
+    token_version: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Maintained by database triggers, see COUNTER_TRIGGERS
+    item_count: int = Field(default=0, sa_column_kwargs={"server_default": "0"})
+    # Bumped with each change by CHANGE_TRIGGERS, for ETags and If-Match
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+    )
+    # Deleted by the ON DELETE CASCADE of item.owner_id, without loading them
+    items: list["Item"] = Relationship(
+        back_populates="owner", cascade_delete=True, passive_deletes=True
+    )
 
 
 # Properties to return via API, id is always required
@@ -53,7 +117,11 @@ class UserPublic(UserBase):
 
 class UsersPublic(SQLModel):
     data: list[UserPublic]
-    count: int
+    # None when not requested
+    count: int | None
+    # Opaque tokens for the cursor parameter, None at either end of the list
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
 
 
 # Shared properties
@@ -72,24 +140,388 @@ class ItemUpdate(ItemBase):
     title: str | None = Field(default=None, min_length=1, max_length=255)  # type: ignore
 
 
+# Properties to receive on bulk item update
+class ItemBulkUpdate(ItemUpdate):
+    id: uuid.UUID
+
+
 # Database model, database table inferred from class name
 class Item(ItemBase, table=True):
-    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    # Serves the owner filtered listing, counts and keyset pages
+    __table_args__ = (Index("ix_item_owner_id_id", "owner_id", "id"),)
+
+    id: uuid.UUID = Field(default_factory=uuid7, primary_key=True)
     owner_id: uuid.UUID = Field(
         foreign_key="user.id", nullable=False, ondelete="CASCADE"
     )
     owner: User | None = Relationship(back_populates="items")
+    # Set by the database, left out of the rows written, see CHANGE_TRIGGERS
+    created_at: datetime | None = Field(
+        default=None,
+        exclude=True,
+        nullable=False,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+    )
+    updated_at: datetime | None = Field(
+        default=None,
+        exclude=True,
+        nullable=False,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+    )
+    # Bumped with each change by CHANGE_TRIGGERS, for ETags and If-Match
+    version: int = Field(default=1, sa_column_kwargs={"server_default": "1"})
+
+
+# Sort and filter of item listings, each combination allowed is served by one
+# of the indexes below, see app.api.item_filters. Titles are sorted in code
+# point order, in which the titles starting with a prefix are a range.
+TITLE_SORT = col(Item.title).collate("C")
+HAS_DESCRIPTION = col(Item.description).is_not(None)
+Index("ix_item_title_id", TITLE_SORT, col(Item.id))
+Index("ix_item_owner_id_title_id", col(Item.owner_id), TITLE_SORT, col(Item.id))
+Index("ix_item_has_description_id", HAS_DESCRIPTION, col(Item.id))
+Index(
+    "ix_item_owner_id_has_description_id",
+    col(Item.owner_id),
+    HAS_DESCRIPTION,
+    col(Item.id),
+)
+
+
+# Id of the transaction writing a row, which orders changes by when they
+# became visible, unlike their time, see app.api.changes
+CURRENT_XID = "pg_current_xact_id()::text::bigint"
+
+# The transaction that last inserted or updated an item. Left out of the
+# model as it's only compared to, set by its default and by CHANGE_TRIGGERS.
+UPDATED_XID = Column(
+    "updated_xid", BigInteger, server_default=text(CURRENT_XID), nullable=False
+)
+Item.__table__.append_column(UPDATED_XID)  # type: ignore[attr-defined]
+# Serve the change feed of all items, and of an owner's
+Index("ix_item_updated_xid_id", UPDATED_XID, col(Item.id))
+Index("ix_item_owner_id_updated_xid_id", col(Item.owner_id), UPDATED_XID, col(Item.id))
+
+
+# An item deleted, recorded by CHANGE_TRIGGERS however it was deleted, so that
+# the change feed can tell clients to drop it. Kept for
+# ITEM_TOMBSTONE_RETENTION_DAYS, see app.prune_tombstones.
+class ItemTombstone(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_itemtombstone_deleted_xid_id", "deleted_xid", "id"),
+        Index(
+            "ix_itemtombstone_owner_id_deleted_xid_id",
+            "owner_id",
+            "deleted_xid",
+            "id",
+        ),
+    )
+
+    # The item's, there's no foreign key as neither the item nor its owner
+    # are kept
+    id: uuid.UUID = Field(primary_key=True)
+    owner_id: uuid.UUID
+    deleted_at: datetime | None = Field(
+        default=None,
+        nullable=False,
+        sa_type=DateTime(timezone=True),
+        sa_column_kwargs={"server_default": func.now()},
+    )
+    deleted_xid: int | None = Field(
+        default=None,
+        nullable=False,
+        sa_type=BigInteger,
+        sa_column_kwargs={"server_default": text(CURRENT_XID)},
+    )
+
+
+# A pruning of the tombstones, of the deletions made by transactions up to
+# pruned_xid. Recorded before the tombstones are deleted, the change feed
+# answers 410 to the cursors from before it.
+class ItemTombstonePrune(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid7, primary_key=True)
+    pruned_xid: int = Field(sa_type=BigInteger, index=True)
+    pruned_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc),
+        sa_type=DateTime(timezone=True),
+    )
+
+
+# Triggers keeping the update time and version of items and users, and the
+# transaction of items, and recording the deletion of items, including those
+# cascaded from user. Users are touched by changes of their own columns only,
+# not of item_count. The migrations adding the change feed and the versions
+# create the same objects, these are for databases created with
+# SQLModel.metadata.create_all.
+CHANGE_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION item_touch() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.created_at := OLD.created_at;
+        NEW.updated_at := now();
+        NEW.updated_xid := {CURRENT_XID};
+        NEW.version := OLD.version + 1;
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION user_touch() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        NEW.updated_at := now();
+        NEW.version := OLD.version + 1;
+        RETURN NEW;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION item_tombstones() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        INSERT INTO itemtombstone (id, owner_id)
+        SELECT id, owner_id FROM deleted_item;
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE TRIGGER item_touch BEFORE UPDATE ON item
+    FOR EACH ROW EXECUTE FUNCTION item_touch()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER user_touch
+    BEFORE UPDATE OF email, full_name, hashed_password, is_active, is_superuser
+    ON "user" FOR EACH ROW EXECUTE FUNCTION user_touch()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER item_tombstones AFTER DELETE ON item
+    REFERENCING OLD TABLE AS deleted_item
+    FOR EACH STATEMENT EXECUTE FUNCTION item_tombstones()
+    """,
+]
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def create_change_triggers(_target: Any, connection: Connection, **_kw: Any) -> None:
+    for statement in CHANGE_TRIGGERS:
+        connection.exec_driver_sql(statement)
+
+
+# Text search configuration of the words of items, see SEARCH_VECTOR
+SEARCH_CONFIG = "english"
+
+# The words of an item's title, weighted above those of its description, for
+# full-text search. Generated by the database and left out of the model, so
+# that it's neither loaded with items nor written.
+SEARCH_VECTOR = Column(
+    "search_vector",
+    TSVECTOR,
+    Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', title), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')",
+        persisted=True,
+    ),
+)
+Item.__table__.append_column(SEARCH_VECTOR)  # type: ignore[attr-defined]
+Index("ix_item_search_vector", SEARCH_VECTOR, postgresql_using="gin")
+
+
+def has_pg_trgm(connection: Connection) -> bool:
+    statement = text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    return connection.execute(statement).first() is not None
+
+
+def _if_pg_trgm(_ddl: Any, _target: Any, bind: Connection | None, **_kw: Any) -> bool:
+    return bind is not None and has_pg_trgm(bind)
+
+
+# Serves autocomplete on titles, by prefix and by similarity. Needs the pg_trgm
+# extension, without which the index is left out and autocomplete unavailable.
+Index(
+    "ix_item_title_trgm",
+    Item.__table__.c.title,  # type: ignore[attr-defined]
+    postgresql_using="gin",
+    postgresql_ops={"title": "gin_trgm_ops"},
+).ddl_if(callable_=_if_pg_trgm)  # type: ignore[arg-type]
+
+
+@event.listens_for(SQLModel.metadata, "before_create")
+def create_extensions(_target: Any, connection: Connection, **_kw: Any) -> None:
+    if has_pg_trgm(connection):
+        connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
+# Deletion of a user with too many items to delete in one transaction, see
+# app.purge_users. The user is deactivated until their items are deleted a
+# batch at a time, then deleted.
+class UserPurge(SQLModel, table=True):
+    id: uuid.UUID = Field(default_factory=uuid7, primary_key=True)
+    # Not a foreign key, the purge outlives the user
+    user_id: uuid.UUID = Field(index=True)
+    total_items: int
+    deleted_items: int = 0
+    finished: bool = False
+
+
+class UserPurgePublic(SQLModel):
+    id: uuid.UUID
+    user_id: uuid.UUID
+    total_items: int
+    deleted_items: int
+    finished: bool
+
+
+# Row counts of whole tables, keyed by table name and maintained by database
+# triggers, see COUNTER_TRIGGERS. A table's count is the sum of its shards:
+# each write adds to a random one of COUNTER_SHARDS rows, so that concurrent
+# writers rarely wait on each other's row lock.
+class Counter(SQLModel, table=True):
+    name: str = Field(primary_key=True, max_length=255)
+    shard: int = Field(primary_key=True)
+    value: int = 0
+
+
+COUNTER_SHARDS = 16
+
+# Triggers keeping Counter and User.item_count in step with the rows inserted
+# and deleted in the same transaction, including deletes cascaded from user.
+# Items never change owner. The migration adding the counters creates the same
+# objects, these are for databases created with SQLModel.metadata.create_all.
+COUNTER_TRIGGERS = [
+    f"""
+    CREATE OR REPLACE FUNCTION counter_add(counter_name text, delta bigint)
+    RETURNS void LANGUAGE sql AS $$
+        INSERT INTO counter (name, shard, value)
+        SELECT counter_name, floor(random() * {COUNTER_SHARDS}), delta
+        WHERE delta <> 0
+        ON CONFLICT (name, shard) DO UPDATE SET value = counter.value + excluded.value
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION item_counts_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE "user" SET item_count = "user".item_count + inserted.count
+        FROM (
+            SELECT owner_id, count(*) AS count FROM inserted_item GROUP BY owner_id
+        ) AS inserted
+        WHERE "user".id = inserted.owner_id;
+        PERFORM counter_add('item', (SELECT count(*) FROM inserted_item));
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION item_counts_delete() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE "user" SET item_count = "user".item_count - deleted.count
+        FROM (
+            SELECT owner_id, count(*) AS count FROM deleted_item GROUP BY owner_id
+        ) AS deleted
+        WHERE "user".id = deleted.owner_id;
+        PERFORM counter_add('item', -(SELECT count(*) FROM deleted_item));
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION user_counts_insert() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM counter_add('user', (SELECT count(*) FROM inserted_user));
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE FUNCTION user_counts_delete() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+    BEGIN
+        PERFORM counter_add('user', -(SELECT count(*) FROM deleted_user));
+        RETURN NULL;
+    END
+    $$
+    """,
+    """
+    CREATE OR REPLACE TRIGGER item_counts_insert AFTER INSERT ON item
+    REFERENCING NEW TABLE AS inserted_item
+    FOR EACH STATEMENT EXECUTE FUNCTION item_counts_insert()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER item_counts_delete AFTER DELETE ON item
+    REFERENCING OLD TABLE AS deleted_item
+    FOR EACH STATEMENT EXECUTE FUNCTION item_counts_delete()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER user_counts_insert AFTER INSERT ON "user"
+    REFERENCING NEW TABLE AS inserted_user
+    FOR EACH STATEMENT EXECUTE FUNCTION user_counts_insert()
+    """,
+    """
+    CREATE OR REPLACE TRIGGER user_counts_delete AFTER DELETE ON "user"
+    REFERENCING OLD TABLE AS deleted_user
+    FOR EACH STATEMENT EXECUTE FUNCTION user_counts_delete()
+    """,
+    """
+    INSERT INTO counter (name, shard, value)
+    SELECT 'item', 0, count(*) FROM item
+    UNION ALL SELECT 'user', 0, count(*) FROM "user"
+    ON CONFLICT (name, shard) DO NOTHING
+    """,
+]
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def create_counter_triggers(_target: Any, connection: Connection, **_kw: Any) -> None:
+    for statement in COUNTER_TRIGGERS:
+        connection.exec_driver_sql(statement)
 
 
 # Properties to return via API, id is always required
 class ItemPublic(ItemBase):
     id: uuid.UUID
     owner_id: uuid.UUID
+    created_at: datetime
+    updated_at: datetime
+
+
+# Changes of items since a cursor, see app.api.changes
+class ItemChangesPublic(SQLModel):
+    # Items created or updated
+    data: list[ItemPublic]
+    # Ids of the items deleted
+    deleted: list[uuid.UUID]
+    # The since parameter of the next request, for the next page when there's
+    # more, else for the changes to come
+    next_cursor: str
+    more: bool
 
 
 class ItemsPublic(SQLModel):
     data: list[ItemPublic]
-    count: int
+    # None when not requested
+    count: int | None
+    # Opaque tokens for the cursor parameter, None at either end of the list
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+
+
+# A row of an item import that was left out
+class ItemImportError(SQLModel):
+    line: int
+    error: str
+
+
+# Outcome of an item import, errors lists the first rejected rows
+class ItemImportReport(SQLModel):
+    imported: int
+    rejected: int
+    errors: list[ItemImportError]
 
 
 # Generic message
@@ -101,11 +533,90 @@ class Message(SQLModel):
 class Token(SQLModel):
     access_token: str
     token_type: str = "bearer"
+    refresh_token: str | None = None
+
+
+class TokenRefresh(SQLModel):
+    refresh_token: str
 
 
-# Contents of JWT token
+# Contents of JWT token, the user claims are only set in stateless auth mode
 class TokenPayload(SQLModel):
     sub: str | None = None
+    type: str | None = None
+    is_active: bool | None = None
+    is_superuser: bool | None = None
+    ver: int | None = None
+
+
+# Identity and privileges of the authenticated user, as needed by routes that
+# authorize without loading the user
+class UserClaims(SQLModel):
+    id: uuid.UUID
+    is_active: bool
+    is_superuser: bool
+
+
+# Utilization of the password hashing pool in one worker process
+class PasswordHashStats(SQLModel):
+    workers: int
+    queue_depth: int
+    running: int
+    completed: int
+    wait_seconds_avg: float
+    wait_seconds_max: float
+
+
+# Login and password recovery attempts seen by one worker process
+class LoginThrottleStats(SQLModel):
+    admitted: int
+    rejected_account: int
+    rejected_ip: int
+
+
+# Connection pool of the API's database engine in one worker process
+class DatabasePoolStats(SQLModel):
+    pid: int
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    idle: int
+    overflow: int
+    checkouts: int
+    wait_seconds_avg: float
+    wait_seconds_max: float
+
+
+class DatabaseReplicaStats(SQLModel):
+    # Without the password
+    url: str
+    available: bool
+    reads: int
+
+
+# Reads served by the read replicas and by the primary in one worker process
+class DatabaseReadStats(SQLModel):
+    primary_reads: int
+    replicas: list[DatabaseReplicaStats]
+
+
+class PreparedStatementStats(SQLModel):
+    statement: str
+    # Connections the statement is prepared on
+    connections: int
+
+
+# Server-side prepared statements of the connections of one worker process,
+# the counts None when the psycopg installed can't be counted
+class DatabaseStatementCacheStats(SQLModel):
+    prepare_threshold: int | None
+    prepared_max: int
+    hits: int | None
+    misses: int | None
+    prepares: int | None
+    connections: int | None
+    prepared_statements: int | None
+    statements: list[PreparedStatementStats]
 
 
 class NewPassword(SQLModel):
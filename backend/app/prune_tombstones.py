@@ -0,0 +1,67 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+from sqlmodel import Session, col, select
+
+from app.core.config import settings
+from app.core.db import engine
+from app.models import ItemTombstone, ItemTombstonePrune
+
+logger = logging.getLogger(__name__)
+
+
+def prune_tombstones() -> int:
+    """
+    Delete the tombstones of the items deleted more than
+    ITEM_TOMBSTONE_RETENTION_DAYS ago, ITEM_TOMBSTONE_PRUNE_BATCH_SIZE at a
+    time, each batch in a transaction of its own. Returns how many were
+    deleted.
+
+    The tombstones are pruned up to the newest transaction that deleted an
+    item before then, which is recorded first so that the change feed stops
+    accepting the cursors that would miss them before any is gone.
+    """
+    retention = timedelta(days=settings.ITEM_TOMBSTONE_RETENTION_DAYS)
+    deleted_xid = col(ItemTombstone.deleted_xid)
+    with Session(engine) as session:
+        # Walks the index back from the newest tombstones
+        statement = (
+            select(deleted_xid)
+            .where(
+                col(ItemTombstone.deleted_at) < datetime.now(timezone.utc) - retention
+            )
+            .order_by(deleted_xid.desc())
+            .limit(1)
+        )
+        pruned_xid = session.exec(statement).first()
+        if pruned_xid is None:
+            return 0
+        session.add(ItemTombstonePrune(pruned_xid=pruned_xid))
+        session.commit()
+
+        batch_size = settings.ITEM_TOMBSTONE_PRUNE_BATCH_SIZE
+        batch = (
+            select(ItemTombstone.id).where(deleted_xid <= pruned_xid).limit(batch_size)
+        )
+        deleted = 0
+        while True:
+            result = session.exec(
+                delete(ItemTombstone).where(col(ItemTombstone.id).in_(batch))
+            )
+            session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                break
+    logger.info(f"Pruned {deleted} tombstones up to transaction {pruned_xid}")
+    return deleted
+
+
+def main() -> None:
+    # Run periodically, for example daily from cron
+    logging.basicConfig(level=logging.INFO)
+    prune_tombstones()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import logging
+import uuid
+
+from sqlalchemy import delete
+from sqlmodel import Session, col, select
+
+from app.core.cache import user_cache
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Item, User, UserPurge
+
+logger = logging.getLogger(__name__)
+
+
+def purge_user(purge_id: uuid.UUID) -> None:
+    """
+    Delete the items of a purged user USER_PURGE_BATCH_SIZE at a time, each
+    batch in a transaction of its own so that no lock is held for long, then
+    the user. Progress is recorded on the purge after each batch, a purge that
+    was interrupted resumes where it stopped.
+    """
+    with Session(engine, expire_on_commit=False) as session:
+        purge = session.get(UserPurge, purge_id)
+        if purge is None or purge.finished:
+            return
+        batch_size = settings.USER_PURGE_BATCH_SIZE
+        batch = select(Item.id).where(Item.owner_id == purge.user_id).limit(batch_size)
+        while True:
+            result = session.exec(delete(Item).where(col(Item.id).in_(batch)))
+            purge.deleted_items += result.rowcount
+            session.add(purge)
+            session.commit()
+            logger.info(
+                f"Purging user {purge.user_id}: "
+                f"{purge.deleted_items} of {purge.total_items} items deleted"
+            )
+            if result.rowcount < batch_size:
+                break
+        session.exec(delete(User).where(col(User.id) == purge.user_id))
+        purge.finished = True
+        session.add(purge)
+        session.commit()
+    user_cache.invalidate(purge.user_id)
+
+
+def main() -> None:
+    # Resumes the purges interrupted by a restart of the API
+    logging.basicConfig(level=logging.INFO)
+    with Session(engine) as session:
+        statement = select(UserPurge.id).where(col(UserPurge.finished).is_(False))
+        purge_ids = session.exec(statement).all()
+    logger.info(f"Resuming {len(purge_ids)} user purges")
+    for purge_id in purge_ids:
+        purge_user(purge_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Latency of a page of search results over items, found with ILIKE on the title
+and description, which scans every row, with full-text search on the search
+vector's GIN index, and with autocomplete on the title's trigram index when
+pg_trgm is available.
+
+Items with titles and descriptions of words drawn from a small vocabulary are
+inserted in a transaction that is rolled back at the end, growing to each of
+the given sizes in turn. One item in RARE_EVERY has a rare word, and about one
+in VOCABULARY's length has any of the common ones. Needs the database
+configured in the settings.
+
+Run from the backend directory:
+
+    python -m benchmarks.item_search --sizes 100000,5000000
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+from functools import partial
+
+from sqlalchemy import text
+from sqlmodel import col, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.search import SearchMode, escape_like, search_items
+from app.core.db import async_engine
+from app.models import Item, has_pg_trgm
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VOCABULARY = [
+    "red", "blue", "green", "black", "white", "large", "small", "light",
+    "heavy", "soft", "shoes", "boots", "shirt", "jacket", "table", "chair",
+    "lamp", "desk", "cable", "phone", "garden", "kitchen", "office", "travel",
+    "winter", "summer", "classic", "modern", "cotton", "leather",
+]  # fmt: skip
+RARE_WORD = "tortoise"
+RARE_EVERY = 10_000
+
+
+async def timed(step: Callable[[], Awaitable[object]], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await step()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def run(sizes: list[int], repeat: int, limit: int) -> None:
+    owner_id = uuid.uuid4()
+    async with async_engine.connect() as connection:
+        await connection.begin()
+        await connection.execute(text("SET LOCAL session_replication_role = replica"))
+        trigrams = await connection.run_sync(has_pg_trgm)
+        await connection.execute(
+            text(
+                'INSERT INTO "user" (id, email, is_active, is_superuser, hashed_password) '
+                "VALUES (:id, :email, true, false, '')"
+            ),
+            {"id": owner_id, "email": f"bench-{owner_id}@example.com"},
+        )
+        session = AsyncSession(
+            bind=connection, join_transaction_mode="create_savepoint"
+        )
+        word = f"(CAST(:words AS text[]))[1 + floor(random() * {len(VOCABULARY)})::int]"
+        seeded = 0
+        for size in sorted(sizes):
+            await connection.execute(
+                text(
+                    "INSERT INTO item (id, title, description, owner_id) "
+                    f"SELECT gen_random_uuid(), {word} || ' ' || {word} || "
+                    f"CASE WHEN n % {RARE_EVERY} = 0 THEN ' {RARE_WORD}' ELSE '' END, "
+                    f"{word} || ' ' || {word} || ' ' || {word}, :owner_id "
+                    "FROM generate_series(CAST(:start AS bigint), :stop) AS n"
+                ),
+                {
+                    "owner_id": owner_id,
+                    "start": seeded + 1,
+                    "stop": size,
+                    "words": VOCABULARY,
+                },
+            )
+            seeded = size
+            await connection.execute(text("ANALYZE item"))
+
+            async def scan(q: str) -> None:
+                pattern = f"%{escape_like(q)}%"
+                statement = (
+                    select(Item)
+                    .where(
+                        Item.owner_id == owner_id,
+                        or_(
+                            col(Item.title).ilike(pattern, escape="\\"),
+                            col(Item.description).ilike(pattern, escape="\\"),
+                        ),
+                    )
+                    .order_by(col(Item.id))
+                    .limit(limit + 1)
+                )
+                (await session.exec(statement)).all()
+
+            async def search(q: str, mode: SearchMode) -> None:
+                await search_items(
+                    session, q, mode=mode, owner_id=owner_id, limit=limit
+                )
+
+            modes: list[SearchMode] = ["text", "autocomplete"] if trigrams else ["text"]
+            for q in (RARE_WORD, "shoes"):
+                steps = {"ILIKE scan": partial(scan, q)} | {
+                    mode: partial(search, q, mode) for mode in modes
+                }
+                for name, step in steps.items():
+                    # Warm up the buffer cache before timing
+                    await step()
+                    elapsed = await timed(step, repeat)
+                    logger.info(f"{size} rows, {q!r}, {name}: {elapsed * 1000:.2f} ms")
+        await session.close()
+        await connection.rollback()
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare item search with a scan and with its indexes"
+    )
+    parser.add_argument("--sizes", default="5000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    asyncio.run(run(sizes, args.repeat, args.limit))
+
+
+if __name__ == "__main__":
+    main()
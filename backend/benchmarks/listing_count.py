@@ -0,0 +1,133 @@
+"""
+Latency of a listing page with its total, read with a count statement followed
+by the page, in one statement with count(*) OVER(), and in one statement with
+the count as a scalar subquery, as paginate does.
+
+Items of one owner are inserted in a transaction that is rolled back at the
+end, growing to each of the given sizes in turn. The counter triggers are
+skipped while seeding, the listing is counted from the item rows as a
+filtered listing without a maintained total would be. Needs the database
+configured in the settings.
+
+Run from the backend directory:
+
+    python -m benchmarks.listing_count --sizes 10000,1000000,10000000
+"""
+
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+from collections.abc import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.orm import aliased
+from sqlmodel import col, func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.api.pagination import paginate
+from app.core.db import async_engine
+from app.models import Item
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def timed(step: Callable[[], Awaitable[object]], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await step()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def run(sizes: list[int], repeat: int, limit: int) -> None:
+    owner_id = uuid.uuid4()
+    statement = select(Item).where(Item.owner_id == owner_id)
+    async with async_engine.connect() as connection:
+        await connection.begin()
+        await connection.execute(text("SET LOCAL session_replication_role = replica"))
+        await connection.execute(
+            text(
+                'INSERT INTO "user" (id, email, is_active, is_superuser, hashed_password) '
+                "VALUES (:id, :email, true, false, '')"
+            ),
+            {"id": owner_id, "email": f"bench-{owner_id}@example.com"},
+        )
+        session = AsyncSession(
+            bind=connection, join_transaction_mode="create_savepoint"
+        )
+        seeded = 0
+        for size in sorted(sizes):
+            await connection.execute(
+                text(
+                    "INSERT INTO item (id, title, owner_id) "
+                    "SELECT gen_random_uuid(), 'Item ' || n, :owner_id "
+                    "FROM generate_series(CAST(:start AS bigint), :stop) AS n"
+                ),
+                {"owner_id": owner_id, "start": seeded + 1, "stop": size},
+            )
+            seeded = size
+            await connection.execute(text("ANALYZE item"))
+
+            async def two_queries() -> None:
+                count_statement = select(func.count()).select_from(statement.subquery())
+                (await session.exec(count_statement)).one()
+                await paginate(
+                    session, statement, col(Item.id), cursor=None, skip=0, limit=limit
+                )
+
+            async def window() -> None:
+                counted = statement.add_columns(
+                    func.count().over().label("count")
+                ).subquery()
+                entity = aliased(Item, counted)
+                window_statement = (
+                    select(entity, counted.c.count)
+                    .order_by(col(entity.id))
+                    .limit(limit + 1)
+                )
+                (await session.exec(window_statement)).all()
+
+            async def subquery() -> None:
+                await paginate(
+                    session,
+                    statement,
+                    col(Item.id),
+                    cursor=None,
+                    skip=0,
+                    limit=limit,
+                    count="exact",
+                )
+
+            # Warm up the buffer cache before timing either
+            await two_queries()
+            results = {
+                "two queries": await timed(two_queries, repeat),
+                "count(*) OVER()": await timed(window, repeat),
+                "count subquery": await timed(subquery, repeat),
+            }
+            for name, elapsed in results.items():
+                logger.info(f"{size} rows, {name}: {elapsed * 1000:.2f} ms")
+        await session.close()
+        await connection.rollback()
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare one and two statement listing pages with totals"
+    )
+    parser.add_argument("--sizes", default="10000,1000000,10000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    asyncio.run(run(sizes, args.repeat, args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Payload size and serialization time of a page of items with all their fields,
+as read_items returns it, and with only the fields requested with fields=.
+
+Items are built in memory with descriptions of the maximal length, the page
+is validated and serialized to JSON as the endpoint does for each response.
+Doesn't need the database.
+
+Run from the backend directory:
+
+    python -m benchmarks.sparse_fields --rows 1000 --fields id,title
+"""
+
+import argparse
+import logging
+import statistics
+import time
+import uuid
+from collections.abc import Callable
+from datetime import datetime, timezone
+from functools import partial
+from typing import Any
+
+from sqlmodel import SQLModel
+
+from app.api.fields import parse_fields, partial_page_model
+from app.models import Item, ItemPublic, ItemsPublic
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def timed(step: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        step()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def serialize(model: type[SQLModel], content: dict[str, Any]) -> str:
+    return model.model_validate(content).model_dump_json()
+
+
+def run(rows: int, fields: str, repeat: int) -> None:
+    owner_id = uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    items = [
+        Item(
+            title=f"Item {i}",
+            description="d" * 255,
+            owner_id=owner_id,
+            created_at=now,
+            updated_at=now,
+        )
+        for i in range(rows)
+    ]
+    content = {"data": items, "count": rows, "next_cursor": None, "prev_cursor": None}
+    selected = parse_fields(fields, ItemPublic)
+    assert selected is not None
+    models: dict[str, type[SQLModel]] = {
+        "all fields": ItemsPublic,
+        f"fields={','.join(selected)}": partial_page_model(
+            ItemsPublic, ItemPublic, selected
+        ),
+    }
+    for name, model in models.items():
+        payload = serialize(model, content)
+        elapsed = timed(partial(serialize, model, content), repeat)
+        logger.info(
+            f"{rows} rows, {name}: {len(payload)} bytes, {elapsed * 1000:.2f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare full and sparse item pages")
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--fields", default="id,title")
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    run(args.rows, args.fields, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
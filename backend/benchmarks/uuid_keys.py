@@ -0,0 +1,117 @@
+"""
+Insert rate into a table keyed by random UUIDv4 ids and into one keyed by time
+ordered UUIDv7 ids, as app.models makes them, once the table is large.
+
+For each kind of key a scratch table is filled with --rows rows keyed the same
+way, older rows being keyed by time in order. Then --inserts rows are inserted
+with ids made in Python, --batch at a time in a transaction each, as the API
+would. Random keys land on leaf pages all over the primary key's index, which
+no longer fit in the cache and split half empty, while ordered ones fill the
+last leaf page. The growth of the index is reported along with the rate. The
+tables are dropped at the end. Needs the database configured in the settings.
+
+Run from the backend directory:
+
+    python -m benchmarks.uuid_keys --rows 20000000
+"""
+
+import argparse
+import logging
+import time
+import uuid
+from collections.abc import Callable
+
+from sqlalchemy import Connection, text
+
+from app.core.db import engine
+from app.models import uuid7
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# A UUIDv7 made by the database for the rows filled in beforehand: a random
+# UUID with the time in milliseconds in its first 48 bits and version 7
+UUID_V7_FUNCTION = """
+CREATE FUNCTION pg_temp.uuid_v7() RETURNS uuid AS $$
+  SELECT encode(
+    set_bit(set_bit(
+      overlay(
+        uuid_send(gen_random_uuid())
+        PLACING substring(
+          int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint)
+          FROM 3
+        )
+        FROM 1 FOR 6
+      ),
+    52, 1), 53, 1),
+    'hex'
+  )::uuid
+$$ LANGUAGE sql VOLATILE
+"""
+
+KEYS: dict[str, tuple[Callable[[], uuid.UUID], str]] = {
+    "v4": (uuid.uuid4, "gen_random_uuid()"),
+    "v7": (uuid7, "pg_temp.uuid_v7()"),
+}
+
+
+def index_size(connection: Connection, table: str) -> int:
+    statement = text("SELECT pg_relation_size(CAST(:index AS regclass))")
+    return int(connection.execute(statement, {"index": f"{table}_pkey"}).scalar_one())
+
+
+def run(rows: int, inserts: int, batch: int) -> None:
+    with engine.connect() as connection:
+        connection.execute(text(UUID_V7_FUNCTION))
+        connection.commit()
+        for name, (make_id, sql_id) in KEYS.items():
+            table = f"bench_uuid_{name}"
+            connection.execute(
+                text(f"CREATE TABLE {table} (id uuid PRIMARY KEY, title varchar(255))")
+            )
+            try:
+                connection.execute(
+                    text(
+                        f"INSERT INTO {table} SELECT {sql_id}, 'Item ' || n "
+                        "FROM generate_series(1, :rows) AS n"
+                    ),
+                    {"rows": rows},
+                )
+                connection.commit()
+                size = index_size(connection, table)
+                started = time.perf_counter()
+                for start in range(0, inserts, batch):
+                    values = [
+                        {"id": make_id(), "title": f"Item {n}"}
+                        for n in range(start, min(start + batch, inserts))
+                    ]
+                    connection.execute(
+                        text(f"INSERT INTO {table} VALUES (:id, :title)"), values
+                    )
+                    connection.commit()
+                elapsed = time.perf_counter() - started
+                growth = index_size(connection, table) - size
+                logger.info(
+                    f"{name}: {rows} rows, {inserts / elapsed:.0f} inserts/s, "
+                    f"primary key grew {growth / 2**20:.1f} MB "
+                    f"from {size / 2**20:.0f} MB"
+                )
+            finally:
+                connection.rollback()
+                connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+                connection.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare inserts into tables with UUIDv4 and UUIDv7 keys"
+    )
+    parser.add_argument("--rows", type=int, default=20_000_000)
+    parser.add_argument("--inserts", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+    run(args.rows, args.inserts, args.batch)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,66 @@
+import csv
+import io
+import json
 import uuid
+from typing import Any
+from unittest.mock import patch
 
+import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session
+from sqlmodel import Session, select
 
+from app import crud
 from app.core.config import settings
-from tests.utils.item import create_random_item
+from app.models import (
+    Item,
+    ItemCreate,
+    ItemTombstone,
+    ItemTombstonePrune,
+    UserCreate,
+    has_pg_trgm,
+)
+from tests.utils.item import create_random_item, create_user_with_items
+from tests.utils.user import user_authentication_headers
+from tests.utils.utils import captured_queries, random_email, random_lower_string
 
 
 def test_create_item(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
     data = {"title": "Foo", "description": "Fighters"}
-    response = client.post(
-        f"{settings.API_V1_STR}/items/",
-        headers=superuser_token_headers,
-        json=data,
-    )
+    with captured_queries() as queries:
+        response = client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            json=data,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["title"] == data["title"]
     assert content["description"] == data["description"]
     assert "id" in content
     assert "owner_id" in content
+    # Authenticating, then INSERT ... RETURNING
+    assert len(queries) == 2
+
+
+def test_create_item_deleted_user_stateless(client: TestClient, db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    with patch("app.core.config.settings.AUTH_STATELESS", True):
+        headers = user_authentication_headers(
+            client=client, email=email, password=password
+        )
+        db.delete(user)
+        db.commit()
+        response = client.post(
+            f"{settings.API_V1_STR}/items/", headers=headers, json={"title": "Foo"}
+        )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "User not found"
 
 
 def test_read_item(
@@ -40,6 +79,32 @@ def test_read_item(
     assert content["owner_id"] == str(item.owner_id)
 
 
+def test_read_item_fields(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 1)
+    item = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"][
+        0
+    ]
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{item['id']}",
+        headers=headers,
+        params={"fields": "title"},
+    )
+    assert response.status_code == 200
+    assert response.json() == {"title": item["title"]}
+
+
+def test_read_item_fields_not_enough_permissions(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/{item.id}",
+        headers=normal_user_token_headers,
+        params={"fields": "id,title"},
+    )
+    assert response.status_code == 400
+
+
 def test_read_item_not_found(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -79,22 +144,219 @@ def test_read_items(
     assert len(content["data"]) >= 2
 
 
+def test_read_items_fields(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 3)
+    with captured_queries() as queries:
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=headers,
+            params={"fields": "title, id", "limit": 2},
+        )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["count"] == 3
+    assert content["next_cursor"]
+    assert [set(item) for item in content["data"]] == [{"id", "title"}] * 2
+    # Neither selected nor serialized
+    assert "description" not in queries[-1].statement
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"fields": "id", "cursor": content["next_cursor"], "limit": 2},
+    )
+    assert [set(item) for item in response.json()["data"]] == [{"id"}]
+
+
+@pytest.mark.parametrize("fields", ["title,secret", "", " , "])
+def test_read_items_invalid_fields(
+    client: TestClient, normal_user_token_headers: dict[str, str], fields: str
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        params={"fields": fields},
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"][0]["loc"] == ["query", "fields"]
+
+
+def test_read_items_cursor_pagination(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 5)
+    pages = []
+    params: dict[str, str | int] = {"limit": 2}
+    while True:
+        response = client.get(
+            f"{settings.API_V1_STR}/items/", headers=headers, params=params
+        )
+        assert response.status_code == 200
+        content = response.json()
+        assert content["count"] == 5
+        pages.append(content)
+        if not content["next_cursor"]:
+            break
+        params = {"limit": 2, "cursor": content["next_cursor"]}
+
+    assert [len(page["data"]) for page in pages] == [2, 2, 1]
+    assert pages[0]["prev_cursor"] is None
+    ids = [item["id"] for page in pages for item in page["data"]]
+    assert ids == sorted(ids, key=uuid.UUID)
+    assert len(set(ids)) == 5
+
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"limit": 2, "cursor": pages[2]["prev_cursor"]},
+    )
+    assert response.json() == pages[1]
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"limit": 2, "cursor": pages[1]["prev_cursor"]},
+    )
+    assert response.json() == pages[0]
+
+
+def test_read_items_skip(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 3)
+    response = client.get(
+        f"{settings.API_V1_STR}/items/", headers=headers, params={"limit": 2}
+    )
+    first_page = response.json()
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"skip": 2, "limit": 2},
+    )
+    content = response.json()
+    assert len(content["data"]) == 1
+    assert content["next_cursor"] is None
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"limit": 2, "cursor": content["prev_cursor"]},
+    )
+    assert response.json() == first_page
+
+
+def test_read_items_limit_capped(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 3)
+    with patch.object(settings, "MAX_PAGE_SIZE", 2):
+        response = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=headers,
+            params={"limit": 10000000},
+        )
+    content = response.json()
+    assert len(content["data"]) == 2
+    assert content["next_cursor"]
+
+
+def test_read_items_invalid_cursor(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"cursor": "not-a-cursor"},
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def read_items_count(
+    client: TestClient, headers: dict[str, str], count: str = "exact"
+) -> int | None:
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"limit": 1, "count": count},
+    )
+    assert response.status_code == 200
+    total: int | None = response.json()["count"]
+    return total
+
+
+def test_item_counts(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    _, headers = create_user_with_items(client, db, 2)
+    total = read_items_count(client, superuser_token_headers)
+    assert total is not None
+    assert read_items_count(client, headers) == 2
+
+    response = client.post(
+        f"{settings.API_V1_STR}/items/", headers=headers, json={"title": "Foo"}
+    )
+    assert response.status_code == 200
+    assert read_items_count(client, headers) == 3
+    assert read_items_count(client, superuser_token_headers) == total + 1
+
+    response = client.delete(
+        f"{settings.API_V1_STR}/items/{response.json()['id']}", headers=headers
+    )
+    assert response.status_code == 200
+    assert read_items_count(client, headers) == 2
+    assert read_items_count(client, superuser_token_headers) == total
+
+
+def test_read_items_count_modes(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    _, headers = create_user_with_items(client, db, 2)
+    assert read_items_count(client, headers, "none") is None
+    assert read_items_count(client, superuser_token_headers, "none") is None
+    # Owner scoped counts are always exact
+    assert read_items_count(client, headers, "estimated") == 2
+    estimate = read_items_count(client, superuser_token_headers, "estimated")
+    assert estimate is not None and estimate >= 0
+    response = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"count": "everything"},
+    )
+    assert response.status_code == 422
+
+
 def test_update_item(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
     item = create_random_item(db)
     data = {"title": "Updated title", "description": "Updated description"}
-    response = client.put(
-        f"{settings.API_V1_STR}/items/{item.id}",
-        headers=superuser_token_headers,
-        json=data,
-    )
+    with captured_queries() as queries:
+        response = client.put(
+            f"{settings.API_V1_STR}/items/{item.id}",
+            headers=superuser_token_headers,
+            json=data,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["title"] == data["title"]
     assert content["description"] == data["description"]
     assert content["id"] == str(item.id)
     assert content["owner_id"] == str(item.owner_id)
+    # Authenticating, then UPDATE ... RETURNING
+    assert len(queries) == 2
+
+
+def test_update_own_item(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 1)
+    item = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"][
+        0
+    ]
+    with captured_queries() as queries:
+        response = client.put(
+            f"{settings.API_V1_STR}/items/{item['id']}",
+            headers=headers,
+            json={"description": "Updated description"},
+        )
+    assert response.status_code == 200
+    content = response.json()
+    assert content["title"] == item["title"]
+    assert content["description"] == "Updated description"
+    assert len(queries) == 2
+    # The owner is checked by the UPDATE itself
+    assert "item.owner_id" in queries[1].statement
 
 
 def test_update_item_not_found(
@@ -126,17 +388,138 @@ def test_update_item_not_enough_permissions(
     assert content["detail"] == "Not enough permissions"
 
 
-def test_delete_item(
-    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+def test_read_item_conditional(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 1)
+    item = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"][
+        0
+    ]
+    url = f"{settings.API_V1_STR}/items/{item['id']}"
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    last_modified = response.headers["Last-Modified"]
+    assert (
+        client.get(url, headers=headers, params={"fields": "title"}).headers["ETag"]
+        == etag
+    )
+
+    with captured_queries() as queries:
+        response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+    # Authenticating, then only the columns to authorize and compare
+    assert len(queries) == 2
+    assert "item.title" not in queries[1].statement
+    response = client.get(url, headers={**headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+    client.put(url, headers=headers, json={"title": "Updated title"})
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["title"] == "Updated title"
+    assert response.headers["ETag"] != etag
+
+
+def test_read_item_conditional_not_enough_permissions(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
 ) -> None:
     item = create_random_item(db)
-    response = client.delete(
+    response = client.get(
         f"{settings.API_V1_STR}/items/{item.id}",
-        headers=superuser_token_headers,
+        headers={**normal_user_token_headers, "If-None-Match": "*"},
     )
+    assert response.status_code == 400
+
+
+def test_update_item_if_match(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 1)
+    item = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"][
+        0
+    ]
+    url = f"{settings.API_V1_STR}/items/{item['id']}"
+    etag = client.get(url, headers=headers).headers["ETag"]
+
+    with captured_queries() as queries:
+        response = client.put(
+            url, headers={**headers, "If-Match": etag}, json={"title": "First"}
+        )
+    assert response.status_code == 200
+    new_etag = response.headers["ETag"]
+    assert new_etag != etag
+    # The version is checked by the UPDATE itself
+    assert len(queries) == 2
+    assert "item.version" in queries[1].statement
+
+    # Written meanwhile by another client
+    for if_match in (etag, f"W/{new_etag}", '"x"'):
+        response = client.put(
+            url, headers={**headers, "If-Match": if_match}, json={"title": "Second"}
+        )
+        assert response.status_code == 412
+    response = client.put(
+        url, headers={**headers, "If-Match": f'"0", {new_etag}'}, json={}
+    )
+    assert response.status_code == 200
+    assert response.json()["title"] == "First"
+    response = client.put(
+        url, headers={**headers, "If-Match": "*"}, json={"title": "Second"}
+    )
+    assert response.status_code == 200
+
+
+def test_update_item_if_match_not_enough_permissions(
+    client: TestClient, normal_user_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    response = client.put(
+        f"{settings.API_V1_STR}/items/{item.id}",
+        headers={**normal_user_token_headers, "If-Match": '"1"'},
+        json={"title": "Updated title"},
+    )
+    assert response.status_code == 400
+
+
+def test_read_items_conditional(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 2)
+    url = f"{settings.API_V1_STR}/items/"
+    response = client.get(url, headers=headers)
+    etag = response.headers["ETag"]
+    assert "Last-Modified" not in response.headers
+    response = client.get(url, headers={**headers, "If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    fields_etag = client.get(url, headers=headers, params={"fields": "title"}).headers[
+        "ETag"
+    ]
+    item = client.get(url, headers=headers).json()["data"][0]
+    client.put(f"{url}{item['id']}", headers=headers, json={"title": "Updated"})
+    for params in ({}, {"fields": "title"}):
+        response = client.get(
+            url,
+            headers={**headers, "If-None-Match": f"{etag}, {fields_etag}"},
+            params=params,
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] not in (etag, fields_etag)
+
+
+def test_delete_item(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    item = create_random_item(db)
+    with captured_queries() as queries:
+        response = client.delete(
+            f"{settings.API_V1_STR}/items/{item.id}",
+            headers=superuser_token_headers,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["message"] == "Item deleted successfully"
+    # Authenticating, then DELETE ... RETURNING
+    assert len(queries) == 2
+    assert db.get(Item, item.id, populate_existing=True) is None
 
 
 def test_delete_item_not_found(
@@ -162,3 +545,611 @@ def test_delete_item_not_enough_permissions(
     assert response.status_code == 400
     content = response.json()
     assert content["detail"] == "Not enough permissions"
+
+
+def test_bulk_create_items(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 0)
+    items_in = [{"title": f"Bulk {i}", "description": f"#{i}"} for i in range(50)]
+    r = client.post(f"{settings.API_V1_STR}/items/bulk", headers=headers, json=items_in)
+    assert r.status_code == 200
+    items = r.json()
+    assert [item["title"] for item in items] == [f"Bulk {i}" for i in range(50)]
+    assert len({item["id"] for item in items}) == 50
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.json()["count"] == 50
+
+
+def test_bulk_create_items_invalid(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 0)
+    r = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=headers,
+        json=[{"title": "Valid"}, {"title": ""}],
+    )
+    assert r.status_code == 422
+    assert r.json()["detail"][0]["loc"] == ["body", 1, "title"]
+    r = client.post(f"{settings.API_V1_STR}/items/bulk", headers=headers, json=[])
+    assert r.status_code == 422
+    r = client.post(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=headers,
+        json=[{"title": "Item"}] * (settings.MAX_BATCH_SIZE + 1),
+    )
+    assert r.status_code == 422
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert r.json()["count"] == 0
+
+
+def test_bulk_update_items(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 3)
+    items = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"]
+    r = client.patch(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=headers,
+        json=[
+            {"id": items[2]["id"], "title": "Renamed"},
+            {"id": items[0]["id"], "description": "Described"},
+            {"id": items[1]["id"], "title": "Cleared", "description": None},
+        ],
+    )
+    assert r.status_code == 200
+    updated = r.json()
+    assert [item["id"] for item in updated] == [
+        items[2]["id"],
+        items[0]["id"],
+        items[1]["id"],
+    ]
+    assert updated[0]["title"] == "Renamed"
+    assert updated[0]["description"] == items[2]["description"]
+    assert updated[1]["title"] == items[0]["title"]
+    assert updated[1]["description"] == "Described"
+    assert updated[2]["title"] == "Cleared"
+    assert updated[2]["description"] is None
+
+
+def test_bulk_update_items_errors(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    _, headers = create_user_with_items(client, db, 2)
+    items = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"]
+    other_item = create_random_item(db)
+    r = client.patch(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=headers,
+        json=[
+            {"id": items[0]["id"], "title": "Renamed"},
+            {"id": str(uuid.uuid4()), "title": "Missing"},
+            {"id": str(other_item.id), "title": "Stolen"},
+            {"id": items[0]["id"], "title": "Again"},
+        ],
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == [
+        {"loc": ["body", 1, "id"], "msg": "Item not found"},
+        {"loc": ["body", 2, "id"], "msg": "Not enough permissions"},
+        {"loc": ["body", 3, "id"], "msg": "Duplicate item"},
+    ]
+    # Nothing was applied
+    r = client.get(f"{settings.API_V1_STR}/items/{items[0]['id']}", headers=headers)
+    assert r.json()["title"] == items[0]["title"]
+
+    # Superusers can update the items of any user
+    r = client.patch(
+        f"{settings.API_V1_STR}/items/bulk",
+        headers=superuser_token_headers,
+        json=[{"id": items[0]["id"], "title": "By admin"}],
+    )
+    assert r.status_code == 200
+    assert r.json()[0]["title"] == "By admin"
+
+
+def test_bulk_delete_items(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 3)
+    items = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"]
+    other_item = create_random_item(db)
+    r = client.post(
+        f"{settings.API_V1_STR}/items/bulk-delete",
+        headers=headers,
+        json=[items[0]["id"], str(other_item.id)],
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"] == [{"loc": ["body", 1], "msg": "Not enough permissions"}]
+    r = client.post(
+        f"{settings.API_V1_STR}/items/bulk-delete",
+        headers=headers,
+        json=[items[0]["id"], items[1]["id"]],
+    )
+    assert r.status_code == 200
+    assert r.json()["message"] == "2 items deleted successfully"
+    r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+    assert [item["id"] for item in r.json()["data"]] == [items[2]["id"]]
+    assert r.json()["count"] == 1
+
+
+@pytest.mark.parametrize("database_async", [True, False])
+def test_export_items(client: TestClient, db: Session, database_async: bool) -> None:
+    _, headers = create_user_with_items(client, db, 5)
+    items = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"]
+    # Fetched from the cursor a few rows at a time
+    with (
+        patch("app.api.export.YIELD_PER", 2),
+        patch.object(settings, "DATABASE_ASYNC", database_async),
+    ):
+        r = client.get(f"{settings.API_V1_STR}/items/export", headers=headers)
+    assert r.status_code == 200
+    assert r.headers["content-type"] == "application/x-ndjson"
+    assert 'filename="items.ndjson"' in r.headers["content-disposition"]
+    assert [json.loads(line) for line in r.text.splitlines()] == items
+
+
+def test_export_items_csv(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    _, headers = create_user_with_items(client, db, 3)
+    items = client.get(f"{settings.API_V1_STR}/items/", headers=headers).json()["data"]
+    r = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=headers,
+        params={"format": "csv"},
+    )
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(r.text)))
+    assert [row["id"] for row in rows] == [item["id"] for item in items]
+    assert rows[0].keys() == {
+        "title",
+        "description",
+        "id",
+        "owner_id",
+        "created_at",
+        "updated_at",
+    }
+    assert rows[0]["title"] == items[0]["title"]
+
+    # Superusers export the items of every user
+    r = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=superuser_token_headers,
+        params={"format": "csv"},
+    )
+    exported = {row["id"] for row in csv.DictReader(io.StringIO(r.text))}
+    assert {item["id"] for item in items} < exported
+
+
+def test_export_items_empty(client: TestClient, db: Session) -> None:
+    _, headers = create_user_with_items(client, db, 0)
+    r = client.get(f"{settings.API_V1_STR}/items/export", headers=headers)
+    assert r.status_code == 200
+    assert r.text == ""
+    r = client.get(
+        f"{settings.API_V1_STR}/items/export",
+        headers=headers,
+        params={"format": "csv"},
+    )
+    assert r.text.splitlines() == [
+        "title,description,id,owner_id,created_at,updated_at"
+    ]
+
+
+def test_import_items(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    owner = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    rows = ["title,description,owner_id"]
+    rows += [f"Imported {i},Row {i}," for i in range(12)]
+    rows += [",No title,", f"Bad owner,,{uuid.uuid4()}", "Bad uuid,,nope"]
+    with patch("app.import_items.CHUNK_SIZE", 5):
+        r = client.post(
+            f"{settings.API_V1_STR}/items/import",
+            headers=superuser_token_headers,
+            params={"owner_id": str(owner.id)},
+            content="\n".join(rows).encode(),
+        )
+    assert r.status_code == 200
+    report = r.json()
+    assert report["imported"] == 12
+    assert report["rejected"] == 3
+    assert sorted(error["line"] for error in report["errors"]) == [14, 15, 16]
+    db.refresh(owner)
+    assert owner.item_count == 12
+
+
+def test_import_items_ndjson(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    body = "\n".join(json.dumps({"title": f"NDJSON {i}"}) for i in range(3))
+    r = client.post(
+        f"{settings.API_V1_STR}/items/import",
+        headers=superuser_token_headers,
+        params={"format": "ndjson"},
+        content=body.encode(),
+    )
+    assert r.status_code == 200
+    assert r.json() == {"imported": 3, "rejected": 0, "errors": []}
+
+
+def test_import_items_invalid_file(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/items/import",
+        headers=superuser_token_headers,
+        content=b"title\n\xff\xfe\n",
+    )
+    assert r.status_code == 400
+
+
+def test_import_items_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.post(
+        f"{settings.API_V1_STR}/items/import",
+        headers=normal_user_token_headers,
+        content=b"title\nItem\n",
+    )
+    assert r.status_code == 403
+
+
+def create_user_with_titled_items(
+    client: TestClient, db: Session, items: list[tuple[str, str | None]]
+) -> tuple[dict[str, str], list[uuid.UUID]]:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    ids = [
+        crud.create_item(
+            session=db,
+            item_in=ItemCreate(title=title, description=description),
+            owner_id=user.id,
+        ).id
+        for title, description in items
+    ]
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    return headers, ids
+
+
+def test_search_items(client: TestClient, db: Session) -> None:
+    word = random_lower_string()
+    headers, (in_title, in_description, _) = create_user_with_titled_items(
+        client,
+        db,
+        [
+            (f"{word} running shoes", None),
+            ("Shoes", f"Good for {word} and running"),
+            ("Shoes", "For walking"),
+        ],
+    )
+    # Another user's matching item isn't found
+    create_user_with_titled_items(client, db, [(f"{word} running shoes", None)])
+    r = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=headers,
+        params={"q": f"{word} run"},
+    )
+    assert r.status_code == 200
+    content = r.json()
+    # Stemmed, the title's words ranked above the description's
+    assert [item["id"] for item in content["data"]] == [
+        str(in_title),
+        str(in_description),
+    ]
+    assert content["count"] is None
+    assert content["next_cursor"] is None
+
+
+def test_search_items_superuser(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    word = random_lower_string()
+    _, ids = create_user_with_titled_items(client, db, [(word, None)])
+    r = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=superuser_token_headers,
+        params={"q": word},
+    )
+    assert r.status_code == 200
+    assert [item["id"] for item in r.json()["data"]] == [str(ids[0])]
+
+
+def test_search_items_pages(client: TestClient, db: Session) -> None:
+    word = random_lower_string()
+    headers, ids = create_user_with_titled_items(
+        client, db, [(f"{word} {'shoes ' * i}", word) for i in range(5)]
+    )
+    found = []
+    cursor = None
+    for _ in range(3):
+        params = {"q": word, "limit": 2} | ({"cursor": cursor} if cursor else {})
+        r = client.get(
+            f"{settings.API_V1_STR}/items/search", headers=headers, params=params
+        )
+        assert r.status_code == 200
+        content = r.json()
+        found += [item["id"] for item in content["data"]]
+        cursor = content["next_cursor"]
+    assert cursor is None
+    assert sorted(found) == sorted(str(id) for id in ids)
+    # Ties on the rank are broken by the id
+    r = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=headers,
+        params={"q": word, "limit": 5},
+    )
+    assert [item["id"] for item in r.json()["data"]] == found
+
+
+def test_search_items_invalid(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=normal_user_token_headers,
+        params={"q": "shoes", "cursor": "garbage"},
+    )
+    assert r.status_code == 400
+    r = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=normal_user_token_headers,
+        params={"q": ""},
+    )
+    assert r.status_code == 422
+
+
+def test_search_items_autocomplete(client: TestClient, db: Session) -> None:
+    word = random_lower_string()
+    headers, ids = create_user_with_titled_items(
+        client, db, [(f"{word} shoes", None), ("Shoes", word)]
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=headers,
+        params={"q": word[:10], "mode": "autocomplete"},
+    )
+    if not has_pg_trgm(db.connection()):
+        assert r.status_code == 501
+        return
+    assert r.status_code == 200
+    assert [item["id"] for item in r.json()["data"]] == [str(ids[0])]
+    # With a typo
+    typo = "x" + word[1:]
+    r = client.get(
+        f"{settings.API_V1_STR}/items/search",
+        headers=headers,
+        params={"q": typo, "mode": "autocomplete"},
+    )
+    assert [item["id"] for item in r.json()["data"]] == [str(ids[0])]
+
+
+def read_item_titles(
+    client: TestClient, headers: dict[str, str], **params: Any
+) -> list[str]:
+    titles = []
+    cursor = None
+    while True:
+        page_params = params | {"limit": 2} | ({"cursor": cursor} if cursor else {})
+        r = client.get(
+            f"{settings.API_V1_STR}/items/", headers=headers, params=page_params
+        )
+        assert r.status_code == 200
+        content = r.json()
+        titles += [item["title"] for item in content["data"]]
+        cursor = content["next_cursor"]
+        if cursor is None:
+            return titles
+
+
+def test_read_items_sorted(client: TestClient, db: Session) -> None:
+    titles = ["b", "a", "B", "a", "c"]
+    headers, _ = create_user_with_titled_items(
+        client, db, [(title, None) for title in titles]
+    )
+    # In code point order, paged through ties
+    assert read_item_titles(client, headers, sort="title") == sorted(titles)
+    assert read_item_titles(client, headers, sort="-title") == sorted(
+        titles, reverse=True
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"sort": "title", "limit": 2},
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"sort": "title", "limit": 2, "cursor": r.json()["next_cursor"]},
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"sort": "title", "limit": 2, "cursor": r.json()["prev_cursor"]},
+    )
+    assert [item["title"] for item in r.json()["data"]] == ["B", "a"]
+    # Cursors of one sort aren't valid for another
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"sort": "id", "limit": 2},
+    )
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"sort": "title", "cursor": r.json()["next_cursor"]},
+    )
+    assert r.status_code == 400
+
+
+def test_read_items_filtered(client: TestClient, db: Session) -> None:
+    headers, _ = create_user_with_titled_items(
+        client,
+        db,
+        [("Shoes", "Red"), ("Shirt", None), ("shelf", None), ("Boots", None)],
+    )
+    assert read_item_titles(client, headers, sort="title", title_prefix="Sh") == [
+        "Shirt",
+        "Shoes",
+    ]
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"sort": "title", "title_prefix": "Sh", "count": "exact"},
+    )
+    assert r.json()["count"] == 2
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=headers,
+        params={"has_description": False},
+    )
+    content = r.json()
+    assert sorted(item["title"] for item in content["data"]) == [
+        "Boots",
+        "Shirt",
+        "shelf",
+    ]
+    # Filtered listings aren't counted unless asked
+    assert content["count"] is None
+
+
+def test_read_items_by_owner(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    normal_user_token_headers: dict[str, str],
+    db: Session,
+) -> None:
+    _, ids = create_user_with_titled_items(client, db, [("Shoes", None)] * 3)
+    owner_id = str(db.get_one(Item, ids[0]).owner_id)
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=superuser_token_headers,
+        params={"owner_id": owner_id},
+    )
+    content = r.json()
+    assert sorted(item["id"] for item in content["data"]) == sorted(map(str, ids))
+    assert content["count"] == 3
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        params={"owner_id": owner_id},
+    )
+    assert r.status_code == 403
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"title_prefix": "Sh"},
+        {"sort": "title", "has_description": True},
+        {"sort": "title", "title_prefix": "Sh", "has_description": True},
+    ],
+)
+def test_read_items_unindexed(
+    client: TestClient, normal_user_token_headers: dict[str, str], params: Any
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/items/",
+        headers=normal_user_token_headers,
+        params=params,
+    )
+    assert r.status_code == 400
+    assert r.json()["detail"][0]["loc"] == ["query", "sort"]
+
+
+def read_changes(
+    client: TestClient, headers: dict[str, str], since: str | None = None
+) -> tuple[list[dict[str, Any]], list[str], str]:
+    items: list[dict[str, Any]] = []
+    deleted: list[str] = []
+    while True:
+        params: dict[str, Any] = {"limit": 2} | ({"since": since} if since else {})
+        r = client.get(
+            f"{settings.API_V1_STR}/items/changes", headers=headers, params=params
+        )
+        assert r.status_code == 200
+        content = r.json()
+        items += content["data"]
+        deleted += content["deleted"]
+        since = content["next_cursor"]
+        if not content["more"]:
+            return items, deleted, since
+
+
+def test_read_item_changes(client: TestClient, db: Session) -> None:
+    headers, ids = create_user_with_titled_items(
+        client, db, [(f"Item {i}", None) for i in range(3)]
+    )
+    other_headers, _ = create_user_with_titled_items(client, db, [("Other", None)])
+    items, deleted, since = read_changes(client, headers)
+    assert sorted(item["id"] for item in items) == sorted(map(str, ids))
+    assert deleted == []
+
+    item = next(item for item in items if item["id"] == str(ids[0]))
+    r = client.put(
+        f"{settings.API_V1_STR}/items/{ids[0]}",
+        headers=headers,
+        json={"title": "Updated"},
+    )
+    updated = r.json()
+    assert updated["created_at"] == item["created_at"]
+    assert updated["updated_at"] > item["updated_at"]
+    client.delete(f"{settings.API_V1_STR}/items/{ids[1]}", headers=headers)
+    created = client.post(
+        f"{settings.API_V1_STR}/items/", headers=headers, json={"title": "New"}
+    ).json()
+    client.post(
+        f"{settings.API_V1_STR}/items/", headers=other_headers, json={"title": "New"}
+    )
+
+    items, deleted, since = read_changes(client, headers, since)
+    assert sorted(item["id"] for item in items) == sorted([str(ids[0]), created["id"]])
+    assert next(item for item in items if item["id"] == str(ids[0])) == updated
+    assert deleted == [str(ids[1])]
+    assert read_changes(client, headers, since)[:2] == ([], [])
+
+
+def test_read_item_changes_invalid(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/items/changes",
+        headers=normal_user_token_headers,
+        params={"since": "garbage"},
+    )
+    assert r.status_code == 400
+
+
+def test_read_item_changes_pruned(client: TestClient, db: Session) -> None:
+    headers, ids = create_user_with_titled_items(client, db, [("Item", None)] * 2)
+    _, _, since = read_changes(client, headers)
+    client.delete(f"{settings.API_V1_STR}/items/{ids[0]}", headers=headers)
+    deleted_xid = db.get_one(ItemTombstone, ids[0]).deleted_xid
+    assert deleted_xid is not None
+    db.add(ItemTombstonePrune(pruned_xid=deleted_xid))
+    db.commit()
+    r = client.get(
+        f"{settings.API_V1_STR}/items/changes",
+        headers=headers,
+        params={"since": since},
+    )
+    assert r.status_code == 410
+    # Started again, the deleted item is left out
+    items, deleted, _ = read_changes(client, headers)
+    assert [item["id"] for item in items] == [str(ids[1])]
+    assert deleted == []
+
+
+def test_delete_user_items_tombstones(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    _, ids = create_user_with_titled_items(client, db, [("Item", None)] * 2)
+    owner_id = db.get_one(Item, ids[0]).owner_id
+    r = client.delete(
+        f"{settings.API_V1_STR}/users/{owner_id}", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    db.expire_all()
+    statement = select(ItemTombstone.id).where(ItemTombstone.owner_id == owner_id)
+    assert sorted(db.exec(statement).all()) == sorted(ids)
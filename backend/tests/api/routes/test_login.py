@@ -1,11 +1,15 @@
 from unittest.mock import patch
 
+import jwt
 from fastapi.testclient import TestClient
 from sqlmodel import Session
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from app.core.config import settings
-from app.core.security import verify_password
+from app.core.ratelimit import LoginThrottle, MemoryRateLimitBackend
+from app.core.security import ALGORITHM, verify_password
 from app.crud import create_user
+from app.main import app
 from app.models import UserCreate
 from app.utils import generate_password_reset_token
 from tests.utils.user import user_authentication_headers
@@ -116,3 +120,167 @@ def test_reset_password_invalid_token(
     assert "detail" in response
     assert r.status_code == 400
     assert response["detail"] == "Invalid token"
+
+
+def test_get_access_token_throttled(client: TestClient) -> None:
+    throttle = LoginThrottle(
+        MemoryRateLimitBackend(),
+        account_capacity=2,
+        account_refill_per_minute=1,
+        ip_capacity=10,
+        ip_refill_per_minute=1,
+    )
+    login_data = {"username": random_email(), "password": "incorrect"}
+    with patch("app.api.routes.login.login_throttle", throttle):
+        for _ in range(2):
+            r = client.post(
+                f"{settings.API_V1_STR}/login/access-token", data=login_data
+            )
+            assert r.status_code == 400
+        r = client.post(f"{settings.API_V1_STR}/login/access-token", data=login_data)
+        assert r.status_code == 429
+        assert int(r.headers["Retry-After"]) > 0
+
+        login_data = {
+            "username": settings.FIRST_SUPERUSER,
+            "password": settings.FIRST_SUPERUSER_PASSWORD,
+        }
+        for _ in range(3):
+            r = client.post(
+                f"{settings.API_V1_STR}/login/access-token", data=login_data
+            )
+            assert r.status_code == 200
+    assert throttle.stats() == {"admitted": 5, "rejected_account": 1, "rejected_ip": 0}
+
+
+def test_recovery_password_throttled(client: TestClient) -> None:
+    throttle = LoginThrottle(
+        MemoryRateLimitBackend(),
+        account_capacity=10,
+        account_refill_per_minute=1,
+        ip_capacity=1,
+        ip_refill_per_minute=1,
+    )
+    with patch("app.api.routes.login.login_throttle", throttle):
+        r = client.post(f"{settings.API_V1_STR}/password-recovery/{random_email()}")
+        assert r.status_code == 404
+        r = client.post(f"{settings.API_V1_STR}/password-recovery/{random_email()}")
+        assert r.status_code == 429
+    assert throttle.stats() == {"admitted": 1, "rejected_account": 0, "rejected_ip": 1}
+
+
+def test_recovery_password_throttled_per_forwarded_client() -> None:
+    throttle = LoginThrottle(
+        MemoryRateLimitBackend(),
+        account_capacity=10,
+        account_refill_per_minute=1,
+        ip_capacity=1,
+        ip_refill_per_minute=1,
+    )
+    # As uvicorn serves the app behind a proxy in FORWARDED_ALLOW_IPS
+    proxied = TestClient(ProxyHeadersMiddleware(app, trusted_hosts="testclient"))
+    url = f"{settings.API_V1_STR}/password-recovery/{random_email()}"
+    with patch("app.api.routes.login.login_throttle", throttle):
+        for client_ip, status_code in [
+            ("203.0.113.1", 404),
+            ("203.0.113.1", 429),
+            ("203.0.113.2", 404),
+        ]:
+            r = proxied.post(url, headers={"X-Forwarded-For": client_ip})
+            assert r.status_code == status_code
+
+
+def test_stateless_login_and_refresh(client: TestClient, db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    with patch("app.core.config.settings.AUTH_STATELESS", True):
+        r = client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": email, "password": password},
+        )
+        assert r.status_code == 200
+        tokens = r.json()
+        assert tokens["refresh_token"]
+        payload = jwt.decode(
+            tokens["access_token"], settings.SECRET_KEY, algorithms=[ALGORITHM]
+        )
+        assert payload["sub"] == str(user.id)
+        assert payload["is_active"] is True
+        assert payload["is_superuser"] is False
+        assert payload["ver"] == 0
+
+        r = client.post(
+            f"{settings.API_V1_STR}/login/refresh-token",
+            json={"refresh_token": tokens["refresh_token"]},
+        )
+        assert r.status_code == 200
+        assert r.json()["access_token"]
+        assert r.json()["refresh_token"]
+
+
+def test_stateless_read_items_skips_user_lookup(
+    client: TestClient, db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    create_user(session=db, user_create=UserCreate(email=email, password=password))
+    with patch("app.core.config.settings.AUTH_STATELESS", True):
+        headers = user_authentication_headers(
+            client=client, email=email, password=password
+        )
+        with patch("app.api.deps.get_active_user") as get_active_user:
+            r = client.get(f"{settings.API_V1_STR}/items/", headers=headers)
+        assert r.status_code == 200
+        get_active_user.assert_not_called()
+
+
+def test_refresh_token_revoked_by_password_reset(
+    client: TestClient, db: Session
+) -> None:
+    email = random_email()
+    password = random_lower_string()
+    create_user(session=db, user_create=UserCreate(email=email, password=password))
+    with patch("app.core.config.settings.AUTH_STATELESS", True):
+        r = client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": email, "password": password},
+        )
+        refresh_token = r.json()["refresh_token"]
+        r = client.post(
+            f"{settings.API_V1_STR}/reset-password/",
+            json={
+                "new_password": random_lower_string(),
+                "token": generate_password_reset_token(email=email),
+            },
+        )
+        assert r.status_code == 200
+        r = client.post(
+            f"{settings.API_V1_STR}/login/refresh-token",
+            json={"refresh_token": refresh_token},
+        )
+        assert r.status_code == 403
+
+
+def test_refresh_token_is_not_an_access_token(client: TestClient, db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    create_user(session=db, user_create=UserCreate(email=email, password=password))
+    with patch("app.core.config.settings.AUTH_STATELESS", True):
+        r = client.post(
+            f"{settings.API_V1_STR}/login/access-token",
+            data={"username": email, "password": password},
+        )
+        tokens = r.json()
+    r = client.get(
+        f"{settings.API_V1_STR}/users/me",
+        headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+    )
+    assert r.status_code == 403
+    r = client.post(
+        f"{settings.API_V1_STR}/login/refresh-token",
+        json={"refresh_token": tokens["access_token"]},
+    )
+    assert r.status_code == 403
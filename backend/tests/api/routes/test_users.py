@@ -1,14 +1,18 @@
+import json
 import uuid
 from unittest.mock import patch
 
 from fastapi.testclient import TestClient
-from sqlmodel import Session, select
+from sqlalchemy import update
+from sqlmodel import Session, col, select
 
 from app import crud
 from app.core.config import settings
 from app.core.security import verify_password
-from app.models import User, UserCreate
-from tests.utils.utils import random_email, random_lower_string
+from app.models import Item, ItemCreate, User, UserCreate
+from tests.utils.item import create_user_with_items
+from tests.utils.user import user_authentication_headers
+from tests.utils.utils import captured_queries, random_email, random_lower_string
 
 
 def test_get_users_superuser_me(
@@ -75,6 +79,20 @@ def test_get_existing_user(
     assert existing_user.email == api_user["email"]
 
 
+def test_get_existing_user_fields(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    r = client.get(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        params={"fields": "email,is_active"},
+    )
+    assert r.status_code == 200
+    assert r.json() == {"email": user_in.email, "is_active": True}
+
+
 def test_get_existing_user_current_user(client: TestClient, db: Session) -> None:
     username = random_email()
     password = random_lower_string()
@@ -168,6 +186,123 @@ def test_retrieve_users(
         assert "email" in item
 
 
+def test_retrieve_users_fields(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"fields": "id,email", "count": "none"},
+    )
+    assert r.status_code == 200
+    content = r.json()
+    assert content["count"] is None
+    assert content["data"]
+    assert all(set(user) == {"id", "email"} for user in content["data"])
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"fields": "hashed_password"},
+    )
+    assert r.status_code == 400
+
+
+def test_retrieve_users_cursor_pagination(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    for _ in range(3):
+        user_in = UserCreate(email=random_email(), password=random_lower_string())
+        crud.create_user(session=db, user_create=user_in)
+
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2},
+    )
+    first_page = r.json()
+    assert len(first_page["data"]) == 2
+    assert first_page["prev_cursor"] is None
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2, "cursor": first_page["next_cursor"]},
+    )
+    second_page = r.json()
+    assert len(second_page["data"]) == 2
+    first_ids = {user["id"] for user in first_page["data"]}
+    assert not first_ids & {user["id"] for user in second_page["data"]}
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"limit": 2, "cursor": second_page["prev_cursor"]},
+    )
+    assert r.json() == first_page
+
+
+def read_counts(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> tuple[int, int]:
+    counts = []
+    for path in ("/users/", "/items/"):
+        r = client.get(
+            f"{settings.API_V1_STR}{path}",
+            headers=superuser_token_headers,
+            params={"limit": 1},
+        )
+        counts.append(r.json()["count"])
+    return counts[0], counts[1]
+
+
+def test_user_counts(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    users, items = read_counts(client, superuser_token_headers)
+    email = random_email()
+    password = random_lower_string()
+    r = client.post(
+        f"{settings.API_V1_STR}/users/signup",
+        json={"email": email, "password": password},
+    )
+    assert r.status_code == 200
+    user_id = uuid.UUID(r.json()["id"])
+    for i in range(2):
+        crud.create_item(
+            session=db, item_in=ItemCreate(title=f"Item {i}"), owner_id=user_id
+        )
+    assert db.exec(select(User.item_count).where(User.id == user_id)).one() == 2
+    assert read_counts(client, superuser_token_headers) == (users + 1, items + 2)
+
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    assert read_counts(client, superuser_token_headers) == (users, items)
+
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=random_email(), password=password)
+    )
+    crud.create_item(session=db, item_in=ItemCreate(title="Item"), owner_id=user.id)
+    assert read_counts(client, superuser_token_headers) == (users + 1, items + 1)
+    r = client.delete(
+        f"{settings.API_V1_STR}/users/{user.id}", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    assert read_counts(client, superuser_token_headers) == (users, items)
+
+
+def test_retrieve_users_count_none(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/",
+        headers=superuser_token_headers,
+        params={"count": "none"},
+    )
+    assert r.status_code == 200
+    assert r.json()["count"] is None
+    assert r.json()["data"]
+
+
 def test_update_user_me(
     client: TestClient, normal_user_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -191,6 +326,22 @@ def test_update_user_me(
     assert user_db.full_name == full_name
 
 
+def test_update_user_me_single_write(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    with captured_queries() as queries:
+        r = client.patch(
+            f"{settings.API_V1_STR}/users/me",
+            headers=normal_user_token_headers,
+            json={"full_name": "Renamed"},
+        )
+    assert r.status_code == 200
+    assert r.json()["full_name"] == "Renamed"
+    # Authenticating, then UPDATE ... RETURNING
+    assert len(queries) == 2
+    assert queries[1].statement.startswith("UPDATE")
+
+
 def test_update_password_me(
     client: TestClient, superuser_token_headers: dict[str, str], db: Session
 ) -> None:
@@ -230,6 +381,28 @@ def test_update_password_me(
     assert verify_password(settings.FIRST_SUPERUSER_PASSWORD, user_db.hashed_password)
 
 
+def test_update_password_me_outdated_cache(client: TestClient, db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    # Cached by this worker, then revoked elsewhere
+    assert client.get(f"{settings.API_V1_STR}/users/me", headers=headers).is_success
+    db.exec(update(User).where(col(User.id) == user.id).values(token_version=5))
+    db.commit()
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/me/password",
+        headers=headers,
+        json={"current_password": password, "new_password": random_lower_string()},
+    )
+    assert r.status_code == 200
+    db.refresh(user)
+    assert user.token_version == 6
+
+
 def test_update_password_me_incorrect_password(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -346,6 +519,114 @@ def test_update_user(
     assert user_db.full_name == "Updated_full_name"
 
 
+def test_update_user_deactivation_applies_immediately(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    username = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=username, password=password)
+    user = crud.create_user(session=db, user_create=user_in)
+    user_token_headers = user_authentication_headers(
+        client=client, email=username, password=password
+    )
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    assert r.status_code == 200
+
+    r = client.patch(
+        f"{settings.API_V1_STR}/users/{user.id}",
+        headers=superuser_token_headers,
+        json={"is_active": False},
+    )
+    assert r.status_code == 200
+
+    r = client.get(f"{settings.API_V1_STR}/users/me", headers=user_token_headers)
+    assert r.status_code == 400
+    assert r.json()["detail"] == "Inactive user"
+
+
+def test_read_user_me_conditional(client: TestClient, db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    url = f"{settings.API_V1_STR}/users/me"
+    r = client.get(url, headers=headers)
+    etag = r.headers["ETag"]
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+    assert r.content == b""
+    r = client.get(
+        url, headers={**headers, "If-Modified-Since": r.headers["Last-Modified"]}
+    )
+    assert r.status_code == 304
+
+    # Adding items doesn't change the user
+    crud.create_item(session=db, item_in=ItemCreate(title="Item"), owner_id=user.id)
+    db.refresh(user)
+    assert (user.item_count, user.version) == (1, 1)
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304
+
+    r = client.patch(url, headers=headers, json={"full_name": "Updated"})
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["full_name"] == "Updated"
+    assert r.headers["ETag"] != etag
+
+    # Changed through another worker, the user stays in this one's cache
+    etag = r.headers["ETag"]
+    db.exec(update(User).where(col(User.id) == user.id).values(full_name="Other"))
+    db.commit()
+    r = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 200
+    assert r.json()["full_name"] == "Other"
+    assert r.headers["ETag"] != etag
+
+
+def test_get_existing_user_conditional(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    url = f"{settings.API_V1_STR}/users/{user.id}"
+    r = client.get(url, headers=superuser_token_headers, params={"fields": "email"})
+    assert r.json() == {"email": user_in.email}
+    etag = r.headers["ETag"]
+    with captured_queries() as queries:
+        r = client.get(url, headers={**superuser_token_headers, "If-None-Match": etag})
+    assert r.status_code == 304
+    # Authenticating, then only the version and update time of the user
+    assert len(queries) == 2
+    assert "user.email" not in queries[1].statement
+
+
+def test_update_user_if_match(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    url = f"{settings.API_V1_STR}/users/{user.id}"
+    etag = client.get(url, headers=superuser_token_headers).headers["ETag"]
+
+    r = client.patch(
+        url,
+        headers={**superuser_token_headers, "If-Match": etag},
+        json={"full_name": "First"},
+    )
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+
+    for data in ({"full_name": "Second"}, {}):
+        r = client.patch(
+            url, headers={**superuser_token_headers, "If-Match": etag}, json=data
+        )
+        assert r.status_code == 412
+    db.refresh(user)
+    assert user.full_name == "First"
+
+
 def test_update_user_not_exists(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -413,6 +694,72 @@ def test_delete_user_me(client: TestClient, db: Session) -> None:
     assert user_db is None
 
 
+def test_delete_user_me_with_items(client: TestClient, db: Session) -> None:
+    user, headers = create_user_with_items(client, db, 3)
+    user_id = user.id
+    r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+    assert r.status_code == 200
+    assert db.exec(select(Item).where(Item.owner_id == user_id)).first() is None
+
+
+def test_delete_user_me_purge(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user, headers = create_user_with_items(client, db, 5)
+    user_id = user.id
+    with patch.object(settings, "USER_PURGE_BATCH_SIZE", 2):
+        r = client.delete(f"{settings.API_V1_STR}/users/me", headers=headers)
+    # The purge runs in the background, before the test client returns
+    assert r.status_code == 202
+    assert r.json()["message"] == "User deletion in progress"
+    r = client.get(r.headers["Location"], headers=superuser_token_headers)
+    assert r.status_code == 200
+    purge = r.json()
+    assert purge["user_id"] == str(user_id)
+    assert purge["total_items"] == purge["deleted_items"] == 5
+    assert purge["finished"]
+    assert db.exec(select(User).where(User.id == user_id)).first() is None
+    assert db.exec(select(Item).where(Item.owner_id == user_id)).first() is None
+
+
+def test_delete_user_purge_in_progress(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    user, headers = create_user_with_items(client, db, 3)
+    user_id = user.id
+    with (
+        patch.object(settings, "USER_PURGE_BATCH_SIZE", 2),
+        patch("app.api.routes.users.purge_user") as purge_user,
+    ):
+        r = client.delete(
+            f"{settings.API_V1_STR}/users/{user_id}", headers=superuser_token_headers
+        )
+        assert r.status_code == 202
+        location = r.headers["Location"]
+        # Deactivated until purged
+        r = client.get(f"{settings.API_V1_STR}/users/me", headers=headers)
+        assert r.status_code == 400
+        r = client.delete(
+            f"{settings.API_V1_STR}/users/{user_id}", headers=superuser_token_headers
+        )
+        assert r.status_code == 202
+        assert r.headers["Location"] == location
+    assert purge_user.call_count == 2
+    r = client.get(location, headers=superuser_token_headers)
+    assert r.json()["deleted_items"] == 0
+    assert not r.json()["finished"]
+
+
+def test_read_user_purge_not_found(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/purges/{uuid.uuid4()}",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 404
+
+
 def test_delete_user_me_as_superuser(
     client: TestClient, superuser_token_headers: dict[str, str]
 ) -> None:
@@ -484,3 +831,25 @@ def test_delete_user_without_privileges(
     )
     assert r.status_code == 403
     assert r.json()["detail"] == "The user doesn't have enough privileges"
+
+
+def test_export_users(
+    client: TestClient, superuser_token_headers: dict[str, str], db: Session
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/export", headers=superuser_token_headers
+    )
+    assert r.status_code == 200
+    users = [json.loads(line) for line in r.text.splitlines()]
+    assert len(users) == len(db.exec(select(User)).all())
+    assert "hashed_password" not in users[0]
+    assert [user["id"] for user in users] == sorted(user["id"] for user in users)
+
+
+def test_export_users_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/users/export", headers=normal_user_token_headers
+    )
+    assert r.status_code == 403
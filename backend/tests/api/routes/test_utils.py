@@ -0,0 +1,105 @@
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+
+
+def test_password_hash_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/password-hash-stats/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["workers"] == settings.PASSWORD_HASH_WORKERS
+    assert stats["completed"] >= 1
+    assert stats["queue_depth"] >= 0
+
+
+def test_password_hash_stats_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/password-hash-stats/",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 403
+
+
+def test_login_throttle_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/login-throttle-stats/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["admitted"] >= 1
+    assert stats["rejected_account"] >= 0
+    assert stats["rejected_ip"] >= 0
+
+
+def test_db_pool_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool-stats/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["pool_size"] == settings.DATABASE_POOL_SIZE
+    assert stats["max_overflow"] == settings.DATABASE_MAX_OVERFLOW
+    assert stats["checked_out"] >= 0
+    assert stats["checkouts"] >= 1
+    assert stats["wait_seconds_max"] >= stats["wait_seconds_avg"] >= 0
+
+
+def test_db_pool_stats_normal_user(
+    client: TestClient, normal_user_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-pool-stats/",
+        headers=normal_user_token_headers,
+    )
+    assert r.status_code == 403
+
+
+def test_db_read_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-read-stats/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["primary_reads"] >= 0
+    assert len(stats["replicas"]) == len(settings.DATABASE_REPLICA_URLS)
+
+
+def test_db_statement_cache_stats(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    # Read-only requests end their transaction with COMMIT, so the statements
+    # they prepare are kept for the next ones
+    for _ in range(3 * settings.DATABASE_PREPARE_THRESHOLD):
+        r = client.get(f"{settings.API_V1_STR}/items/", headers=superuser_token_headers)
+        assert r.status_code == 200
+    r = client.get(
+        f"{settings.API_V1_STR}/utils/db-statement-cache-stats/",
+        headers=superuser_token_headers,
+    )
+    assert r.status_code == 200
+    stats = r.json()
+    assert stats["prepare_threshold"] == settings.DATABASE_PREPARE_THRESHOLD
+    assert stats["hits"] > 0
+    assert stats["misses"] >= stats["prepares"] > 0
+    assert stats["prepared_statements"] == sum(
+        statement["connections"] for statement in stats["statements"]
+    )
+    assert any(
+        "FROM item" in statement["statement"] for statement in stats["statements"]
+    )
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.api.conditional import (
+    if_match_versions,
+    not_modified,
+    validator_headers,
+    version_tag,
+)
+
+
+def request(headers: dict[str, str]) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "if_match,versions",
+    [
+        (None, None),
+        ("*", None),
+        ('"3"', [3]),
+        ('"3", W/"4", "5"', [3, 5]),
+    ],
+)
+def test_if_match_versions(if_match: str | None, versions: list[int] | None) -> None:
+    assert if_match_versions(if_match) == versions
+
+
+@pytest.mark.parametrize("if_match", ['W/"3"', '"a"', '"10000000000"', "3", ""])
+def test_if_match_versions_none_current(if_match: str) -> None:
+    with pytest.raises(HTTPException) as exc_info:
+        if_match_versions(if_match)
+    assert exc_info.value.status_code == 412
+
+
+def test_not_modified() -> None:
+    etag = version_tag(3)
+    updated_at = datetime(2026, 10, 19, 10, 12, 37, 519046, tzinfo=timezone.utc)
+    last_modified = validator_headers(etag, updated_at)["Last-Modified"]
+    assert last_modified == "Mon, 19 Oct 2026 10:12:37 GMT"
+    earlier = validator_headers(etag, updated_at - timedelta(seconds=1))
+
+    assert not not_modified(request({}), etag, updated_at)
+    assert not_modified(request({"If-None-Match": '"2", W/"3"'}), etag)
+    assert not_modified(request({"If-None-Match": "*"}), etag)
+    assert not not_modified(request({"If-None-Match": '"2"'}), etag)
+    assert not_modified(request({"If-Modified-Since": last_modified}), etag, updated_at)
+    assert not not_modified(
+        request({"If-Modified-Since": earlier["Last-Modified"]}), etag, updated_at
+    )
+    assert not not_modified(
+        request({"If-Modified-Since": "yesterday"}), etag, updated_at
+    )
+    # If-None-Match takes precedence
+    assert not not_modified(
+        request({"If-None-Match": '"2"', "If-Modified-Since": last_modified}),
+        etag,
+        updated_at,
+    )
@@ -0,0 +1,156 @@
+import uuid
+from collections.abc import Generator
+from datetime import timedelta
+from unittest.mock import patch
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api.deps import decode_token, recent_writers, token_cache
+from app.core import security
+from app.core.config import settings
+from app.core.pool import ReplicaSet
+
+
+def test_decode_token_is_cached() -> None:
+    user_id = uuid.uuid4()
+    token = security.create_access_token(user_id, expires_delta=timedelta(minutes=5))
+    assert decode_token(token)[0] == user_id
+    with patch("app.api.deps.jwt.decode") as decode:
+        decoded_user_id, token_data = decode_token(token)
+    decode.assert_not_called()
+    assert decoded_user_id == user_id
+    assert token_data.sub == str(user_id)
+
+
+def test_decode_token_cache_expires_with_token() -> None:
+    token = security.create_access_token(
+        uuid.uuid4(), expires_delta=timedelta(seconds=-1)
+    )
+    with pytest.raises(HTTPException) as e:
+        decode_token(token)
+    assert e.value.status_code == 403
+    with patch("app.api.deps.jwt.decode", wraps=jwt.decode) as decode:
+        with pytest.raises(HTTPException):
+            decode_token(token)
+    decode.assert_called_once()
+
+
+def test_decode_token_checks_type_of_cached_tokens() -> None:
+    token = security.create_refresh_token(
+        uuid.uuid4(), token_version=0, expires_delta=timedelta(minutes=5)
+    )
+    decode_token(token, token_type="refresh")
+    with pytest.raises(HTTPException) as e:
+        decode_token(token)
+    assert e.value.status_code == 403
+
+
+def test_decode_token_invalid_signature_not_cached() -> None:
+    token = jwt.encode(
+        {"sub": str(uuid.uuid4())}, "another-secret-key-another-secret-key"
+    )
+    size = len(token_cache)
+    with pytest.raises(HTTPException):
+        decode_token(token)
+    assert len(token_cache) == size
+
+
+def test_sync_database_path(
+    client: TestClient, superuser_token_headers: dict[str, str]
+) -> None:
+    with patch.object(settings, "DATABASE_ASYNC", False):
+        r = client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            json={"title": "Sync"},
+        )
+        assert r.status_code == 200
+        item_id = r.json()["id"]
+        r = client.put(
+            f"{settings.API_V1_STR}/items/{item_id}",
+            headers=superuser_token_headers,
+            json={"title": "Updated"},
+        )
+        assert r.json()["title"] == "Updated"
+        r = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=superuser_token_headers,
+            params={"limit": 1},
+        )
+        assert r.status_code == 200
+        assert r.json()["count"] >= 1
+        r = client.delete(
+            f"{settings.API_V1_STR}/items/{item_id}", headers=superuser_token_headers
+        )
+        assert r.status_code == 200
+        r = client.get(
+            f"{settings.API_V1_STR}/users/me", headers=superuser_token_headers
+        )
+        assert r.json()["email"] == settings.FIRST_SUPERUSER
+
+
+@pytest.fixture
+def replicas(client: TestClient) -> Generator[ReplicaSet, None, None]:
+    # The test database stands in for a replica, next to one that is down
+    urls = [
+        str(settings.SQLALCHEMY_DATABASE_URI),
+        "postgresql+psycopg://postgres@127.0.0.1:1/app",
+    ]
+    replicas = ReplicaSet(urls, settings)
+    with patch("app.api.deps.replicas", replicas):
+        yield replicas
+    # On the event loop of the app, which its async engines are bound to
+    assert client.portal
+    client.portal.call(replicas.dispose)
+
+
+@pytest.mark.parametrize("database_async", [True, False])
+def test_read_db_routing(
+    client: TestClient,
+    normal_user_token_headers: dict[str, str],
+    replicas: ReplicaSet,
+    database_async: bool,
+) -> None:
+    recent_writers.clear()
+    with patch.object(settings, "DATABASE_ASYNC", database_async):
+        for _ in range(3):
+            r = client.get(
+                f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+            )
+            assert r.status_code == 200
+        stats = replicas.stats()
+        assert [replica["reads"] for replica in stats["replicas"]] == [3, 0]
+        assert [replica["available"] for replica in stats["replicas"]] == [
+            True,
+            False,
+        ]
+        assert stats["primary_reads"] == 0
+
+        # Reads right after the user's own write are served by the primary
+        r = client.post(
+            f"{settings.API_V1_STR}/items/",
+            headers=normal_user_token_headers,
+            json={"title": "Written"},
+        )
+        item_id = r.json()["id"]
+        r = client.get(
+            f"{settings.API_V1_STR}/items/{item_id}",
+            headers=normal_user_token_headers,
+        )
+        assert r.status_code == 200
+        assert replicas.stats()["primary_reads"] == 1
+
+        recent_writers.clear()
+        client.get(f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers)
+        assert replicas.stats()["replicas"][0]["reads"] == 4
+
+        # Without any replica available, reads go to the primary
+        replicas.mark_down(0)
+        r = client.get(
+            f"{settings.API_V1_STR}/items/", headers=normal_user_token_headers
+        )
+        assert r.status_code == 200
+        assert replicas.stats()["primary_reads"] == 2
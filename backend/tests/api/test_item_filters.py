@@ -0,0 +1,22 @@
+import pytest
+
+from app.api.item_filters import LISTING_INDEXES, prefix_upper_bound
+from app.models import Item
+
+
+def test_listing_indexes_exist() -> None:
+    indexes = {index.name for index in Item.__table__.indexes}  # type: ignore[attr-defined]
+    assert set(LISTING_INDEXES.values()) <= indexes | {"item_pkey"}
+
+
+@pytest.mark.parametrize(
+    "prefix,upper_bound",
+    [
+        ("Item", "Iten"),
+        ("a\U0010ffff", "b"),
+        ("\U0010ffff", None),
+        ("a퟿", "a"),
+    ],
+)
+def test_prefix_upper_bound(prefix: str, upper_bound: str | None) -> None:
+    assert prefix_upper_bound(prefix) == upper_bound
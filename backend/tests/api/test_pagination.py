@@ -0,0 +1,100 @@
+import uuid
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlmodel import Session, col, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app import crud
+from app.api.pagination import Page, paginate
+from app.models import Item, ItemCreate, UserCreate
+from tests.utils.utils import random_email, random_lower_string, run_with_async_session
+
+
+@contextmanager
+def counted_statements(session: AsyncSession) -> Iterator[list[str]]:
+    statements: list[str] = []
+
+    def count(_conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+        statements.append(statement)
+
+    bind = session.bind
+    assert isinstance(bind, AsyncEngine)
+    event.listen(bind.sync_engine, "before_cursor_execute", count)
+    try:
+        yield statements
+    finally:
+        event.remove(bind.sync_engine, "before_cursor_execute", count)
+
+
+def create_items(db: Session, titles: list[str]) -> uuid.UUID:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    for title in titles:
+        crud.create_item(session=db, item_in=ItemCreate(title=title), owner_id=user.id)
+    return user.id
+
+
+def read_page(
+    owner_id: uuid.UUID, cursor: str | None = None, skip: int = 0, limit: int = 2
+) -> tuple[Page[Item], int]:
+    # Items of the owner with a title starting with "a", which no counter
+    # keeps a total of
+    statement = select(Item).where(
+        Item.owner_id == owner_id, col(Item.title).startswith("a")
+    )
+
+    async def read(session: AsyncSession) -> tuple[Page[Item], int]:
+        with counted_statements(session) as statements:
+            page = await paginate(
+                session,
+                statement,
+                col(Item.id),
+                cursor=cursor,
+                skip=skip,
+                limit=limit,
+                count="exact",
+            )
+        return page, len(statements)
+
+    return run_with_async_session(read)
+
+
+def test_paginate_counts_in_the_same_statement(db: Session) -> None:
+    owner_id = create_items(db, ["a1", "a2", "a3", "b1"])
+
+    first, statements = read_page(owner_id)
+    assert statements == 1
+    assert first.count == 3
+    assert len(first.rows) == 2
+    assert first.next_cursor
+
+    # The count covers the whole listing, not what is left after the cursor
+    second, statements = read_page(owner_id, cursor=first.next_cursor)
+    assert statements == 1
+    assert second.count == 3
+    titles = {item.title for item in [*first.rows, *second.rows]}
+    assert titles == {"a1", "a2", "a3"}
+    assert second.next_cursor is None
+    assert second.prev_cursor
+
+    back, _ = read_page(owner_id, cursor=second.prev_cursor)
+    assert [item.id for item in back.rows] == [item.id for item in first.rows]
+    assert back.count == 3
+
+
+def test_paginate_counts_empty_page(db: Session) -> None:
+    owner_id = create_items(db, ["a1", "a2", "b1"])
+
+    page, statements = read_page(owner_id, skip=5)
+    assert page.rows == []
+    assert page.count == 2
+    assert statements == 2
+
+    owner_id = create_items(db, ["b1"])
+    page, _ = read_page(owner_id)
+    assert page.rows == []
+    assert page.count == 0
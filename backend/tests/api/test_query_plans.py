@@ -0,0 +1,186 @@
+from collections.abc import Generator
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import Connection, text
+from sqlmodel import Session, select
+
+from app.api.item_filters import LISTING_INDEXES
+from app.core.config import settings
+from app.core.db import engine
+from app.models import Item
+from tests.utils.item import create_user_with_items
+from tests.utils.utils import Query, captured_queries, random_email
+
+# The statements sent by the endpoints are captured while calling them, then
+# planned against tables seeded with enough rows that the planner only picks
+# a sequential scan when no index fits.
+SEED_USERS = 20_000
+SEED_ITEMS_PER_USER = 5
+SEEDED_TABLES = {"user", "item"}
+
+
+@pytest.fixture(scope="module")
+def seeded_db() -> Generator[Connection, None, None]:
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        # Skip the counter triggers, the counter rows they update would stay
+        # locked for the endpoints under test until the transaction ends
+        connection.execute(text("SET LOCAL session_replication_role = replica"))
+        connection.execute(
+            text(
+                'INSERT INTO "user" (id, email, is_active, is_superuser, hashed_password) '
+                "SELECT gen_random_uuid(), 'seed-' || n || '@example.com', true, false, '' "
+                "FROM generate_series(1, :users) AS n"
+            ),
+            {"users": SEED_USERS},
+        )
+        connection.execute(
+            text(
+                "INSERT INTO item (id, title, owner_id) "
+                "SELECT gen_random_uuid(), 'Item ' || u.email || n, u.id "
+                'FROM "user" AS u, generate_series(1, :items) AS n '
+                "WHERE u.email LIKE 'seed-%'"
+            ),
+            {"items": SEED_ITEMS_PER_USER},
+        )
+        connection.execute(text('ANALYZE "user", item'))
+        yield connection
+        transaction.rollback()
+
+
+def seq_scans(plan: dict[str, Any]) -> list[str]:
+    # Small tables like counter are rightly read with a sequential scan
+    scans = []
+    if plan["Node Type"] == "Seq Scan" and plan["Relation Name"] in SEEDED_TABLES:
+        scans.append(plan["Relation Name"])
+    for subplan in plan.get("Plans", []):
+        scans += seq_scans(subplan)
+    return scans
+
+
+def assert_no_seq_scans(connection: Connection, queries: list[Query]) -> None:
+    statements = [
+        query
+        for query in queries
+        if query.statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE"))
+    ]
+    assert statements
+    for statement, parameters in statements:
+        plan: list[dict[str, Any]] = connection.exec_driver_sql(
+            f"EXPLAIN (FORMAT JSON) {statement}", parameters
+        ).scalar_one()
+        scans = seq_scans(plan[0]["Plan"])
+        assert not scans, f"Seq Scan on {', '.join(scans)} planned for: {statement}"
+
+
+def test_owner_scoped_queries_use_indexes(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    seeded_db: Connection,
+) -> None:
+    user, headers = create_user_with_items(client, db, 3)
+    user_id = user.id
+    item_ids = db.exec(select(Item.id).where(Item.owner_id == user_id)).all()
+    with captured_queries() as queries:
+        r = client.get(
+            f"{settings.API_V1_STR}/items/", headers=headers, params={"limit": 1}
+        )
+        r = client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=headers,
+            params={"limit": 1, "cursor": r.json()["next_cursor"]},
+        )
+        client.get(
+            f"{settings.API_V1_STR}/items/",
+            headers=headers,
+            params={"limit": 1, "cursor": r.json()["prev_cursor"]},
+        )
+        client.get(f"{settings.API_V1_STR}/items/{item_ids[0]}", headers=headers)
+        r = client.get(
+            f"{settings.API_V1_STR}/items/changes", headers=headers, params={"limit": 1}
+        )
+        for limit in (100, 1):
+            r = client.get(
+                f"{settings.API_V1_STR}/items/changes",
+                headers=headers,
+                params={"limit": limit, "since": r.json()["next_cursor"]},
+            )
+        client.put(
+            f"{settings.API_V1_STR}/items/{item_ids[0]}",
+            headers=headers,
+            json={"title": "Updated"},
+        )
+        client.delete(f"{settings.API_V1_STR}/items/{item_ids[1]}", headers=headers)
+        client.patch(
+            f"{settings.API_V1_STR}/users/me",
+            headers=headers,
+            json={"email": random_email()},
+        )
+        client.get(f"{settings.API_V1_STR}/users/{user_id}", headers=headers)
+        client.delete(
+            f"{settings.API_V1_STR}/users/{user_id}", headers=superuser_token_headers
+        )
+    assert_no_seq_scans(seeded_db, queries)
+
+
+def test_listings_use_indexes(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    seeded_db: Connection,
+) -> None:
+    create_user_with_items(client, db, 3)
+    with captured_queries() as queries:
+        for path in ("/items/", "/users/"):
+            r = client.get(
+                f"{settings.API_V1_STR}{path}",
+                headers=superuser_token_headers,
+                params={"limit": 1},
+            )
+            client.get(
+                f"{settings.API_V1_STR}{path}",
+                headers=superuser_token_headers,
+                params={"limit": 1, "cursor": r.json()["next_cursor"]},
+            )
+    assert_no_seq_scans(seeded_db, queries)
+
+
+def test_item_listing_filters_use_indexes(
+    client: TestClient,
+    superuser_token_headers: dict[str, str],
+    db: Session,
+    seeded_db: Connection,
+) -> None:
+    # Titled "Item 1", "Item 10" and "Item 11" among others, so that the
+    # listings filtered by the prefix have a next page
+    user, _ = create_user_with_items(client, db, 12)
+    owner_id = str(user.id)
+    # Values that none of the seeded items match, as counting most of the
+    # table is rightly a scan
+    filter_params = {"title_prefix": "Item 1", "has_description": True}
+    with captured_queries() as queries:
+        for owner_scoped, sort, filters in LISTING_INDEXES:
+            for direction in ("", "-"):
+                params: dict[str, Any] = {
+                    "limit": 1,
+                    "sort": direction + sort,
+                    "count": "exact",
+                }
+                params |= {name: filter_params[name] for name in filters}
+                if owner_scoped:
+                    params["owner_id"] = owner_id
+                r = client.get(
+                    f"{settings.API_V1_STR}/items/",
+                    headers=superuser_token_headers,
+                    params=params,
+                )
+                assert r.status_code == 200
+                client.get(
+                    f"{settings.API_V1_STR}/items/",
+                    headers=superuser_token_headers,
+                    params=params | {"cursor": r.json()["next_cursor"]},
+                )
+    assert_no_seq_scans(seeded_db, queries)
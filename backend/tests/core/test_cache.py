@@ -0,0 +1,46 @@
+from unittest.mock import patch
+
+from app.core.cache import TTLCache
+
+
+def test_cache_get_set() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+
+
+def test_cache_entries_expire() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10)
+    with patch("app.core.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.core.cache.time.monotonic", return_value=109.0):
+        assert cache.get("a") == 1
+    with patch("app.core.cache.time.monotonic", return_value=110.0):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cache_invalidate() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+
+
+def test_cache_disabled() -> None:
+    cache: TTLCache[str, int] = TTLCache(maxsize=0, ttl=60)
+    cache.set("a", 1)
+    assert cache.get("a") is None
@@ -0,0 +1,91 @@
+import asyncio
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+
+from app.core.config import Settings
+from app.core.ratelimit import (
+    LoginThrottle,
+    MemoryRateLimitBackend,
+    RateLimitBackend,
+    SQLiteRateLimitBackend,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request: pytest.FixtureRequest, tmp_path: Path) -> RateLimitBackend:
+    if request.param == "sqlite":
+        return SQLiteRateLimitBackend(str(tmp_path / "throttle.sqlite3"))
+    return MemoryRateLimitBackend()
+
+
+def test_bucket_empties_and_refills(backend: RateLimitBackend) -> None:
+    clock = "monotonic" if isinstance(backend, MemoryRateLimitBackend) else "time"
+    with patch(f"app.core.ratelimit.time.{clock}", return_value=1000.0):
+        assert backend.take("key", 2, 0.5) == 0
+        assert backend.take("key", 2, 0.5) == 0
+        assert backend.take("key", 2, 0.5) == 2.0
+        assert backend.take("other", 2, 0.5) == 0
+    with patch(f"app.core.ratelimit.time.{clock}", return_value=1002.0):
+        assert backend.take("key", 2, 0.5) == 0
+        assert backend.take("key", 2, 0.5) == 2.0
+
+
+def test_give_back_is_capped(backend: RateLimitBackend) -> None:
+    backend.give_back("key", 1, 0.01)
+    assert backend.take("key", 1, 0.01) == 0
+    assert backend.take("key", 1, 0.01) > 0
+    backend.give_back("key", 1, 0.01)
+    assert backend.take("key", 1, 0.01) == 0
+
+
+def test_clear(backend: RateLimitBackend) -> None:
+    assert backend.take("key", 1, 0.01) == 0
+    backend.clear()
+    assert backend.take("key", 1, 0.01) == 0
+
+
+def test_sqlite_backend_is_shared(tmp_path: Path) -> None:
+    path = str(tmp_path / "throttle.sqlite3")
+    assert SQLiteRateLimitBackend(path).take("key", 1, 0.01) == 0
+    assert SQLiteRateLimitBackend(path).take("key", 1, 0.01) > 0
+
+
+def test_memory_backend_max_keys() -> None:
+    backend = MemoryRateLimitBackend(max_keys=1)
+    assert backend.take("a", 1, 0.01) == 0
+    assert backend.take("b", 1, 0.01) == 0
+    assert backend.take("a", 1, 0.01) == 0
+
+
+def test_login_throttle_runs_blocking_backend_in_threadpool(tmp_path: Path) -> None:
+    throttle = LoginThrottle(
+        SQLiteRateLimitBackend(str(tmp_path / "throttle.sqlite3")),
+        account_capacity=1,
+        account_refill_per_minute=1,
+        ip_capacity=10,
+        ip_refill_per_minute=1,
+    )
+    attempt = {"scope": "login", "account": "a@example.com", "client_ip": "1.2.3.4"}
+
+    async def attempts() -> list[float]:
+        return [
+            await throttle.acquire(**attempt),
+            await throttle.acquire(**attempt),
+        ]
+
+    with patch(
+        "app.core.ratelimit.run_in_threadpool", wraps=run_in_threadpool
+    ) as threadpool:
+        first, second = asyncio.run(attempts())
+    assert first == 0
+    assert second > 0
+    assert threadpool.call_count == 2
+
+
+def test_refill_rate_must_be_positive() -> None:
+    with pytest.raises(ValidationError):
+        Settings(LOGIN_THROTTLE_IP_REFILL_PER_MINUTE=0)
@@ -0,0 +1,80 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from passlib.hash import argon2
+
+from app.calibrate_password_hash import calibrate
+from app.core.config import settings
+from app.core.security import (
+    PasswordHashPool,
+    build_pwd_context,
+    get_password_hash_async,
+    verify_password,
+    verify_password_async,
+)
+
+
+def test_password_hash_async_roundtrip() -> None:
+    hashed_password = asyncio.run(get_password_hash_async("secret-password"))
+    assert verify_password("secret-password", hashed_password)
+    assert asyncio.run(verify_password_async("secret-password", hashed_password))
+    assert not asyncio.run(verify_password_async("wrong-password", hashed_password))
+
+
+def test_password_hash_pool_stats() -> None:
+    pool = PasswordHashPool(max_workers=1)
+
+    async def run_many() -> list[int]:
+        return await asyncio.gather(*(pool.run(abs, -i) for i in range(5)))
+
+    assert asyncio.run(run_many()) == [0, 1, 2, 3, 4]
+    stats = pool.stats()
+    assert stats["workers"] == 1
+    assert stats["completed"] == 5
+    assert stats["queue_depth"] == 0
+    assert stats["running"] == 0
+    assert stats["wait_seconds_max"] >= stats["wait_seconds_avg"] >= 0
+
+
+def test_pwd_context_follows_scheme_setting() -> None:
+    if not argon2.has_backend():
+        pytest.skip("argon2-cffi is not installed")
+    bcrypt_context = build_pwd_context(
+        settings.model_copy(update={"PASSWORD_BCRYPT_ROUNDS": 4})
+    )
+    argon2_context = build_pwd_context(
+        settings.model_copy(
+            update={
+                "PASSWORD_HASH_SCHEME": "argon2",
+                "PASSWORD_ARGON2_TIME_COST": 1,
+                "PASSWORD_ARGON2_MEMORY_COST": 1024,
+            }
+        )
+    )
+    bcrypt_hash = bcrypt_context.hash("secret-password")
+    verified, new_hash = argon2_context.verify_and_update(
+        "secret-password", bcrypt_hash
+    )
+    assert verified
+    assert new_hash
+    assert new_hash.startswith("$argon2id$")
+    assert not argon2_context.needs_update(new_hash)
+    assert bcrypt_context.verify("secret-password", new_hash)
+
+
+def test_calibrate_picks_cost_within_budget() -> None:
+    with patch(
+        "app.calibrate_password_hash.measure_hash_ms",
+        side_effect=lambda config, _: 2.0**config.PASSWORD_BCRYPT_ROUNDS / 100,
+    ):
+        cost, elapsed_ms = calibrate(scheme="bcrypt", target_ms=250, samples=1)
+    assert cost == 14
+    assert elapsed_ms == 2.0**14 / 100
+
+
+def test_calibrate_falls_back_to_lowest_cost() -> None:
+    with patch("app.calibrate_password_hash.measure_hash_ms", return_value=500.0):
+        cost, elapsed_ms = calibrate(scheme="bcrypt", target_ms=250, samples=1)
+    assert cost == 4
+    assert elapsed_ms == 500.0
@@ -1,10 +1,19 @@
+from unittest.mock import patch
+
 from fastapi.encoders import jsonable_encoder
 from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app import crud
-from app.core.security import verify_password
+from app.core.cache import user_cache
+from app.core.config import settings
+from app.core.security import build_pwd_context, pwd_context, verify_password
 from app.models import User, UserCreate, UserUpdate
-from tests.utils.utils import random_email, random_lower_string
+from tests.utils.utils import (
+    random_email,
+    random_lower_string,
+    run_with_async_session,
+)
 
 
 def test_create_user(db: Session) -> None:
@@ -89,3 +98,141 @@ def test_update_user(db: Session) -> None:
     assert user_2
     assert user.email == user_2.email
     assert verify_password(new_password, user_2.hashed_password)
+
+
+def test_get_user_cached(db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    user = crud.create_user(session=db, user_create=user_in)
+    user_2 = crud.get_user(session=db, user_id=user.id)
+    assert user_2
+    assert user_cache.get(user.id) is not None
+    with Session(db.get_bind()) as session:
+        user_3 = crud.get_user(session=session, user_id=user.id)
+        assert user_3
+        assert jsonable_encoder(user_3) == jsonable_encoder(user)
+        assert user_3 in session
+
+
+def test_update_user_invalidates_cache(db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    user = crud.create_user(session=db, user_create=user_in)
+    crud.get_user(session=db, user_id=user.id)
+    crud.update_user(session=db, db_user=user, user_in=UserUpdate(is_active=False))
+    assert user_cache.get(user.id) is None
+    with Session(db.get_bind()) as session:
+        user_2 = crud.get_user(session=session, user_id=user.id)
+        assert user_2
+        assert user_2.is_active is False
+
+
+def test_authenticate_user_rehashes_outdated_hash(db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    user = crud.create_user(session=db, user_create=user_in)
+    old_context = build_pwd_context(
+        settings.model_copy(update={"PASSWORD_BCRYPT_ROUNDS": 4})
+    )
+    user.hashed_password = old_context.hash(password)
+    db.add(user)
+    db.commit()
+    assert pwd_context.needs_update(user.hashed_password)
+
+    authenticated_user = crud.authenticate(session=db, email=email, password=password)
+    assert authenticated_user
+    db.refresh(user)
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert verify_password(password, user.hashed_password)
+
+
+def test_authenticate_user_keeps_current_hash(db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    user = crud.create_user(session=db, user_create=user_in)
+    hashed_password = user.hashed_password
+    assert crud.authenticate(session=db, email=email, password=password)
+    db.refresh(user)
+    assert user.hashed_password == hashed_password
+
+
+def test_get_user_async_cached(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+
+    async def get_user(session: AsyncSession) -> User | None:
+        return await crud.get_user_async(session=session, user_id=user.id)
+
+    assert run_with_async_session(get_user)
+    assert user_cache.get(user.id) is not None
+
+    async def get_cached_user(session: AsyncSession) -> None:
+        with patch.object(session, "get") as get:
+            cached_user = await crud.get_user_async(session=session, user_id=user.id)
+        get.assert_not_called()
+        assert cached_user
+        assert jsonable_encoder(cached_user) == jsonable_encoder(user)
+        assert cached_user in session
+        # Attached as a persistent object, so it can be updated as usual
+        cached_user.full_name = "Cached"
+        session.add(cached_user)
+        await session.commit()
+
+    run_with_async_session(get_cached_user)
+    db.refresh(user)
+    assert user.full_name == "Cached"
+
+
+def test_update_user_async_bumps_token_version(db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_lower_string())
+    user = crud.create_user(session=db, user_create=user_in)
+    token_version = user.token_version
+    new_password = random_lower_string()
+
+    async def update_user(session: AsyncSession, user_in: UserUpdate) -> User:
+        db_user = await crud.get_user_async(session=session, user_id=user.id)
+        assert db_user
+        updated_user: User = await crud.update_user_async(
+            session=session, db_user=db_user, user_in=user_in
+        )
+        return updated_user
+
+    updated_user = run_with_async_session(
+        lambda session: update_user(session, UserUpdate(full_name="Renamed"))
+    )
+    assert updated_user.token_version == token_version
+    updated_user = run_with_async_session(
+        lambda session: update_user(session, UserUpdate(password=new_password))
+    )
+    assert updated_user.token_version == token_version + 1
+    assert verify_password(new_password, updated_user.hashed_password)
+    assert user_cache.get(user.id) is None
+    db.refresh(user)
+    assert user.token_version == token_version + 1
+
+
+def test_authenticate_async_rehashes_outdated_hash(db: Session) -> None:
+    email = random_email()
+    password = random_lower_string()
+    user_in = UserCreate(email=email, password=password)
+    user = crud.create_user(session=db, user_create=user_in)
+    old_context = build_pwd_context(
+        settings.model_copy(update={"PASSWORD_BCRYPT_ROUNDS": 4})
+    )
+    user.hashed_password = old_context.hash(password)
+    db.add(user)
+    db.commit()
+
+    async def authenticate(session: AsyncSession) -> User | None:
+        return await crud.authenticate_async(
+            session=session, email=email, password=password
+        )
+
+    assert run_with_async_session(authenticate)
+    db.refresh(user)
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert verify_password(password, user.hashed_password)
@@ -0,0 +1,84 @@
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+from sqlmodel import Session, col, select
+
+from app import crud
+from app.import_items import RecordReader, main
+from app.models import Item, UserCreate
+from tests.utils.utils import random_email, random_lower_string
+
+
+def read_records(format: str, text: str, piece: int) -> list[tuple[int, object]]:
+    reader = RecordReader(format)  # type: ignore[arg-type]
+    records = []
+    for start in range(0, len(text), piece):
+        records += reader.feed(text[start : start + piece])
+    records += reader.feed("", final=True)
+    return records
+
+
+def test_record_reader_csv() -> None:
+    text = (
+        "title,description\r\n"
+        "First,\r\n"
+        '"Second, with a comma","Spans\n""two"" lines"\r\n'
+        "\r\n"
+        "Third,too,many\r\n"
+        "Last,no newline"
+    )
+    # However the text is split when fed
+    for piece in (1, 7, len(text)):
+        assert read_records("csv", text, piece) == [
+            (2, {"title": "First"}),
+            (3, {"title": "Second, with a comma", "description": 'Spans\n"two" lines'}),
+            (6, "Expected 2 fields"),
+            (7, {"title": "Last", "description": "no newline"}),
+        ]
+    assert read_records("csv", 'title\n"Unterminated\n', 4) == [
+        (2, "Unterminated quoted field")
+    ]
+
+
+def test_record_reader_ndjson() -> None:
+    text = '{"title": "First"}\n\nnot json\n[1]\n{"title": "Last"}'
+    assert read_records("ndjson", text, 5) == [
+        (1, {"title": "First"}),
+        (3, "Invalid JSON"),
+        (4, "Expected a JSON object"),
+        (5, {"title": "Last"}),
+    ]
+
+
+def test_import_items_cli(db: Session, tmp_path: Path) -> None:
+    email = random_email()
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=email, password=random_lower_string()),
+    )
+    path = tmp_path / "items.ndjson"
+    path.write_text(
+        "\n".join(
+            [
+                json.dumps({"title": "Imported", "description": "From the CLI"}),
+                json.dumps({"title": ""}),
+                json.dumps({"title": "Another"}),
+            ]
+        )
+    )
+    errors_path = tmp_path / "errors.ndjson"
+    argv = ["import_items", str(path), "--owner", email, "--errors", str(errors_path)]
+    with patch.object(sys, "argv", argv):
+        main()
+
+    items = db.exec(select(Item).where(Item.owner_id == user.id)).all()
+    assert sorted(item.title for item in items) == ["Another", "Imported"]
+    errors = [json.loads(line) for line in errors_path.read_text().splitlines()]
+    assert errors == [
+        {"line": 2, "error": "title: String should have at least 1 character"}
+    ]
+    db.refresh(user)
+    assert user.item_count == 2
+    assert db.exec(select(col(Item.id)).where(Item.title == "")).first() is None
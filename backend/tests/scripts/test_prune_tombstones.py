@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, update
+from sqlmodel import Session, col, func, select
+
+from app.core.config import settings
+from app.models import Item, ItemTombstone, ItemTombstonePrune
+from app.prune_tombstones import main
+from tests.utils.item import create_random_item
+
+
+def test_prune_tombstones(db: Session) -> None:
+    old, recent = create_random_item(db), create_random_item(db)
+    for item in (old, recent):
+        db.exec(delete(Item).where(col(Item.id) == item.id))
+        db.commit()
+    retention = timedelta(days=settings.ITEM_TOMBSTONE_RETENTION_DAYS)
+    db.exec(
+        update(ItemTombstone)
+        .where(col(ItemTombstone.id) == old.id)
+        .values(deleted_at=datetime.now(timezone.utc) - retention - timedelta(hours=1))
+    )
+    db.commit()
+    old_xid = db.get_one(ItemTombstone, old.id).deleted_xid
+
+    main()
+
+    db.expire_all()
+    assert db.get(ItemTombstone, old.id) is None
+    assert db.get(ItemTombstone, recent.id) is not None
+    pruned_xid = db.exec(select(func.max(ItemTombstonePrune.pruned_xid))).one()
+    assert pruned_xid == old_xid
@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+from sqlalchemy import insert
+from sqlmodel import Session, col, select
+
+from app import crud
+from app.core.config import settings
+from app.models import Item, User, UserCreate, UserPurge
+from app.purge_users import main
+from tests.utils.utils import random_email, random_lower_string
+
+
+def test_resume_purges(db: Session) -> None:
+    user = crud.create_user(
+        session=db,
+        user_create=UserCreate(email=random_email(), password=random_lower_string()),
+    )
+    user_id = user.id
+    db.exec(
+        insert(Item).values(
+            [{"title": f"Item {i}", "owner_id": user_id} for i in range(7)]
+        )
+    )
+    # Interrupted after its first batch
+    purge = UserPurge(user_id=user_id, total_items=10, deleted_items=3)
+    db.add(purge)
+    db.commit()
+
+    with patch.object(settings, "USER_PURGE_BATCH_SIZE", 3):
+        main()
+
+    db.refresh(purge)
+    assert purge.finished
+    assert purge.deleted_items == 10
+    assert db.get(User, user_id) is None
+    assert not db.exec(select(Item).where(col(Item.owner_id) == user_id)).all()
+    statement = select(UserPurge).where(col(UserPurge.finished).is_(False))
+    assert not db.exec(statement).all()
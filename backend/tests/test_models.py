@@ -0,0 +1,33 @@
+import time
+from unittest.mock import patch
+
+from sqlmodel import Session
+
+from app.models import uuid7
+from tests.utils.item import create_random_item
+
+
+def test_uuid7() -> None:
+    before = time.time_ns() // 1_000_000
+    ids = [uuid7() for _ in range(1000)]
+    after = time.time_ns() // 1_000_000
+    assert all(id.version == 7 and id.variant == "specified in RFC 4122" for id in ids)
+    assert before <= ids[0].int >> 80 <= after
+    # Increasing within a millisecond as across them
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_uuid7_clock_going_back() -> None:
+    first = uuid7()
+    with patch("app.models.time.time_ns", return_value=0):
+        second = uuid7()
+    assert second > first
+    assert second.int >> 80 == first.int >> 80
+
+
+def test_ids_are_time_ordered(db: Session) -> None:
+    item = create_random_item(db)
+    assert item.id.version == 7
+    assert item.owner_id.version == 7
+    assert create_random_item(db).id > item.id
@@ -1,9 +1,10 @@
+from fastapi.testclient import TestClient
 from sqlmodel import Session
 
 from app import crud
-from app.models import Item, ItemCreate
-from tests.utils.user import create_random_user
-from tests.utils.utils import random_lower_string
+from app.models import Item, ItemCreate, User, UserCreate
+from tests.utils.user import create_random_user, user_authentication_headers
+from tests.utils.utils import random_email, random_lower_string
 
 
 def create_random_item(db: Session) -> Item:
@@ -14,3 +15,23 @@ def create_random_item(db: Session) -> Item:
     description = random_lower_string()
     item_in = ItemCreate(title=title, description=description)
     return crud.create_item(session=db, item_in=item_in, owner_id=owner_id)
+
+
+def create_user_with_items(
+    client: TestClient, db: Session, n_items: int
+) -> tuple[User, dict[str, str]]:
+    """
+    A new user owning n_items items titled "Item 0", "Item 1"..., and the
+    headers authenticating as them.
+    """
+    email = random_email()
+    password = random_lower_string()
+    user = crud.create_user(
+        session=db, user_create=UserCreate(email=email, password=password)
+    )
+    for i in range(n_items):
+        crud.create_item(
+            session=db, item_in=ItemCreate(title=f"Item {i}"), owner_id=user.id
+        )
+    headers = user_authentication_headers(client=client, email=email, password=password)
+    return user, headers
@@ -1,9 +1,26 @@
+import asyncio
 import random
 import string
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from typing import Any, NamedTuple, TypeVar
 
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app.core.cache import user_cache
 from app.core.config import settings
+from app.core.db import async_engine
+
+T = TypeVar("T")
+
+
+class Query(NamedTuple):
+    statement: str
+    parameters: Any
 
 
 def random_lower_string() -> str:
@@ -24,3 +41,49 @@ def get_superuser_token_headers(client: TestClient) -> dict[str, str]:
     a_token = tokens["access_token"]
     headers = {"Authorization": f"Bearer {a_token}"}
     return headers
+
+
+def run_with_async_session(func: Callable[[AsyncSession], Awaitable[T]]) -> T:
+    """
+    Run func with an AsyncSession as the API's get_db creates it, on an event
+    loop and connection of its own.
+    """
+
+    async def main() -> T:
+        engine = create_async_engine(
+            str(settings.SQLALCHEMY_DATABASE_URI), poolclass=NullPool
+        )
+        try:
+            async with AsyncSession(engine, expire_on_commit=False) as session:
+                return await func(session)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(main())
+
+
+@contextmanager
+def captured_queries() -> Iterator[list[Query]]:
+    """
+    Capture the statements the API sends to the database with their
+    parameters, with the user cache cleared first so that authenticating
+    always takes one query.
+    """
+    queries: list[Query] = []
+
+    def capture(
+        _conn: Any,
+        _cursor: Any,
+        statement: str,
+        parameters: Any,
+        _context: Any,
+        _executemany: bool,
+    ) -> None:
+        queries.append(Query(statement, parameters))
+
+    user_cache.clear()
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    try:
+        yield queries
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", capture)